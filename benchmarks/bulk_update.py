@@ -0,0 +1,61 @@
+"""
+Nightly reprice: one bulk PATCH against one PATCH per product.
+
+    python benchmarks/bulk_update.py --rows 5000
+"""
+
+import argparse
+import random
+import time
+
+from common import setup_database, seed_products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--single', type=int, default=200, help='PATCH calls timed for the per product rate')
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from ecommerce_backend import metrics
+    from products.models import Product
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    seed_products(args.rows)
+    ids = list(Product.objects.values_list('id', flat=True))
+    admin = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    rng = random.Random(42)
+
+    def price():
+        return f'{rng.uniform(1, 500):.2f}'
+
+    metrics.reset()
+    start = time.perf_counter()
+    for product_id in ids[:args.single]:
+        client.patch(f'/api/products/{product_id}/', {'price': price()}, format='json')
+    single = (time.perf_counter() - start) / args.single
+    single_invalidations = metrics.snapshot()['cache_invalidation']['invalidations']
+
+    metrics.reset()
+    changes = [{'id': product_id, 'price': price(), 'stock': rng.randint(0, 100)} for product_id in ids]
+    start = time.perf_counter()
+    response = client.patch('/api/products/bulk/', changes, format='json')
+    bulk = time.perf_counter() - start
+    assert response.status_code == 200, response.content
+
+    print(f'{"method":<22} {"products":>9} {"seconds":>9} {"invalidations":>14}')
+    print(f'{"PATCH per product":<22} {len(ids):>9} {single * len(ids):>9.1f} '
+          f'{single_invalidations * len(ids) // args.single:>14}  (extrapolated)')
+    print(f'{"bulk PATCH":<22} {len(ids):>9} {bulk:>9.1f} '
+          f'{metrics.snapshot()["cache_invalidation"]["invalidations"]:>14}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Checkout under contention: concurrent buyers racing for a product with less
+stock than buyers, reporting orders per second, whether anything was
+oversold and the statements per order for growing carts. With --queued the
+API only queues the checkouts and a worker places them in batches (needs
+Redis), the time until the last order is placed is reported too.
+
+    python benchmarks/checkout.py --buyers 200 --threads 16 --stock 50
+    python benchmarks/checkout.py --buyers 2000 --threads 16 --stock 500 --queued
+"""
+
+import argparse
+import queue
+import threading
+import time
+from collections import Counter
+
+from common import setup_database, seed_products
+
+ORDER = {'shipping_address': '1 Bench Road, Bench City', 'phone_number': '+1234567890'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=50, help='units of the contended product')
+    parser.add_argument('--lines', type=int, default=5, help='other products in every cart')
+    parser.add_argument('--queued', action='store_true', help='queued checkout with a batch worker')
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection, connections
+    from django.test.utils import CaptureQueriesContext
+    from django_redis import get_redis_connection
+    from rest_framework.test import APIClient
+    from orders.models import Cart, CartItem, OrderItem
+    from orders.queued_checkout import pop_batch, process_batch, queue_key
+    from products.models import Product
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    settings.CHECKOUT = dict(settings.CHECKOUT, QUEUED=args.queued)
+    # SQLite has a single writer, take the write lock up front and wait for it
+    # instead of failing a read lock upgrade
+    settings.DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 60}
+    connections.close_all()
+
+    seed_products(1000)
+    products = list(Product.objects.order_by('id')[:args.lines + 1])
+    hot, others = products[0], products[1:]
+    Product.objects.filter(pk=hot.pk).update(stock=args.stock)
+    Product.objects.filter(pk__in=[p.pk for p in others]).update(stock=10 * args.buyers)
+
+    def buyer(name, lines):
+        user = User.objects.create_user(name, password='bench')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=1) for p in lines])
+        return user
+
+    if args.queued:
+        get_redis_connection('default').delete(queue_key())
+    users = queue.Queue()
+    for i in range(args.buyers):
+        users.put(buyer(f'buyer{i}', products))
+    connection.close()
+
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def work():
+        client = APIClient()
+        while True:
+            try:
+                user = users.get_nowait()
+            except queue.Empty:
+                break
+            client.force_authenticate(user=user)
+            response = client.post('/api/orders/', ORDER, format='json')
+            with lock:
+                statuses[response.status_code] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=work) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if args.queued:
+        print(f'queued {statuses[202]} checkouts in {elapsed:.2f}s ({args.buyers / elapsed:.0f}/s)')
+        batches = 0
+        worker_start = time.perf_counter()
+        while True:
+            batch = pop_batch(args.batch_size, timeout=0)
+            if not batch:
+                break
+            for _, order, _ in process_batch(batch):
+                statuses[201 if order is not None else 'rejected'] += 1
+            batches += 1
+        worker = time.perf_counter() - worker_start
+        elapsed += worker
+        print(f'worker placed them in {batches} transactions in {worker:.2f}s')
+
+    hot.refresh_from_db()
+    sold = sum(OrderItem.objects.filter(product=hot).values_list('quantity', flat=True))
+    print(f'{args.buyers} buyers on {args.threads} threads for {args.stock} units: {dict(statuses)}')
+    print(f'{statuses[201] / elapsed:.0f} orders/s, {args.buyers / elapsed:.0f} checkouts/s')
+    print(f'sold {sold}, stock left {hot.stock}, oversold {"yes" if sold > args.stock or hot.stock < 0 else "no"}')
+
+    if args.queued:
+        return
+    print(f'\n{"cart lines":>10} {"queries":>8}')
+    client = APIClient()
+    for size in (1, 5, 20):
+        if size > len(others):
+            others = list(Product.objects.order_by('id')[1:size + 1])
+            Product.objects.filter(pk__in=[p.pk for p in others]).update(stock=1000)
+        client.force_authenticate(user=buyer(f'size{size}', others[:size]))
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post('/api/orders/', ORDER, format='json')
+        assert response.status_code == 201, response.content
+        print(f'{size:>10} {len(ctx.captured_queries):>8}')
+
+
+if __name__ == '__main__':
+    main()
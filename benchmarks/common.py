@@ -0,0 +1,80 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database (migrated from scratch) so
+they never touch db.sqlite3. Run them from the repository root, e.g.
+    python benchmarks/search.py --rows 100000 1000000
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce_backend.settings")
+
+import django  # noqa: E402
+
+
+def setup_database():
+    """Configure Django against a fresh temporary database and migrate it"""
+    from django.conf import settings
+
+    path = os.path.join(tempfile.mkdtemp(prefix='ecommerce-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = path
+    # DEBUG keeps the SQL of the last 9000 queries around, which skews memory numbers
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def timed(func, repeat=5):
+    """Best wall clock time of ``repeat`` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+WORDS = (
+    'laptop phone cable charger wireless gaming office desk chair lamp bottle bag '
+    'keyboard mouse monitor speaker headset camera watch shoe jacket book pen '
+    'notebook table sofa pillow blanket kettle blender mixer knife pan tent '
+    'bicycle helmet ball racket glove bracelet ring necklace mirror clock'
+).split()
+
+
+def seed_products(rows, categories=20, batch_size=10000):
+    """Bulk insert ``rows`` products with random words (deterministic seed)"""
+    import random
+    from products.models import Category, Product
+
+    rng = random.Random(42)
+    # Real words drowned in a large synthetic vocabulary so terms are selective
+    syllables = ['ka', 'lo', 'mi', 'ren', 'tu', 'sha', 'vo', 'ne', 'bri', 'dax']
+    vocabulary = WORDS + sorted({
+        ''.join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(20000)
+    })
+    cats = list(Category.objects.all()) or Category.objects.bulk_create(
+        [Category(name=f'Category {i}') for i in range(categories)]
+    )
+
+    existing = Product.objects.count()
+    for offset in range(existing, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - offset)):
+            batch.append(Product(
+                name=' '.join(rng.choices(vocabulary, k=3)).title(),
+                description=' '.join(rng.choices(vocabulary, k=30)),
+                price=rng.randint(100, 100000) / 100,
+                stock=rng.randint(0, 100),
+                category=rng.choice(cats),
+            ))
+        Product.objects.bulk_create(batch)
+    Category.objects.all().rebuild_products_count()
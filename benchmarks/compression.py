@@ -0,0 +1,53 @@
+"""
+Size and gzip cost of typical API responses. This is the time a plain GZip
+middleware would spend on every cache hit, which pre-compressed entries pay
+once per rebuild instead.
+
+    python benchmarks/compression.py --rows 5000
+"""
+
+import argparse
+import gzip
+
+from common import setup_database, seed_products, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--level', type=int, default=6)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from rest_framework.test import APIClient
+    from products.models import Product
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    seed_products(args.rows)
+    client = APIClient()
+    product_id = Product.objects.values_list('id', flat=True).first()
+    urls = [
+        '/api/products/',
+        '/api/products/?page_size=100',
+        '/api/products/?page_size=100&fields=id,name,price,in_stock',
+        '/api/products/?page_size=100&format=msgpack',
+        f'/api/products/{product_id}/',
+        '/api/products/categories/',
+        '/api/products/facets/',
+    ]
+
+    print(f'{"endpoint":<58} {"bytes":>8} {"gzip":>7} {"ratio":>6} {"gzip ms":>8}')
+    for url in urls:
+        body = client.get(url).content
+        compressed = gzip.compress(body, compresslevel=args.level, mtime=0)
+        ms = timed(lambda: gzip.compress(body, compresslevel=args.level, mtime=0), repeat=20)
+        print(
+            f'{url:<58} {len(body):>8} {len(compressed):>7} '
+            f'{len(compressed) / len(body):>6.2f} {ms:>8.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
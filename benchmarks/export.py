@@ -0,0 +1,46 @@
+"""
+Streaming product export: time and peak memory while draining the response.
+
+    python benchmarks/export.py --rows 100000 1000000
+"""
+
+import argparse
+import resource
+import time
+
+from common import setup_database, seed_products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--output', choices=['ndjson', 'csv'], default='ndjson')
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    settings.ALLOWED_HOSTS.append('testserver')
+
+    admin = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    print(f'{"rows":>9} {"MB":>8} {"seconds":>8} {"peak RSS MB":>12}')
+    for rows in args.rows:
+        seed_products(rows)
+
+        start = time.perf_counter()
+        response = client.get(f'/api/products/export/?output={args.output}')
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        print(f'{rows:>9} {size / 2 ** 20:>8.0f} {elapsed:>8.1f} {peak:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Bulk catalog import: throughput and peak memory for a generated NDJSON/CSV file.
+
+    python benchmarks/import_catalog.py --rows 1000000 --format ndjson
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from common import WORDS, setup_database
+
+
+def write_file(path, rows, fmt):
+    rng = random.Random(42)
+    fields = ['name', 'description', 'price', 'stock', 'category']
+    with open(path, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fields) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for _ in range(rows):
+            row = {
+                'name': ' '.join(rng.choices(WORDS, k=3)).title(),
+                'description': ' '.join(rng.choices(WORDS, k=30)),
+                'price': f'{rng.randint(100, 100000) / 100:.2f}',
+                'stock': rng.randint(0, 100),
+                'category': f'Category {rng.randint(0, 19)}',
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                handle.write(json.dumps(row) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson'], default='ndjson')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from products.importer import import_catalog
+
+    path = os.path.join(tempfile.mkdtemp(prefix='ecommerce-bench-'), f'catalog.{args.file_format}')
+    write_file(path, args.rows, args.file_format)
+    size = os.path.getsize(path) / 2 ** 20
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start = time.perf_counter()
+    with open(path, 'rb') as stream:
+        result = import_catalog(stream, args.file_format, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f'{args.rows} rows ({size:.0f} MB {args.file_format}): '
+          f'created {result.created}, failed {result.failed}')
+    print(f'{elapsed:.1f} s, {args.rows / elapsed:,.0f} rows/s')
+    print(f'peak RSS {rss_after:.0f} MB (before import {rss_before:.0f} MB)')
+
+
+if __name__ == '__main__':
+    main()
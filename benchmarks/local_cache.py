@@ -0,0 +1,57 @@
+"""
+Hot cache hits with and without the per process LRU in front of Redis.
+
+    python benchmarks/local_cache.py --requests 2000
+"""
+
+import argparse
+import time
+
+from common import setup_database, seed_products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from ecommerce_backend import local_cache, metrics
+    from products.models import Product
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    seed_products(1000)
+    product_id = Product.objects.values_list('id', flat=True).first()
+    urls = ['/api/products/?page_size=50', f'/api/products/{product_id}/', '/api/products/categories/']
+    client = APIClient()
+
+    print(f'{"endpoint":<32} {"local tier":>10} {"ms/request":>11} {"local hits":>11}')
+    for url in urls:
+        for entries in (0, 1000):
+            with override_settings(LOCAL_CACHE=dict(settings.LOCAL_CACHE, MAX_ENTRIES=entries)):
+                cache.clear()
+                local_cache.clear_all()
+                metrics.reset()
+                client.get(url)  # fill the cache
+
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    client.get(url)
+                elapsed = time.perf_counter() - start
+
+                counters = next(
+                    (values for scope, values in metrics.snapshot().items() if scope.startswith('cache:')), {}
+                )
+                print(
+                    f'{url:<32} {"on" if entries else "off":>10} '
+                    f'{elapsed * 1000 / args.requests:>11.3f} {counters.get("local_hits", 0):>11}'
+                )
+
+
+if __name__ == '__main__':
+    main()
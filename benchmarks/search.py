@@ -0,0 +1,48 @@
+"""
+Product search: SearchFilter's icontains scan vs. the FTS5 index.
+
+    python benchmarks/search.py --rows 100000 1000000
+"""
+
+import argparse
+
+from common import setup_database, seed_products, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--terms', nargs='+', default=['laptop', 'wireless cha', 'helmet ring'])
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.db.models import Q
+    from products.models import Product
+    from products.search import search_products
+
+    base = Product.objects.select_related('category')
+
+    def icontains(term):
+        queryset = base
+        for word in term.split():
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        return queryset
+
+    def fts(term):
+        return search_products(base, term).order_by('-search_rank')
+
+    print(f"{'rows':>9} {'term':<14} {'matches':>8} {'icontains ms':>13} {'fts ms':>9} {'speedup':>8}")
+    for rows in sorted(args.rows):
+        seed_products(rows)
+        for term in args.terms:
+            # count + first page, like a paginated list request
+            like_ms = timed(lambda: (icontains(term).count(), list(icontains(term)[:10])))
+            fts_ms = timed(lambda: (fts(term).count(), list(fts(term)[:10])))
+            matches = fts(term).count()
+            print(f'{rows:>9} {term:<14} {matches:>8} {like_ms:>13.1f} {fts_ms:>9.1f} '
+                  f'{like_ms / fts_ms:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
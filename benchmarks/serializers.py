@@ -0,0 +1,74 @@
+"""
+Serializer throughput (rows per second) with DRF's generic field dispatch
+and with the compiled plans. Rows are loaded once, only serialization is timed.
+
+    python benchmarks/serializers.py --rows 5000
+"""
+
+import argparse
+import random
+from unittest import mock
+
+from common import setup_database, seed_products, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.contrib.auth.models import User
+    from ecommerce_backend.compiled_serializers import CompiledSerializerMixin
+    from products.models import Product
+    from products.serializers import ProductSerializer
+    from orders.models import Cart, CartItem, Order, OrderItem
+    from orders.serializers import CartItemSerializer, OrderItemSerializer, OrderSerializer
+
+    seed_products(args.rows)
+    rng = random.Random(42)
+    products = list(Product.objects.select_related('category'))
+
+    # One cart per user holds 50 items, orders get 5 items each (few enough
+    # orders for the prefetch to stay below SQLite's expression depth limit)
+    users = User.objects.bulk_create([User(username=f'user{i}') for i in range(args.rows // 50)])
+    carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=rng.randint(1, 5))
+        for cart in carts for product in rng.sample(products, 50)
+    ])
+    orders = Order.objects.bulk_create([
+        Order(user=rng.choice(users), shipping_address='Somewhere 12345', phone_number='1', total_price=42)
+        for _ in range(args.rows // 25)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=2, price=product.price)
+        for order in orders for product in rng.sample(products, 5)
+    ])
+
+    cases = [
+        (ProductSerializer, products),
+        (OrderItemSerializer, list(OrderItem.objects.select_related('product'))),
+        (CartItemSerializer, list(CartItem.objects.select_related('product__category'))),
+        (OrderSerializer, list(Order.objects.select_related('user').prefetch_related('items__product'))),
+    ]
+
+    print(f'{"serializer":<22} {"rows":>7} {"DRF rows/s":>11} {"compiled rows/s":>16} {"speedup":>8}')
+    for serializer_class, instances in cases:
+        def run():
+            serializer_class(instances, many=True).data
+
+        # Nested serializers go back to DRF as well
+        with mock.patch.object(CompiledSerializerMixin, 'compiled', False):
+            before = timed(run, repeat=3)
+        after = timed(run, repeat=3)
+        rows = len(instances)
+        print(
+            f'{serializer_class.__name__:<22} {rows:>7} {rows / before * 1000:>11.0f} '
+            f'{rows / after * 1000:>16.0f} {before / after:>7.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
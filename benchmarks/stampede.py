@@ -0,0 +1,74 @@
+"""
+Cache stampede: concurrent requests for a product page right after an
+invalidation, counting how many of them rebuild the page.
+
+    python benchmarks/stampede.py --threads 50
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+
+from common import setup_database, seed_products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.conf import settings
+    from django.db import connection
+    from rest_framework.test import APIClient
+    from ecommerce_backend import metrics
+    from ecommerce_backend.cache_tags import invalidate_tags, product_tag
+    from products.models import Product
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    seed_products(1000)
+    product_id = Product.objects.values_list('id', flat=True).first()
+    url = f'/api/products/{product_id}/'
+    connection.close()
+
+    states = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def fetch(barrier):
+        client = APIClient()
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+        with lock:
+            states[response['X-Cache']] += 1
+            latencies.append(elapsed)
+        connection.close()
+
+    APIClient().get(url)
+    metrics.reset()
+    for _ in range(args.rounds):
+        invalidate_tags([product_tag(product_id)])
+        barrier = threading.Barrier(args.threads)
+        threads = [threading.Thread(target=fetch, args=(barrier,)) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    counters = metrics.snapshot().get('cache:product', {})
+    latencies.sort()
+    print(f'{args.rounds} invalidations x {args.threads} concurrent requests')
+    print(f'responses: {dict(states)}')
+    print(f"recomputes: {counters.get('recomputes', 0)}, stale hits: {counters.get('stale_hits', 0)}, "
+          f"lock waits: {counters.get('lock_waits', 0)}")
+    print(f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
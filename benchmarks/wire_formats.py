@@ -0,0 +1,69 @@
+"""
+Payload size and encode/decode time of JSON against MessagePack for product
+and order responses. The data is serialized once, only the wire format is timed.
+
+    python benchmarks/wire_formats.py --rows 5000
+"""
+
+import argparse
+import gzip
+import json
+import random
+
+from common import setup_database, seed_products, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_database()
+
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+    from ecommerce_backend.messagepack import MessagePackRenderer, unpackb
+    from products.models import Product
+    from products.serializers import ProductSerializer
+    from orders.models import Order, OrderItem
+    from orders.serializers import OrderSerializer
+
+    seed_products(args.rows)
+    rng = random.Random(42)
+    products = list(Product.objects.select_related('category'))
+    user = User.objects.create(username='bench')
+    orders = Order.objects.bulk_create([
+        Order(user=user, shipping_address='Somewhere 12345', phone_number='1', total_price=42)
+        for _ in range(200)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=2, price=product.price)
+        for order in orders for product in rng.sample(products, 5)
+    ])
+    orders = Order.objects.select_related('user').prefetch_related('items__product')
+
+    payloads = [
+        ('product page (100)', {'next': None, 'previous': None,
+                                'results': ProductSerializer(products[:100], many=True).data}),
+        (f'products ({len(products)})', ProductSerializer(products, many=True).data),
+        ('orders (200 x 5 items)', OrderSerializer(orders, many=True).data),
+    ]
+    formats = [
+        ('json', JSONRenderer(), json.loads),
+        ('msgpack', MessagePackRenderer(), unpackb),
+    ]
+
+    print(f'{"payload":<24} {"format":<8} {"bytes":>9} {"gzip":>8} {"encode ms":>10} {"decode ms":>10}')
+    for name, data in payloads:
+        for label, renderer, decode in formats:
+            body = renderer.render(data)
+            encode_ms = timed(lambda: renderer.render(data))
+            decode_ms = timed(lambda: decode(body))
+            print(
+                f'{name:<24} {label:<8} {len(body):>9} {len(gzip.compress(body)):>8} '
+                f'{encode_ms:>10.2f} {decode_ms:>10.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from orders.routing import websocket_urlpatterns
+from products.routing import websocket_urlpatterns as product_websocket_urlpatterns
 
 
 from django.core.asgi import get_asgi_application
@@ -25,7 +26,7 @@ application = ProtocolTypeRouter({
     'http': django_asgi_app,  # Normal HTTP requests
     'websocket': AuthMiddlewareStack(  # WebSocket connections with auth
         URLRouter(
-            websocket_urlpatterns
+            websocket_urlpatterns + product_websocket_urlpatterns
         )
     ),
 })
\ No newline at end of file
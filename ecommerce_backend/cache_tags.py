@@ -0,0 +1,189 @@
+"""
+Tag based invalidation for cached API responses.
+
+Every cached entry is registered in one Redis set per tag it depends on
+(a product, a category, "all products" ...). A write then only drops the
+members of the tags it touched - O(tags) work instead of the SCAN that
+cache.delete_pattern() does over the whole keyspace.
+
+Each invalidation also bumps a version and a modification time per tag,
+which conditional GETs (ETag / Last-Modified) are derived from.
+
+Invalidations are also broadcast to the per process caches of every worker
+(local_cache.py).
+
+Invalidated entries are not deleted right away but renamed to a stale key
+that lives for STALE_GRACE seconds, so readers can be served the previous
+version while a single request rebuilds it (see caching.py).
+"""
+
+import logging
+import time
+import uuid
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from . import local_cache, metrics
+
+logger = logging.getLogger(__name__)
+
+# Unfiltered product listings depend on every product
+ALL_PRODUCTS = 'products:all'
+# Category listings (names + product counts)
+ALL_CATEGORIES = 'categories:all'
+# Order listings seen by staff
+ALL_ORDERS = 'orders:all'
+
+# Seconds an invalidated or expired entry may still be served while it is rebuilt
+STALE_GRACE = 30
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def order_tag(order_id):
+    return f'order:{order_id}'
+
+
+def user_orders_tag(user_id):
+    return f'user:{user_id}:orders'
+
+
+def cart_tag(user_id):
+    return f'user:{user_id}:cart'
+
+
+def product_write_tags(products):
+    """
+    Tags a write to ``products`` ((id, category id) pairs) has to invalidate.
+    Listings and their ETags only follow the scope tags (ALL_PRODUCTS, the
+    category), so a write bumping just the product tags goes unnoticed there.
+    """
+    tags = {ALL_PRODUCTS}
+    for product_id, category_id in products:
+        tags.add(product_tag(product_id))
+        tags.add(category_tag(category_id))
+    return tags
+
+
+def stale_key(key):
+    """Key the previous version of ``key`` is kept under after an invalidation"""
+    return f'{key}:stale'
+
+
+def _tag_key(tag):
+    return cache.make_key(f'tag:{tag}')
+
+
+def _version_key(tag):
+    # Hash of version (v) and last modification time (t)
+    return cache.make_key(f'tagver:{tag}')
+
+
+def tag_versions(tags):
+    """
+    (validator, last modified timestamp) for the current state of ``tags``.
+
+    The validator changes whenever any of the tags is invalidated. It also
+    carries an epoch created with the first version, so versions that start
+    over after Redis lost its data never repeat an older validator.
+    """
+    tags = sorted(set(tags))
+    client = get_redis_connection('default')
+    epoch_key = cache.make_key('tagver:epoch')
+
+    pipe = client.pipeline(transaction=False)
+    pipe.set(epoch_key, f'{uuid.uuid4().hex}:{time.time()}', nx=True)
+    pipe.get(epoch_key)
+    for tag in tags:
+        pipe.hmget(_version_key(tag), 'v', 't')
+    _, epoch, *versions = pipe.execute()
+
+    epoch = epoch.decode()
+    validator = ':'.join([epoch] + [(version or b'0').decode() for version, _ in versions])
+    # Tags never invalidated haven't changed since the epoch started
+    last_modified = max([float(epoch.split(':')[1])] + [float(t) for _, t in versions if t])
+    return validator, last_modified
+
+
+def set_tagged(key, value, tags, timeout, since=None):
+    """
+    Store ``value`` under ``key`` and register it with each of ``tags``.
+
+    ``since`` is when the value started being computed: it isn't kept if
+    any of the tags was invalidated from then on, as it may predate that
+    write. Returns whether the value was kept.
+    """
+    client = get_redis_connection('default')
+    full_key = cache.make_key(key)
+    tags = sorted(set(tags))
+
+    pipe = client.pipeline(transaction=False)
+    for tag in tags:
+        pipe.sadd(_tag_key(tag), full_key)
+        pipe.expire(_tag_key(tag), timeout)
+    pipe.execute()
+
+    cache.set(key, value, timeout)
+
+    # An invalidation between the SADDs and the set deleted the tag sets but
+    # found no key to drop, the entry would outlive it. One after this check
+    # finds the entry registered.
+    pipe = client.pipeline(transaction=False)
+    for tag in tags:
+        pipe.sismember(_tag_key(tag), full_key)
+        pipe.hget(_version_key(tag), 't')
+    results = pipe.execute()
+    registered = all(results[::2])
+    # Invalidation times come from the writers' clocks, like Last-Modified
+    current = since is None or all(t is None or float(t) < since for t in results[1::2])
+    if registered and current:
+        return True
+
+    cache.delete(key)
+    metrics.incr('cache_invalidation', 'stale_stores_dropped')
+    return False
+
+
+def invalidate_tags(tags):
+    """
+    Drop every cached entry registered with any of ``tags``.
+    Returns how many entries were actually removed.
+    """
+    tags = set(tags)
+    if not tags:
+        return 0
+
+    client = get_redis_connection('default')
+    tag_keys = [_tag_key(tag) for tag in tags]
+
+    # Read and clear the tag sets atomically so no registration gets lost
+    now = time.time()
+    pipe = client.pipeline()
+    for tag_key in tag_keys:
+        pipe.smembers(tag_key)
+    pipe.delete(*tag_keys)
+    for tag in tags:
+        pipe.hincrby(_version_key(tag), 'v', 1)
+        pipe.hset(_version_key(tag), 't', now)
+    results = pipe.execute()
+    members = results[:len(tag_keys)]
+    local_cache.invalidate(tags)
+
+    # Keep the old values around for STALE_GRACE (missing keys just fail)
+    pipe = client.pipeline(transaction=False)
+    for key in {key.decode() for key in set().union(*members)}:
+        pipe.rename(key, stale_key(key))
+        pipe.expire(stale_key(key), STALE_GRACE)
+    results = pipe.execute(raise_on_error=False)
+    dropped = sum(1 for result in results[::2] if result is True)
+
+    metrics.incr_many('cache_invalidation', {'invalidations': 1, 'entries_dropped': dropped})
+    logger.info('Invalidated tags %s: dropped %d cached entries', sorted(tags), dropped)
+    return dropped
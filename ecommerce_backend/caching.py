@@ -0,0 +1,319 @@
+"""
+Response caching for viewsets.
+
+Responses are cached as the final rendered bytes together with their headers,
+so a hit is replayed without touching serializers or renderers. Keys are built
+from a sha1 over the canonical request (sorted query params, url kwargs,
+negotiated media type and, if needed, the user) which makes them identical in
+every worker process - unlike hash() which is salted per process.
+
+Misses are single-flight: the first request takes a short Redis lock and
+rebuilds the entry while concurrent requests for the same key are served the
+previous version (expired, or renamed by invalidate_tags) for up to
+STALE_GRACE seconds, or wait for the rebuild if there is none.
+
+Views with a ``local_cache`` (see local_cache.py) keep their hottest entries
+and tag versions in process memory in front of Redis.
+
+Views that describe their validators (``get_validators``) also get strong
+ETags and Last-Modified headers built from the tag versions in cache_tags.py,
+and conditional GETs are answered with a 304 before any lookup or rendering.
+
+Entries large enough to compress also keep a gzipped body (compression.py)
+which is sent as-is to clients accepting gzip.
+"""
+
+import hashlib
+import json
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from rest_framework.response import Response
+
+from . import compression, metrics
+from .cache_tags import STALE_GRACE, set_tagged, stale_key, tag_versions
+
+# Rendered body plus the (header, value) pairs it was served with. Entries
+# live STALE_GRACE longer than fresh_until so they can still be served stale.
+# The tags register the entry in the local cache when it is read back.
+# gzip_body is the pre-compressed body (None when too small to bother).
+CachedResponse = namedtuple(
+    'CachedResponse', ['body', 'headers', 'fresh_until', 'tags', 'gzip_body'],
+    defaults=[None, (), None]
+)
+
+
+def build_cache_key(prefix, request, url_kwargs=None, user_id=None, params=None):
+    """
+    Deterministic cache key for a (negotiated) GET request. ``params``
+    ({name: [values]}) replaces the request's query params.
+    """
+    if params is None:
+        params = {name: request.query_params.getlist(name) for name in request.query_params}
+    params = sorted((name, sorted(values)) for name, values in params.items())
+    material = [
+        params,
+        sorted((url_kwargs or {}).items()),
+        request.accepted_media_type,
+        user_id,
+    ]
+    blob = json.dumps(material, separators=(',', ':'), default=str)
+    return f'resp:{prefix}:{hashlib.sha1(blob.encode()).hexdigest()}'
+
+
+class ResponseCacheMixin:
+    """
+    Serves responses through ``cached_response`` from the cache.
+
+    Views describe what an entry depends on through ``get_cache_tags`` so
+    writes can invalidate it with ``invalidate_tags``.
+    """
+    cache_timeout = 3600
+    # Cache responses per user (orders, cart), otherwise shared by everyone
+    cache_per_user = False
+    # Serve the previous version while another request rebuilds the entry
+    cache_serve_stale = True
+    # Longest a rebuild may hold the lock, and how long others wait for it
+    cache_lock_timeout = 10
+    cache_lock_wait = 2
+    # Per process LRU in front of Redis (a local_cache.LocalCache)
+    local_cache = None
+
+    def get_cache_tags(self, data):
+        """Tags the cached ``data`` of the current action depends on"""
+        return ()
+
+    def get_validators(self, url_kwargs):
+        """
+        (tags, watermark) the current version of the response is identified
+        by, or None for no ETag/Last-Modified. Unlike the cache tags these
+        have to be known before the response is built. ``watermark`` is an
+        optional updated_at of the object itself.
+        """
+        return None
+
+    def rebuild_context(self, validators):
+        """Context manager the handler runs in when an entry is (re)built"""
+        return nullcontext()
+
+    def get_cache_key_params(self, request):
+        """Query params the cache key is built from, {name: [values]}"""
+        return {name: request.query_params.getlist(name) for name in request.query_params}
+
+    def get_response_cache_key(self, request, url_kwargs):
+        user_id = request.user.id if self.cache_per_user else None
+        return build_cache_key(
+            f'{self.basename}:{self.action}', request, url_kwargs, user_id,
+            params=self.get_cache_key_params(request),
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # The browsable API embeds forms for the current user, never cache it
+        if request.accepted_renderer.format == 'api':
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request, kwargs)
+        local = self.local_cache if self.local_cache is not None and self.local_cache.enabled else None
+
+        validators = self._current_validators(key, kwargs, local)
+        if validators:
+            etag, last_modified = validators
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                metrics.incr_buffered(self._metrics_scope, {'not_modified': 1})
+                return self._add_validators(not_modified, validators)
+
+        generation = None
+        if local is not None:
+            # Local entries never outlive fresh_until
+            entry = local.get(key)
+            if entry is not None:
+                return self._add_validators(self._replay(entry, 'HIT', local=True), validators)
+            metrics.incr_buffered(self._metrics_scope, {'local_misses': 1})
+            generation = local.generation
+
+        entry = cache.get(key)
+        if entry is not None and self._is_fresh(entry):
+            if local is not None:
+                local.set(key, entry, entry.tags, generation, ttl=entry.fresh_until - time.time())
+            return self._add_validators(self._replay(entry, 'HIT'), validators)
+
+        metrics.incr_buffered(self._metrics_scope, {'misses': 1})
+        lock = get_redis_connection('default').lock(
+            cache.make_key(f'lock:{key}'), timeout=self.cache_lock_timeout
+        )
+        if not lock.acquire(blocking=False):
+            # Someone else is rebuilding this entry
+            stale = entry if self.cache_serve_stale else None
+            if stale is None and self.cache_serve_stale:
+                stale = cache.get(stale_key(key))
+            if stale is not None:
+                metrics.incr(self._metrics_scope, 'stale_hits')
+                # No validators, the body is not the current version
+                return self._replay(stale, 'STALE')
+
+            fresh = self._wait_for_rebuild(key, lock)
+            if fresh is not None:
+                return self._add_validators(self._replay(fresh, 'HIT'), validators)
+            lock = None  # the rebuild failed or took too long, do it here
+        else:
+            # The previous holder may have stored it right before we got the lock
+            fresh = cache.get(key)
+            if fresh is not None and self._is_fresh(fresh):
+                lock.release()
+                return self._add_validators(self._replay(fresh, 'HIT'), validators)
+
+        metrics.incr_buffered(self._metrics_scope, {'recomputes': 1})
+        # Writes invalidating the entry from here on may not be in the response
+        request._response_cache_started = time.time()
+        try:
+            with self.rebuild_context(validators):
+                response = handler(request, *args, **kwargs)
+        except Exception:
+            if lock is not None:
+                lock.release()
+            raise
+        # Stored (and the lock released) by finalize_response once the renderer is known
+        request._response_cache_key = key
+        request._response_cache_lock = lock
+        request._response_cache_generation = generation
+        return self._add_validators(response, validators)
+
+    @staticmethod
+    def _is_fresh(entry):
+        return entry.fresh_until is None or entry.fresh_until > time.time()
+
+    def _replay(self, entry, state, local=False):
+        if state == 'HIT':
+            # Counted in process, no extra Redis round trip on the hot path
+            counts = {'hits': 1, 'hit_bytes': len(entry.body)}
+            if local:
+                counts['local_hits'] = 1
+            metrics.incr_buffered(self._metrics_scope, counts)
+        response = HttpResponse(entry.body)
+        for header, value in entry.headers:
+            response[header] = value
+        response['X-Cache'] = state
+        if entry.gzip_body is not None and compression.accepts_gzip(self.request):
+            compression.send_compressed(
+                response, entry.gzip_body, compression.endpoint_name(self.request)
+            )
+        return response
+
+    def _wait_for_rebuild(self, key, lock):
+        """Poll for the entry another request is rebuilding, None if it doesn't show up"""
+        metrics.incr(self._metrics_scope, 'lock_waits')
+        deadline = time.monotonic() + self.cache_lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = cache.get(key)
+            if entry is not None and self._is_fresh(entry):
+                return entry
+            if not lock.locked():
+                # Released without storing anything (error response)
+                return None
+        return None
+
+    def _current_validators(self, key, url_kwargs, local=None):
+        """(ETag, Last-Modified timestamp) of the current version or None"""
+        spec = self.get_validators(url_kwargs)
+        if spec is None:
+            return None
+
+        tags, watermark = spec
+        if local is not None:
+            versions_key = ('tagver',) + tuple(sorted(set(tags)))
+            versions = local.get(versions_key)
+            if versions is None:
+                generation = local.generation
+                versions = tag_versions(tags)
+                local.set(versions_key, versions, tags, generation)
+            validator, last_modified = versions
+        else:
+            validator, last_modified = tag_versions(tags)
+        if watermark is not None:
+            validator = f'{validator}:{watermark.isoformat()}'
+            last_modified = max(last_modified, watermark.timestamp())
+
+        # The cache key covers the query, the media type and (per user views) the user
+        etag = hashlib.sha1(f'{key}:{validator}'.encode()).hexdigest()
+        return f'"{etag}"', int(last_modified)
+
+    def _add_validators(self, response, validators):
+        # Validators only describe the successful representation
+        if validators and (200 <= response.status_code < 300 or response.status_code == 304):
+            etag, last_modified = validators
+            # A gzipped body is only semantically equivalent
+            response['ETag'] = f'W/{etag}' if response.has_header('Content-Encoding') else etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        key = getattr(request, '_response_cache_key', None)
+        lock = getattr(request, '_response_cache_lock', None)
+        try:
+            if key and isinstance(response, Response) and response.status_code == 200:
+                response.render()
+                gzip_body = None
+                if compression.is_compressible(response):
+                    patch_vary_headers(response, ('Accept-Encoding',))
+                    gzip_body = compression.compress(
+                        response.content, compression.endpoint_name(request)
+                    )
+                # Validators are recomputed for every request
+                headers = [
+                    (header, value) for header, value in response.items()
+                    if header not in ('ETag', 'Last-Modified')
+                ]
+                tags = getattr(response, 'cache_tags', None)
+                if tags is None:
+                    tags = self.get_cache_tags(response.data)
+                entry = CachedResponse(
+                    response.content, headers, time.time() + self.cache_timeout, tuple(set(tags)),
+                    gzip_body,
+                )
+                stored = set_tagged(
+                    key, entry, tags, self.cache_timeout + STALE_GRACE,
+                    since=getattr(request, '_response_cache_started', None),
+                )
+                generation = getattr(request, '_response_cache_generation', None)
+                if stored and self.local_cache is not None and generation is not None:
+                    self.local_cache.set(key, entry, entry.tags, generation, ttl=self.cache_timeout)
+                metrics.incr_buffered(self._metrics_scope, {'stored_bytes': len(entry.body)})
+                response['X-Cache'] = 'MISS'
+                if gzip_body is not None and compression.accepts_gzip(request):
+                    compression.send_compressed(
+                        response, gzip_body, compression.endpoint_name(request)
+                    )
+        finally:
+            if lock is not None:
+                request._response_cache_lock = None
+                try:
+                    lock.release()
+                except LockError:
+                    pass  # expired meanwhile, someone else may hold it now
+
+        return response
+
+    @property
+    def _metrics_scope(self):
+        return f'cache:{self.basename}'
+
+
+class CachedResponseMixin(ResponseCacheMixin):
+    """Caches ``list`` and ``retrieve`` of a model viewset"""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
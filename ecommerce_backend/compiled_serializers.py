@@ -0,0 +1,233 @@
+"""
+Compiled to_representation for hot list serializers.
+
+DRF resolves every field of every row through the same generic machinery:
+get_attribute walks source_attrs with isinstance/callable checks, then
+to_representation does the conversion (a Decimal is quantized in a fresh
+context for every value). For a list the work per field is always the same,
+so CompiledSerializerMixin turns the serializer's readable fields into a flat
+plan of (name, getter, converter) once per serializer instance and runs that
+over every row.
+
+Getters are plain attribute / key lookups where the source is a plain path of
+model fields and properties, converters are the cheap equivalents of the
+common field types that give identical output (a DecimalField value that is
+already quantized is only formatted). Everything else - nested serializers,
+method fields, unusual values - goes through the field's own DRF methods, so
+the output is the same as the uncompiled serializer's.
+
+Plans also run over ``values()`` rows: dotted sources are looked up as
+``category__name`` keys (see SerializerPlan.values_fields).
+"""
+
+import datetime
+import decimal
+import operator
+
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.db.models.query_utils import DeferredAttribute
+from rest_framework import fields, relations
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+# A missing attribute or key, the step falls back to DRF
+_SLOW = object()
+# SkipField, the field is left out of the output
+_SKIP = object()
+
+# What a plain source path ends in
+_VALUE, _RELATION = 'value', 'relation'
+
+
+def _drf_getter(field):
+    """DRF's own get_attribute, with SkipField and pk-only objects unwrapped for the None check"""
+    def get(instance):
+        try:
+            value = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        if isinstance(value, PKOnlyObject) and value.pk is None:
+            return None
+        return value
+    return get
+
+
+def _model_path(model, attrs):
+    """
+    _VALUE or _RELATION when ``attrs`` from ``model`` only crosses forward
+    relations and ends in a column, property or relation, None otherwise
+    (methods, reverse relations, unknown attributes)
+    """
+    for position, attr in enumerate(attrs):
+        descriptor = getattr(model, attr, None)
+        last = position == len(attrs) - 1
+        if isinstance(descriptor, ForwardManyToOneDescriptor):
+            if last:
+                return _RELATION
+            model = descriptor.field.related_model
+        elif isinstance(descriptor, (DeferredAttribute, property)) and last:
+            return _VALUE
+        else:
+            return None
+    return None
+
+
+def _attr_getter(path, slow):
+    getter = operator.attrgetter(path)
+
+    def get(instance):
+        try:
+            return getter(instance)
+        except AttributeError:
+            # A null relation on the way, DRF decides what that means
+            return slow(instance)
+    return get
+
+
+def _key_getter(key, slow):
+    def get(row):
+        value = row.get(key, _SLOW)
+        return slow(row) if value is _SLOW else value
+    return get
+
+
+def _decimal_converter(field):
+    if (
+        field.decimal_places is None or field.normalize_output or field.localize
+        or not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    ):
+        return field.to_representation
+    exponent, max_digits = -field.decimal_places, field.max_digits or float('inf')
+
+    def convert(value):
+        if type(value) is decimal.Decimal:
+            sign, digits, value_exponent = value.as_tuple()
+            # Already quantized, DRF's quantize() would return it unchanged
+            if value_exponent == exponent and len(digits) <= max_digits:
+                return f'{value:f}'
+        return field.to_representation(value)
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != fields.ISO_8601:
+        return field.to_representation
+
+    # Plans live as long as their serializer (a request), so the active
+    # timezone is looked up once instead of per value
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if type(value) is not datetime.datetime or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _boolean_converter(field):
+    def convert(value):
+        return value if type(value) is bool else field.to_representation(value)
+    return convert
+
+
+def _converter(field):
+    """Cheapest callable with the same output as ``field.to_representation``"""
+    to_representation = type(field).to_representation
+    if to_representation is fields.CharField.to_representation:
+        return str
+    if to_representation is fields.IntegerField.to_representation:
+        return int
+    if to_representation is fields.BooleanField.to_representation:
+        return _boolean_converter(field)
+    if to_representation is fields.DecimalField.to_representation:
+        return _decimal_converter(field)
+    if to_representation is fields.DateTimeField.to_representation:
+        return _datetime_converter(field)
+    return field.to_representation
+
+
+def _is_pk_related(field):
+    return (
+        type(field).get_attribute is relations.RelatedField.get_attribute
+        and type(field).to_representation is relations.PrimaryKeyRelatedField.to_representation
+        and field.pk_field is None
+        and field.use_pk_only_optimization()
+    )
+
+
+class SerializerPlan:
+    """The readable fields of one serializer instance as flat lookup steps"""
+
+    def __init__(self, serializer):
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        self.steps = []
+        self.row_steps = []
+        self.values_fields = []
+
+        for field in serializer._readable_fields:
+            slow = _drf_getter(field)
+            attrs = field.source_attrs
+            path = _model_path(model, attrs) if model is not None and attrs else None
+            get = row_get = slow
+            convert = field.to_representation
+
+            if path == _RELATION and len(attrs) == 1 and _is_pk_related(field):
+                # category -> category_id, no PKOnlyObject in between
+                get, convert = operator.attrgetter(getattr(model, attrs[0]).field.attname), _identity
+                row_get = _key_getter(attrs[0], slow)
+                self.values_fields.append(attrs[0])
+            elif path and type(field).get_attribute is fields.Field.get_attribute:
+                if len(attrs) == 1 and isinstance(getattr(model, attrs[0]), DeferredAttribute):
+                    # A column of the instance itself is always there
+                    get = operator.attrgetter(attrs[0])
+                else:
+                    get = _attr_getter('.'.join(attrs), slow)
+                if path == _VALUE:
+                    convert = _converter(field)
+                    row_get = _key_getter('__'.join(attrs), slow)
+                    self.values_fields.append('__'.join(attrs))
+
+            self.steps.append((field.field_name, get, convert))
+            self.row_steps.append((field.field_name, row_get, convert))
+
+    def __call__(self, instance):
+        steps = self.row_steps if isinstance(instance, dict) else self.steps
+        ret = {}
+        for name, get, convert in steps:
+            value = get(instance)
+            if value is _SKIP:
+                continue
+            ret[name] = None if value is None else convert(value)
+        return ret
+
+
+def _identity(value):
+    return value
+
+
+class CompiledSerializerMixin:
+    """
+    Serializer mixin that represents instances (or values() rows) with a
+    compiled SerializerPlan. Set ``compiled = False`` to go through DRF again.
+    """
+    compiled = True
+
+    @property
+    def plan(self):
+        plan = self.__dict__.get('_plan')
+        if plan is None:
+            plan = self.__dict__['_plan'] = SerializerPlan(self)
+        return plan
+
+    def to_representation(self, instance):
+        if not self.compiled:
+            return super().to_representation(instance)
+        plan = self.__dict__.get('_plan') or self.plan
+        return plan(instance)
@@ -0,0 +1,112 @@
+"""
+Negotiated gzip compression of API responses.
+
+Cached responses (caching.py) are compressed once, when the entry is built,
+and the gzipped body is stored next to the plain one, so hits go out as they
+are to clients that accept gzip. CompressionMiddleware compresses the other
+responses. Bodies smaller than COMPRESSION['MIN_SIZE'] are sent plain.
+
+Only data formats are compressed, never HTML: the browsable API and the
+admin embed CSRF tokens, which compression would expose (BREACH).
+
+Compressions are counted under ``compression:<url name>`` (``compressed``,
+``bytes_in``, ``bytes_out``, ``compress_ms``) and responses sent gzipped,
+compressed just now or stored that way, as ``served``.
+"""
+
+import gzip
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/msgpack', 'application/x-ndjson', 'text/csv',
+)
+
+
+def accepts_gzip(request):
+    """Whether Accept-Encoding allows gzip (``gzip;q=0`` refuses it)"""
+    qualities = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.view_name else 'other'
+
+
+def is_compressible(response):
+    """Plain, successful data response worth compressing"""
+    if (
+        response.streaming or response.has_header('Content-Encoding')
+        or not 200 <= response.status_code < 300
+    ):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return (
+        content_type in COMPRESSIBLE_TYPES
+        and len(response.content) >= settings.COMPRESSION['MIN_SIZE']
+    )
+
+
+def compress(body, endpoint):
+    """Gzipped ``body``, None if that doesn't make it smaller"""
+    start = time.perf_counter()
+    # mtime=0 keeps the output identical for identical bodies
+    compressed = gzip.compress(body, compresslevel=settings.COMPRESSION['LEVEL'], mtime=0)
+    metrics.incr_buffered(f'compression:{endpoint}', {
+        'compressed': 1,
+        'bytes_in': len(body),
+        'bytes_out': len(compressed),
+        'compress_ms': (time.perf_counter() - start) * 1000,
+    })
+    return compressed if len(compressed) < len(body) else None
+
+
+def send_compressed(response, compressed, endpoint):
+    """Replace the body of ``response`` with its gzipped version"""
+    response.content = compressed
+    response['Content-Encoding'] = 'gzip'
+    response['Content-Length'] = str(len(compressed))
+    # Byte for byte different from the plain representation
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = f'W/{etag}'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    metrics.incr_buffered(f'compression:{endpoint}', {'served': 1})
+    return response
+
+
+class CompressionMiddleware:
+    """gzip for compressible responses that weren't served pre-compressed"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if accepts_gzip(request):
+            endpoint = endpoint_name(request)
+            compressed = compress(response.content, endpoint)
+            if compressed is not None:
+                send_compressed(response, compressed, endpoint)
+        return response
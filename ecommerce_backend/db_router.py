@@ -0,0 +1,172 @@
+"""
+Read replica routing.
+
+Viewsets with ReplicaReadMixin run their read-only actions with replica
+reads switched on, and ReplicaRouter sends those reads to one of the healthy
+aliases in settings.DATABASE_REPLICAS. Everything else, and every write, goes
+to the primary. A replica is healthy when it answers and its replication lag
+is at most REPLICA_MAX_LAG seconds; each process checks that at most every
+REPLICA_HEALTH_INTERVAL seconds and falls back to the primary when none is.
+
+Users that just wrote something (placed an order, changed their cart) are
+pinned to the primary for REPLICA_PIN_SECONDS by ReadYourWritesMiddleware,
+so they never read their own write from a replica that hasn't replayed it.
+Cached responses rebuilt from a replica are only kept when no write they
+depend on is recent enough to be missing there.
+"""
+
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+# alias -> (checked at, healthy), per process
+_health = {}
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Switch replica reads on (or off) for the enclosed block"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replication_lag(alias):
+    """Seconds ``alias`` is behind the primary"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # An idle primary sends nothing to replay, that isn't lag
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            return float(cursor.fetchone()[0])
+        # SQLite copies standing in for replicas have no lag to measure, but an
+        # empty or missing file must not pass as healthy
+        cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        return 0.0
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_HEALTH_INTERVAL:
+        return checked[1]
+
+    try:
+        lag = replication_lag(alias)
+    except DatabaseError:
+        logger.warning('Replica %s is unreachable, reading from the primary', alias, exc_info=True)
+        connections[alias].close()
+        healthy = False
+    else:
+        healthy = lag <= settings.REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning('Replica %s is %.1fs behind, reading from the primary', alias, lag)
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def _pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_to_primary(user):
+    cache.set(_pin_key(user.pk), 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user.pk)) is not None
+
+
+class ReplicaRouter:
+    """Reads inside ``replica_reads()`` go to a healthy replica, the rest to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        healthy = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        # Explicit, otherwise Django writes an instance back to the database it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """Pins users to the primary for a while after any write request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS:
+            # DRF puts the token authenticated user on the Django request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user)
+        return response
+
+
+class ReplicaReadMixin:
+    """Runs the read-only ``replica_actions`` of a viewset on a replica"""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            request._replica_token = _replica_reads.set(True)
+
+    def reads_from_replica(self, request):
+        return bool(
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and self.action in self.replica_actions
+            and not is_pinned(request.user)
+        )
+
+    def rebuild_context(self, validators):
+        # A rebuilt cache entry is served to everyone for cache_timeout, so only
+        # build it from a replica once the last write it depends on (the
+        # Last-Modified of its tags) is surely replayed there
+        max_lag = settings.REPLICA_MAX_LAG + settings.REPLICA_HEALTH_INTERVAL + 1
+        if validators is None:
+            # Tags only known from the body: build it from the replica, but
+            # don't keep it if any of them was invalidated within the lag
+            if _replica_reads.get():
+                self.request._response_cache_started -= max_lag
+            return nullcontext()
+        if time.time() - validators[1] > max_lag:
+            return nullcontext()
+        return replica_reads(False)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(request, '_replica_token', None)
+        if token is not None:
+            request._replica_token = None
+            _replica_reads.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
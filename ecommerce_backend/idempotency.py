@@ -0,0 +1,163 @@
+"""
+Idempotency-Key support for unsafe actions.
+
+A client that retries a POST (checkout, cart changes) after a timeout sends
+the same ``Idempotency-Key`` header. The first request with a key runs the
+action and its response (status, content type and rendered body) is kept in
+Redis for IDEMPOTENCY['TTL'] seconds, together with a hash of the request.
+Retries get that response back with ``Idempotent-Replayed: true``, the
+action isn't run again.
+
+Keys are scoped to the action and the user. Reusing a key for a different
+request (method, path or body) is a 422. A duplicate arriving while the first
+request still runs waits up to IDEMPOTENCY['WAIT'] seconds for its response
+(the first request holds a Redis lock) and gets a 409 if it doesn't show up.
+Server errors aren't stored, the client may retry them with the same key.
+
+Counted under ``idempotency:<basename>`` as ``stored``, ``replays``,
+``waits``, ``conflicts`` and ``mismatches``.
+"""
+
+import functools
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+StoredResponse = namedtuple('StoredResponse', 'fingerprint status content_type body')
+
+
+def storage_key(scope, user_id, key):
+    """Cache key of the response stored for ``key``"""
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return f'idem:{scope}:{user_id}:{digest}'
+
+
+def request_fingerprint(request):
+    """Hash of what makes two requests the same request"""
+    digest = hashlib.sha1()
+    for part in (request.method, request.get_full_path(), request.content_type or ''):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def idempotent(action):
+    """Run a view method of an IdempotencyMixin view at most once per key"""
+    @functools.wraps(action)
+    def wrapper(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            functools.partial(action, self), request, *args, **kwargs
+        )
+    return wrapper
+
+
+class IdempotencyMixin:
+    """Stores and replays the responses of the view methods marked @idempotent"""
+
+    def idempotent_response(self, handler, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        storage = storage_key(f'{self.basename}:{self.action}', request.user.id, key)
+        fingerprint = request_fingerprint(request)
+
+        stored = cache.get(storage)
+        if stored is None:
+            lock = get_redis_connection('default').lock(
+                cache.make_key(f'lock:{storage}'), timeout=settings.IDEMPOTENCY['LOCK_TIMEOUT']
+            )
+            if not lock.acquire(blocking=False):
+                stored = self._wait_for_first(storage, lock)
+                if stored is None and not lock.acquire(blocking=False):
+                    metrics.incr(self._idempotency_scope, 'conflicts')
+                    response = Response({
+                        'error': f'A request with this {HEADER} is still in progress'
+                    }, status=status.HTTP_409_CONFLICT)
+                    response['Retry-After'] = '1'
+                    return response
+            if stored is None:
+                # The first request may have finished right before we got the lock
+                stored = cache.get(storage)
+                if stored is not None:
+                    lock.release()
+
+            if stored is None:
+                try:
+                    response = handler(request, *args, **kwargs)
+                except Exception:
+                    lock.release()
+                    raise
+                # Stored (and the lock released) by finalize_response once rendered
+                request._idempotency = (storage, fingerprint, lock)
+                return response
+
+        if stored.fingerprint != fingerprint:
+            metrics.incr(self._idempotency_scope, 'mismatches')
+            return Response({
+                'error': f'{HEADER} was already used for a different request'
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        metrics.incr(self._idempotency_scope, 'replays')
+        response = HttpResponse(stored.body, status=stored.status, content_type=stored.content_type)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _wait_for_first(self, storage, lock):
+        """Poll for the response of the request holding the key, None if it doesn't show up"""
+        metrics.incr(self._idempotency_scope, 'waits')
+        deadline = time.monotonic() + settings.IDEMPOTENCY['WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            stored = cache.get(storage)
+            if stored is not None:
+                return stored
+            if not lock.locked():
+                # Released without storing anything (server error), run it here
+                return None
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        pending = getattr(request, '_idempotency', None)
+        if pending is None:
+            return response
+        storage, fingerprint, lock = pending
+        request._idempotency = None
+        try:
+            if response.status_code < 500 and not response.streaming:
+                if isinstance(response, Response):
+                    response.render()
+                cache.set(storage, StoredResponse(
+                    fingerprint, response.status_code, response.get('Content-Type'), response.content,
+                ), settings.IDEMPOTENCY['TTL'])
+                metrics.incr(self._idempotency_scope, 'stored')
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass  # expired meanwhile, someone else may hold it now
+        return response
+
+    @property
+    def _idempotency_scope(self):
+        return f'idempotency:{self.basename}'
@@ -0,0 +1,214 @@
+"""
+Per-process LRU in front of the Redis response cache.
+
+The hottest product and category responses (and the tag versions their
+ETags are built from) are kept in the worker's own memory, so a hit costs
+neither a Redis round trip nor unpickling. The tier is bounded by
+LOCAL_CACHE['MAX_ENTRIES'] and every entry expires after LOCAL_CACHE['TTL']
+seconds at the latest.
+
+Entries are registered with their cache tags like in Redis. invalidate_tags
+drops them in its own process right away and publishes the tags through the
+LOCAL_CACHE['BROADCAST'] backend; every other worker has a listener thread
+subscribed to it. A listener that (re)connects drops everything, since it may
+have missed invalidations meanwhile.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'local_cache:invalidate'
+
+# Every LocalCache of this process, invalidations apply to all of them
+_caches = []
+_broadcast = None
+_broadcast_lock = threading.Lock()
+
+
+class LocalCache:
+    """Thread safe LRU of tagged entries"""
+
+    def __init__(self, name):
+        self.name = name
+        self._entries = OrderedDict()  # key -> (expires, value, tags)
+        self._tag_keys = {}  # tag -> keys registered with it
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, see set()
+        self.generation = 0
+        _caches.append(self)
+
+    @property
+    def enabled(self):
+        return settings.LOCAL_CACHE['MAX_ENTRIES'] > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        _ensure_listener()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, tags, generation, ttl=None):
+        """
+        Store ``value`` unless an invalidation happened since ``generation``
+        was read - it may have been meant for the value being stored.
+        """
+        if not self.enabled:
+            return False
+        ttl = settings.LOCAL_CACHE['TTL'] if ttl is None else min(ttl, settings.LOCAL_CACHE['TTL'])
+        if ttl <= 0:
+            return False
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            while len(self._entries) > settings.LOCAL_CACHE['MAX_ENTRIES']:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def invalidate(self, tags):
+        """Drop the entries registered with any of ``tags`` from this process only"""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self._tag_keys.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tag_keys.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+
+class RedisBroadcast:
+    """Invalidations over Redis pub/sub, one listener thread per process"""
+
+    def __init__(self):
+        self.channel = cache.make_key(CHANNEL)
+
+    def publish(self, tags):
+        get_redis_connection('default').publish(self.channel, json.dumps(sorted(tags)))
+
+    def subscribe(self, callback):
+        thread = threading.Thread(
+            target=self._listen, args=(callback,), name='local-cache-invalidation', daemon=True
+        )
+        thread.start()
+
+    def _listen(self, callback):
+        while True:
+            try:
+                pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published before we were subscribed is lost
+                callback(None)
+                for message in pubsub.listen():
+                    callback(json.loads(message['data']))
+            except Exception:
+                logger.warning('Local cache invalidation listener failed, retrying', exc_info=True)
+                callback(None)
+                time.sleep(1)
+
+
+class InProcessBroadcast:
+    """Delivers invalidations within the process, for tests and single process servers"""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, tags):
+        for callback in list(self.subscribers):
+            callback(sorted(tags))
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+
+def get_broadcast():
+    global _broadcast
+    with _broadcast_lock:
+        if _broadcast is None:
+            _broadcast = import_string(settings.LOCAL_CACHE['BROADCAST'])()
+            _broadcast.subscribe(_on_message)
+        return _broadcast
+
+
+def _ensure_listener():
+    if _broadcast is None:
+        get_broadcast()
+
+
+def _on_message(tags):
+    for local in _caches:
+        if tags is None:
+            local.clear()
+        else:
+            local.invalidate(tags)
+
+
+def invalidate(tags):
+    """Drop ``tags`` from the local caches of this and every other worker"""
+    for local in _caches:
+        local.invalidate(tags)
+    if settings.LOCAL_CACHE['MAX_ENTRIES'] > 0:
+        try:
+            get_broadcast().publish(tags)
+        except Exception:
+            # Other workers fall back on the TTL
+            logger.warning('Could not broadcast invalidation of %s', sorted(tags), exc_info=True)
+
+
+def clear_all():
+    """Empty every local cache of this process (mostly useful in tests)"""
+    for local in _caches:
+        local.clear()
+
+
+@receiver(setting_changed)
+def _reset_broadcast(setting, **kwargs):
+    global _broadcast
+    if setting == 'LOCAL_CACHE':
+        with _broadcast_lock:
+            _broadcast = None
+        clear_all()
+
+
+# Product and category responses plus the tag versions of their validators
+responses = LocalCache('responses')
@@ -0,0 +1,82 @@
+"""
+MessagePack (``application/msgpack``) renderer and parser.
+
+Picked by content negotiation like JSON: ``Accept: application/msgpack`` (or
+``?format=msgpack``) for responses and ``Content-Type: application/msgpack``
+for request bodies. Serializer output is already made of strings, numbers,
+lists and dicts. Values views hand over directly are kept exact with
+extension types:
+
+    1  Decimal   its string form, e.g. b'12.50'
+    2  datetime  ISO 8601 with the UTC offset
+    3  date      ISO 8601
+
+Anything else is converted the way DRF's JSON encoder converts it.
+"""
+
+import datetime
+import decimal
+
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+MEDIA_TYPE = 'application/msgpack'
+
+EXT_DECIMAL = 1
+EXT_DATETIME = 2
+EXT_DATE = 3
+
+_json_encoder = JSONEncoder()
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, datetime.date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode())
+    return _json_encoder.default(value)
+
+
+def _ext_hook(code, data):
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return datetime.date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def packb(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True, datetime=False)
+
+
+def unpackb(content):
+    return msgpack.unpackb(content, ext_hook=_ext_hook, raw=False)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+
+class MessagePackParser(BaseParser):
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpackb(stream.read())
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
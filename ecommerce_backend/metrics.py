@@ -0,0 +1,134 @@
+"""
+Lightweight counters shared by every worker.
+
+Counters live in Redis hashes (one hash per scope) so that numbers reported by
+the metrics endpoint add up across all gunicorn/daphne processes.
+
+Counters bumped on paths that otherwise never touch Redis (local cache hits)
+are summed up in the process and written at most every FLUSH_INTERVAL
+seconds instead.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+# Set holding the names of every scope that has been written to
+SCOPES_KEY = 'metrics:scopes'
+
+FLUSH_INTERVAL = 1.0
+
+_buffer = defaultdict(Counter)
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _key(name):
+    return cache.make_key(name)
+
+
+def incr(scope, field, amount=1):
+    """Increment a counter. Float amounts are accepted (used for timings)."""
+    incr_many(scope, {field: amount})
+
+
+def incr_many(scope, counts):
+    """Increment several counters of one scope in a single round trip"""
+    client = get_redis_connection('default')
+    pipe = client.pipeline(transaction=False)
+    for field, amount in counts.items():
+        if isinstance(amount, float):
+            pipe.hincrbyfloat(_key(f'metrics:{scope}'), field, amount)
+        else:
+            pipe.hincrby(_key(f'metrics:{scope}'), field, amount)
+    pipe.sadd(_key(SCOPES_KEY), scope)
+    pipe.execute()
+
+
+def incr_buffered(scope, counts):
+    """Like incr_many, but written to Redis with the next flush"""
+    global _last_flush
+    with _buffer_lock:
+        _buffer[scope].update(counts)
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+        if due:
+            _last_flush = time.monotonic()
+    if due:
+        flush()
+
+
+def flush():
+    """Write the buffered counters of this process"""
+    with _buffer_lock:
+        pending = dict(_buffer)
+        _buffer.clear()
+    for scope, counts in pending.items():
+        incr_many(scope, counts)
+
+
+def snapshot():
+    """Return every counter as {scope: {field: number}}"""
+    flush()
+    client = get_redis_connection('default')
+    scopes = sorted(s.decode() for s in client.smembers(_key(SCOPES_KEY)))
+
+    pipe = client.pipeline(transaction=False)
+    for scope in scopes:
+        pipe.hgetall(_key(f'metrics:{scope}'))
+
+    result = {}
+    for scope, values in zip(scopes, pipe.execute()):
+        result[scope] = {
+            field.decode(): _to_number(value) for field, value in sorted(values.items())
+        }
+    return result
+
+
+def hit_ratios(counters):
+    """
+    Hit ratio per cache tier of a ``cache:*`` scope. ``hits`` counts both
+    tiers, ``local_misses`` the lookups the local tier passed on to Redis.
+    """
+    hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+    local_hits, local_misses = counters.get('local_hits', 0), counters.get('local_misses', 0)
+    return {
+        'local': _ratio(local_hits, local_hits + local_misses),
+        'redis': _ratio(hits - local_hits, hits - local_hits + misses),
+        'overall': _ratio(hits, hits + misses),
+    }
+
+
+def compression_stats(counters):
+    """Size ratio (compressed / plain) and mean time of a ``compression:*`` scope"""
+    compressed = counters.get('compressed', 0)
+    return {
+        'ratio': _ratio(counters.get('bytes_out', 0), counters.get('bytes_in', 0)),
+        'avg_compress_ms': (
+            round(counters.get('compress_ms', 0) / compressed, 3) if compressed else None
+        ),
+    }
+
+
+def _ratio(part, total):
+    return round(part / total, 4) if total else None
+
+
+def reset():
+    """Drop all counters (mostly useful in tests)"""
+    with _buffer_lock:
+        _buffer.clear()
+    client = get_redis_connection('default')
+    scopes = [s.decode() for s in client.smembers(_key(SCOPES_KEY))]
+    keys = [_key(f'metrics:{scope}') for scope in scopes] + [_key(SCOPES_KEY)]
+    client.delete(*keys)
+
+
+def _to_number(value):
+    value = value.decode()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
@@ -0,0 +1,195 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are found with a WHERE on the last row seen instead of OFFSET, and no
+COUNT(*) is issued, so every page costs the same no matter how deep it is
+and rows inserted meanwhile never shift or duplicate results.
+
+The queryset's own ordering (``?ordering=``, the search rank or the model
+default) is used as the key with ``id`` appended as a tiebreaker. Clients
+that need totals opt in with ``?count=true``, or keep using ``?page=N``
+which falls back to the old page number pagination.
+"""
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+
+        # Explicit page numbers keep the old behaviour (including the count)
+        if request.query_params.get('page') is not None:
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        signature = [self._order_term(name, desc) for name, desc in self.ordering]
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() == 'true':
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            if cursor.get('o') != signature or len(cursor.get('v', [])) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            reverse = bool(cursor.get('r'))
+            queryset = queryset.filter(self._seek(self._load_values(queryset, cursor['v']), reverse))
+
+        # Walking backwards: flip the ordering and the page afterwards
+        directions = [(name, desc != reverse) for name, desc in self.ordering]
+        queryset = queryset.order_by(*[self._order_term(name, desc) for name, desc in directions])
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        """[(field, descending), ...] of the queryset with ``id`` as tiebreaker"""
+        terms = queryset.query.order_by or queryset.model._meta.ordering or ['-id']
+        ordering = []
+        for term in terms:
+            if not isinstance(term, str) or '__' in term.lstrip('-') or term == '?':
+                continue  # expressions and related lookups can't be used as a key
+            name = term.lstrip('-')
+            name = 'id' if name == 'pk' else name
+            ordering.append((name, term.startswith('-')))
+        if not ordering:
+            ordering = [('id', True)]
+        if all(name != 'id' for name, _ in ordering):
+            ordering.append(('id', ordering[0][1]))
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        cursor = {
+            'o': [self._order_term(name, desc) for name, desc in self.ordering],
+            'v': [self._dump(getattr(row, name)) for name, _ in self.ordering],
+            'r': int(reverse),
+        }
+        blob = json.dumps(cursor, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(blob).decode().rstrip('=')
+
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def _load_values(self, queryset, values):
+        """Cursor ``values`` converted by their ordering fields, NotFound if they don't fit"""
+        loaded = []
+        for (name, _), value in zip(self.ordering, values):
+            annotation = queryset.query.annotations.get(name)
+            try:
+                field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+                loaded.append(field.to_python(value))
+            except (DjangoValidationError, FieldDoesNotExist, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return loaded
+
+    def _seek(self, values, reverse):
+        """Rows strictly after ``values`` in the (possibly reversed) ordering"""
+        condition = Q()
+        equal = Q()
+        for (name, desc), value in zip(self.ordering, values):
+            lookup = 'lt' if desc != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # Redundant bound on the leading key so the database can seek an
+        # index range instead of filtering the OR row by row
+        name, desc = self.ordering[0]
+        bound = 'lte' if desc != reverse else 'gte'
+        return Q(**{f'{name}__{bound}': values[0]}) & condition
+
+    @staticmethod
+    def _order_term(name, desc):
+        return f'-{name}' if desc else name
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        return value
+
+    def to_html(self):
+        return ''
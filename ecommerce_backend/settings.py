@@ -55,11 +55,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Before anything that reads or sets the body length
+    'ecommerce_backend.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS should be high up
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce_backend.db_router.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -96,6 +99,25 @@ DATABASES = {
     }
 }
 
+# Read replicas - comma separated SQLite files standing in for replicas locally,
+# e.g. DB_REPLICAS=replica1.sqlite3,replica2.sqlite3 (refresh them with sync_replicas)
+DATABASE_REPLICAS = []
+for number, name in enumerate(config('DB_REPLICAS', default='').split(','), start=1):
+    if name.strip():
+        DATABASES[f'replica_{number}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / name.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['ecommerce_backend.db_router.ReplicaRouter']
+# Replicas further behind than this (seconds) are skipped, checked every REPLICA_HEALTH_INTERVAL
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_HEALTH_INTERVAL = config('REPLICA_HEALTH_INTERVAL', default=5, cast=float)
+# How long a user reads from the primary after a write
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 # Database - PostgreSQL configuration (Keeping it simple with sqlite as of now)
 # DATABASES = {
 #     'default': {
@@ -159,6 +181,18 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # JSON stays the default, service clients negotiate MessagePack
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'ecommerce_backend.messagepack.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'ecommerce_backend.messagepack.MessagePackParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,  # 10 products per page as required
     'DEFAULT_FILTER_BACKENDS': [
@@ -193,6 +227,40 @@ CACHES = {
     }
 }
 
+# Per process LRU in front of Redis for product and category responses
+LOCAL_CACHE = {
+    'MAX_ENTRIES': config('LOCAL_CACHE_MAX_ENTRIES', default=1000, cast=int),  # 0 turns it off
+    'TTL': config('LOCAL_CACHE_TTL', default=10, cast=float),
+    # Delivers invalidations to every worker, InProcessBroadcast for a single process
+    'BROADCAST': 'ecommerce_backend.local_cache.RedisBroadcast',
+}
+
+# gzip for API responses, cached entries are stored compressed
+COMPRESSION = {
+    'MIN_SIZE': config('COMPRESSION_MIN_SIZE', default=1024, cast=int),  # bytes
+    'LEVEL': config('COMPRESSION_LEVEL', default=6, cast=int),
+}
+
+# Idempotency-Key replays for checkout and cart changes
+IDEMPOTENCY = {
+    'TTL': config('IDEMPOTENCY_TTL', default=86400, cast=int),  # seconds a response is replayed
+    'LOCK_TIMEOUT': config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int),  # longest a request holds its key
+    'WAIT': config('IDEMPOTENCY_WAIT', default=10, cast=float),  # how long a duplicate waits for it
+}
+
+# Queued checkout: POST /api/orders/ answers 202 and run_checkout_worker places
+# the orders in batches
+CHECKOUT = {
+    'QUEUED': config('CHECKOUT_QUEUED', default=False, cast=bool),
+    'BATCH_SIZE': config('CHECKOUT_BATCH_SIZE', default=200, cast=int),  # orders per transaction
+}
+
+# Stock of flash sale products is reserved in Redis, holds of abandoned carts
+# go back on sale after TTL seconds
+RESERVATIONS = {
+    'TTL': config('RESERVATION_TTL', default=900, cast=int),
+}
+
 # Channels configuration for WebSockets 
 CHANNEL_LAYERS = {
     'default': {
@@ -0,0 +1,228 @@
+"""
+Sparse fieldsets: ``?fields=id,name,price`` and ``?expand=category``.
+
+``fields`` keeps only the named serializer fields, ``expand`` replaces a
+relation with its nested representation. The queryset is projected to match:
+only() loads the primary key, the ordering columns (cursors are read from
+them) and the columns behind the kept fields. Joins and prefetches of
+relations that are no longer serialized are dropped.
+
+Both parameters go into the response cache key in canonical (sorted) form,
+so every shape is cached on its own and ``fields=name,id`` shares the entry
+of ``fields=id,name``.
+"""
+
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+# ``fields`` is every name to serialize (None for all of them), ``hidden`` the
+# names only serialized for get_cache_tags and removed from the response
+SparseFieldset = namedtuple('SparseFieldset', ['fields', 'expand', 'hidden'])
+
+# Readable field names per serializer class
+_field_names = {}
+
+
+def parse_names(query_params, param):
+    """Sorted names of a comma separated (possibly repeated) parameter, None if not given"""
+    names = {
+        name.strip()
+        for value in query_params.getlist(param)
+        for name in value.split(',')
+    }
+    names.discard('')
+    return tuple(sorted(names)) if names else None
+
+
+def readable_field_names(serializer_class):
+    names = _field_names.get(serializer_class)
+    if names is None:
+        names = _field_names[serializer_class] = frozenset(
+            name for name, field in serializer_class().fields.items() if not field.write_only
+        )
+    return names
+
+
+def _is_many(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.many_to_many or field.one_to_many
+
+
+def _lookup_root(lookup):
+    if isinstance(lookup, Prefetch):
+        lookup = lookup.prefetch_to
+    return lookup.split(LOOKUP_SEP)[0]
+
+
+def _column(model, attrs):
+    """
+    only() path of a source crossing forward relations to a column or a
+    relation, None when the source isn't made of model fields
+    """
+    for position, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if position == len(attrs) - 1:
+            return LOOKUP_SEP.join(attrs) if field.concrete else None
+        if not (field.many_to_one or field.one_to_one) or not field.concrete:
+            return None
+        model = field.related_model
+    return None
+
+
+class SparseFieldsMixin:
+    """
+    Viewset mixin for ``?fields=`` and ``?expand=`` on ``sparse_actions``.
+    Goes in front of the response cache mixin, whose tags are computed
+    before the extra ``cache_tag_fields`` are removed again.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    sparse_actions = ('list', 'retrieve')
+    # {name: (serializer class, relation lookup to load)} offered by ?expand=
+    expandable_fields = {}
+    # Columns read by fields that aren't model fields (properties, method fields)
+    field_columns = {}
+    # Fields get_cache_tags reads, always serialized and removed afterwards
+    cache_tag_fields = ('id',)
+    sparse = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.sparse_actions:
+            self.sparse = self.get_sparse_fieldset(request)
+
+    def get_sparse_fieldset(self, request):
+        """Parsed and validated fieldset of the request, None for the full representation"""
+        fields = parse_names(request.query_params, self.fields_query_param)
+        expand = parse_names(request.query_params, self.expand_query_param) or ()
+        if fields is None and not expand:
+            return None
+
+        available = readable_field_names(self.get_serializer_class())
+        errors = {}
+        unknown = [name for name in fields or () if name not in available | set(self.expandable_fields)]
+        if unknown:
+            errors[self.fields_query_param] = [f'Unknown field(s): {", ".join(unknown)}']
+        unknown = [name for name in expand if name not in self.expandable_fields]
+        if unknown:
+            errors[self.expand_query_param] = [f'Cannot expand: {", ".join(unknown)}']
+        if errors:
+            raise ValidationError(errors)
+
+        if fields is None:
+            return SparseFieldset(None, expand, frozenset())
+        # Expanded relations are always part of the output
+        requested = set(fields) | set(expand)
+        hidden = frozenset(name for name in self.cache_tag_fields if name in available - requested)
+        return SparseFieldset(frozenset(requested | hidden), expand, hidden)
+
+    def get_cache_key_params(self, request):
+        params = super().get_cache_key_params(request)
+        for param in (self.fields_query_param, self.expand_query_param):
+            names = parse_names(request.query_params, param)
+            if names is not None:
+                params[param] = [','.join(names)]
+        return params
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.sparse is not None:
+            self._apply_fieldset(serializer.child if isinstance(serializer, ListSerializer) else serializer)
+        return serializer
+
+    def _apply_fieldset(self, serializer):
+        model = serializer.Meta.model
+        for name in self.sparse.expand:
+            serializer_class, lookup = self.expandable_fields[name]
+            serializer.fields[name] = serializer_class(read_only=True, many=_is_many(model, name))
+        if self.sparse.fields is not None:
+            for name in list(serializer.fields):
+                if name not in self.sparse.fields:
+                    del serializer.fields[name]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.sparse is not None:
+            queryset = self.project_queryset(queryset)
+        return queryset
+
+    def project_queryset(self, queryset):
+        """``queryset`` loading only what the fieldset serializes"""
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        joins, prefetched = set(), set()
+
+        for field in self.get_serializer()._readable_fields:
+            if field.field_name in self.field_columns:
+                columns.update(self.field_columns[field.field_name])
+                continue
+            attrs = field.source_attrs
+            if attrs and _is_many(model, attrs[0]):
+                prefetched.add(attrs[0])
+                continue
+            column = _column(model, attrs) if attrs else None
+            if column is None:
+                # Reads the whole object or something we can't see into
+                return queryset
+            columns.add(column)
+            if len(attrs) > 1:
+                joins.add(LOOKUP_SEP.join(attrs[:-1]))
+            elif model._meta.get_field(attrs[0]).is_relation and not isinstance(field, PrimaryKeyRelatedField):
+                joins.add(attrs[0])  # a nested object, all of its columns
+
+        # Cursors are built from the ordering values of the rows
+        for term in queryset.query.order_by or model._meta.ordering:
+            if isinstance(term, str) and LOOKUP_SEP not in term:
+                column = _column(model, [term.lstrip('-')])
+                if column is not None:
+                    columns.add(column)
+
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if _lookup_root(lookup) in prefetched
+        ]
+        for name in self.sparse.expand:
+            lookup = self.expandable_fields[name][1]
+            if _is_many(model, name):
+                lookups.append(lookup)
+            else:
+                joins.add(lookup)
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        if lookups:
+            queryset = queryset.prefetch_related(*dict.fromkeys(lookups))
+        return queryset.only(*columns)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            self.sparse is not None and self.sparse.hidden
+            and isinstance(response, Response) and response.status_code == 200
+            and response.data is not None
+        ):
+            get_cache_tags = getattr(self, 'get_cache_tags', None)
+            if get_cache_tags is not None and getattr(response, 'cache_tags', None) is None:
+                response.cache_tags = get_cache_tags(response.data)
+            rows = response.data
+            if self.action == 'list':
+                rows = rows['results'] if isinstance(rows, dict) else rows
+            else:
+                rows = [rows]
+            for row in rows:
+                for name in self.sparse.hidden:
+                    row.pop(name, None)
+        return super().finalize_response(request, response, *args, **kwargs)
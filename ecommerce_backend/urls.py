@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path , include
+from .views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
      path('api/auth/', include('users.urls')),  
     path('api/products/', include('products.urls')),  
     path('api/orders/', include('orders.urls')),  
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,19 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import metrics
+
+
+class MetricsView(APIView):
+    """Admin only - cache, invalidation and compression counters aggregated over all workers"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        counters = metrics.snapshot()
+        for scope, values in counters.items():
+            if scope.startswith('cache:'):
+                values['hit_ratio'] = metrics.hit_ratios(values)
+            elif scope.startswith('compression:'):
+                values.update(metrics.compression_stats(values))
+        return Response(counters)
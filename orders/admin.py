@@ -1,4 +1,5 @@
 from django.contrib import admin
+from ecommerce_backend.cache_tags import ALL_ORDERS, invalidate_tags, order_tag
 from .models import Order, OrderItem, Cart, CartItem
 
 # Inline admin for order items
@@ -15,6 +16,13 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
     inlines = [OrderItemInline]
     readonly_fields = ['total_price', 'created_at', 'updated_at']
+    actions = ['recalculate_totals']
+    
+    @admin.action(description='Recalculate totals from the order items')
+    def recalculate_totals(self, request, queryset):
+        changed = queryset.recalculate_totals()
+        invalidate_tags([ALL_ORDERS] + [order_tag(order_id) for order_id in changed])
+        self.message_user(request, f'Fixed the total of {len(changed)} orders')
 
 
 # Inline admin for cart items
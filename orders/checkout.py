@@ -0,0 +1,89 @@
+"""
+Checkout: cart lines become an order with a fixed number of statements.
+
+Stock for every line is taken with one conditional UPDATE
+
+    UPDATE product SET stock = stock - <qty>, updated_at = <now>
+    WHERE id IN (<products>) AND stock >= <qty>
+
+where <qty> is a CASE over the product ids. The database checks the
+condition against the current row while it writes it, so two checkouts
+can't both take the last units, and nothing is read or locked beforehand.
+When fewer rows change than there are lines, some product ran short and
+the update is rolled back. The order items go in with one bulk_create.
+
+Flash sale products are sold out of their Redis reservations instead
+(products/reservations.py), their row is only written by reconciliation.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Prefetch, Value, When, prefetch_related_objects
+from django.utils import timezone
+
+from products import reservations
+from products.low_stock import notify_low_stock
+from products.models import Product
+from .models import OrderItem
+
+
+class OutOfStock(Exception):
+    """The stock of ``products`` doesn't cover the cart"""
+
+    def __init__(self, products):
+        super().__init__(', '.join(product.name for product in products))
+        self.products = products
+
+
+def take_stock(quantities):
+    """
+    Decrement stock by {product id: quantity}, all or nothing. Runs in the
+    caller's transaction, raises OutOfStock.
+    """
+    needed = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    savepoint = transaction.savepoint()
+    taken = Product.objects.filter(pk__in=quantities, stock__gte=needed).update(
+        # updated_at by hand, update() skips auto_now and fragment keys depend on it
+        stock=F('stock') - needed, updated_at=timezone.now(),
+    )
+    if taken != len(quantities):
+        transaction.savepoint_rollback(savepoint)
+        raise OutOfStock(list(
+            Product.objects.filter(pk__in=quantities, stock__lt=needed).only('id', 'name')
+        ))
+    transaction.savepoint_commit(savepoint)
+
+
+def place_order(serializer, user, cart, lines):
+    """
+    Order of ``user`` for the ``lines`` (cart items with their product) of
+    ``cart`` from a validated OrderCreateSerializer. Runs in the caller's
+    transaction, inside reservations.sales() so a rollback puts flash sale
+    units back. Raises OutOfStock (the caller rolls back).
+    """
+    flash, regular = reservations.split(lines)
+    if regular:
+        take_stock(regular)
+    if flash:
+        # Last, a failure above leaves nothing to put back in Redis
+        short = reservations.sell(user.id, flash)
+        if short:
+            raise OutOfStock(list(Product.objects.filter(pk__in=short).only('id', 'name')))
+
+    # Price at the time of the order
+    order = serializer.save(
+        user=user, total_price=sum(line.quantity * line.product.price for line in lines)
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+        for line in lines
+    ])
+    cart.cart_items.all().delete()
+
+    # update() skips the save signals that keep the low stock flags
+    notify_low_stock(Product.objects.filter(pk__in=list(regular)).sync_low_stock())
+
+    prefetch_related_objects([order], Prefetch('items', queryset=OrderItem.objects.select_related('product')))
+    return order
@@ -46,10 +46,15 @@ class OrderNotificationConsumer(AsyncWebsocketConsumer):
         Receive order update from channel layer and send to WebSocket
         This method is called when group_send is triggered
         """
-        # Send message to WebSocket client
-        await self.send(text_data=json.dumps({
+        message = {
             'type': 'order_update',
             'order_id': event['order_id'],
             'status': event['status'],
             'message': event['message']
-        }))
\ No newline at end of file
+        }
+        if 'handle' in event:
+            # Result of a queued checkout
+            message['handle'] = event['handle']
+        
+        # Send message to WebSocket client
+        await self.send(text_data=json.dumps(message))
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from ecommerce_backend.cache_tags import ALL_ORDERS, invalidate_tags, order_tag
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute Order.total_price from the order items'
+    
+    def handle(self, *args, **options):
+        changed = Order.objects.all().recalculate_totals()
+        invalidate_tags([ALL_ORDERS] + [order_tag(order_id) for order_id in changed])
+        self.stdout.write(self.style.SUCCESS(f'Fixed the total of {len(changed)} orders'))
@@ -0,0 +1,77 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, close_old_connections
+from orders.queued_checkout import pop_batch, process_batch, process_one_by_one, requeue
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between two attempts at a failing batch
+MAX_BACKOFF = 30
+
+
+class Command(BaseCommand):
+    help = 'Place queued checkouts (CHECKOUT_QUEUED) in batches, one transaction per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.CHECKOUT['BATCH_SIZE'],
+            help='Most orders placed per transaction',
+        )
+        parser.add_argument(
+            '--timeout', type=int, default=1, help='Seconds to wait for a request before looping',
+        )
+        parser.add_argument(
+            '--once', action='store_true', help='Exit once the queue is empty',
+        )
+        parser.add_argument(
+            '--attempts', type=int, default=3,
+            help='Tries at a failing batch before placing its orders one by one',
+        )
+        parser.add_argument(
+            '--backoff', type=float, default=1, help='Seconds before the first retry, doubled after each',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            batch = pop_batch(options['batch_size'], options['timeout'])
+            if not batch:
+                if options['once']:
+                    return
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self._place(batch, options)
+            except BaseException:
+                # Stopped midway, leave them for the next worker. Requests
+                # placed meanwhile are rejected then, their cart lines are gone.
+                requeue(batch)
+                raise
+            placed = sum(1 for _, order, _ in results if order is not None)
+            self.stdout.write(
+                f'Placed {placed} of {len(results)} orders in '
+                f'{(time.perf_counter() - start) * 1000:.0f} ms'
+            )
+
+    def _place(self, batch, options):
+        tries = failures = 0
+        while True:
+            close_old_connections()
+            try:
+                if failures >= options['attempts']:
+                    # Keeps failing: only the requests at fault are rejected
+                    self.stderr.write(f'Placing a failing batch of {len(batch)} orders one by one')
+                    return process_one_by_one(batch)
+                return process_batch(batch)
+            except (InterfaceError, OperationalError):
+                # The database is unavailable or busy, not the batch's fault
+                logger.exception('Checkout batch of %d failed, retrying', len(batch))
+            except Exception:
+                failures += 1
+                logger.exception('Checkout batch of %d failed (attempt %d)', len(batch), failures)
+            # Nothing was committed
+            tries += 1
+            time.sleep(min(options['backoff'] * 2 ** (tries - 1), MAX_BACKOFF))
@@ -1,4 +1,7 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
 from django.contrib.auth.models import User
 from products.models import Product
 
@@ -10,6 +13,47 @@ ORDER_STATUS = (
 )
 
 
+def line_total(price='price'):
+    """Sum of quantity * ``price`` over the rows, 0 when there are none"""
+    return Coalesce(
+        Sum(F('quantity') * F(price)), Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+    
+    def recalculate_totals(self):
+        """
+        Set total_price to the sum of the items for the orders in the queryset
+        (single UPDATE). Returns the ids of the orders whose total was off.
+        """
+        # Rounded to cents, SQLite sums in floating point (7 x 0.10 != 0.70)
+        items_total = Coalesce(
+            Round(
+                Subquery(
+                    OrderItem.objects.filter(order=OuterRef('pk'))
+                    .order_by()
+                    .values('order')
+                    .annotate(total=line_total())
+                    .values('total')
+                ),
+                2,
+            ),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        changed = list(
+            self.order_by()
+            .annotate(items_total=items_total)
+            .exclude(total_price=F('items_total'))
+            .values_list('pk', flat=True)
+        )
+        if changed:
+            Order.objects.filter(pk__in=changed).update(total_price=items_total)
+        return changed
+
+
 class Order(models.Model):
     """
     Order model - represents a customer order
@@ -25,18 +69,32 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
     
     def calculate_total(self):
-        """Calculate total price from all order items"""
-        total = sum(item.subtotal for item in self.items.all())
-        self.total_price = total
-        self.save()
-        return total
+        """
+        Recompute total price from the order items in the database, for
+        repairs. Checkout sets the total itself when it creates the order.
+        """
+        self.total_price = self.items.aggregate(total=line_total())['total']
+        self.save(update_fields=['total_price', 'updated_at'])
+        return self.total_price
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's order history, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+            # Staff view of all orders
+            models.Index(fields=['-created_at', '-id'], name='order_recent_idx'),
+            # Fulfilment queue
+            models.Index(
+                fields=['-created_at'], condition=Q(status='pending'), name='order_pending_idx',
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -73,13 +131,20 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart of {self.user.username}"
     
+    def totals(self):
+        """(total price, number of items) of the cart in one aggregate"""
+        totals = self.cart_items.aggregate(
+            total=line_total('product__price'), count=Coalesce(Sum('quantity'), 0),
+        )
+        return totals['total'], totals['count']
+    
     def get_total(self):
         """Calculate total price of all items in cart"""
-        return sum(item.subtotal for item in self.cart_items.all())
+        return self.totals()[0]
     
     def item_count(self):
         """Total number of items in cart"""
-        return sum(item.quantity for item in self.cart_items.all())
+        return self.totals()[1]
 
 
 class CartItem(models.Model):
@@ -0,0 +1,16 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def send_order_notification(user_id, order_id, status, message=None, handle=None):
+    """Send WebSocket notification about order status to the user's group"""
+    event = {
+        'type': 'order_update',
+        'order_id': order_id,
+        'status': status,
+        'message': message or f'Your order #{order_id} is now {status}',
+    }
+    if handle is not None:
+        # Queued checkouts are only known by their handle until they're placed
+        event['handle'] = handle
+    async_to_sync(get_channel_layer().group_send)(f'user_{user_id}', event)
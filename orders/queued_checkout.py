@@ -0,0 +1,287 @@
+"""
+Queued checkout, for flash sales (CHECKOUT['QUEUED']).
+
+The API validates the cart, pushes a snapshot of it onto a Redis list and
+answers 202 with a handle. run_checkout_worker pops up to
+CHECKOUT['BATCH_SIZE'] requests at a time and places them all in one
+transaction:
+
+- cart lines are checked once for the whole batch, a request whose lines
+  are gone (ordered or removed meanwhile) is rejected;
+- stock is handed out first come first served from one read of the
+  products, and taken with a single conditional UPDATE for the aggregated
+  quantities (checkout.take_stock);
+- flash sale products are sold out of their Redis reservations instead,
+  request by request in queue order (products/reservations.py);
+- orders and order items are written with one bulk_create each, the ordered
+  cart lines with one DELETE.
+
+So a batch costs the same handful of statements whatever its size, instead
+of one write transaction per order. Once it commits, each user is told the
+outcome through OrderNotificationConsumer: status ``pending`` with the order
+id, or ``rejected`` with the reason, both carrying the handle.
+
+run_checkout_worker retries a failing batch with a backoff, then places
+its requests one at a time and rejects those that still fail, so one bad
+request can't hold up the queue.
+"""
+
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, transaction
+from django_redis import get_redis_connection
+
+from ecommerce_backend import metrics
+from ecommerce_backend.cache_tags import (
+    ALL_ORDERS, cart_tag, invalidate_tags, order_tag, product_write_tags, user_orders_tag,
+)
+from products import reservations
+from products.low_stock import notify_low_stock
+from products.models import Product
+from .checkout import OutOfStock, take_stock
+from .models import CartItem, Order, OrderItem
+from .notifications import send_order_notification
+
+logger = logging.getLogger(__name__)
+
+QUEUE = 'checkout:queue'
+# Stock may be taken by a synchronous checkout between the read and the UPDATE
+MAX_ALLOCATION_ATTEMPTS = 5
+
+
+def queue_key():
+    return cache.make_key(QUEUE)
+
+
+def enqueue_checkout(user, order_data, lines):
+    """Queue an order of ``user`` for the cart items ``lines``, returns its handle"""
+    handle = uuid.uuid4().hex
+    request = {
+        'handle': handle,
+        'user': user.id,
+        'order': order_data,
+        'lines': [[line.id, line.product_id, line.quantity] for line in lines],
+        'queued_at': time.time(),
+    }
+    get_redis_connection('default').rpush(queue_key(), json.dumps(request))
+    metrics.incr('checkout_queue', 'queued')
+    return handle
+
+
+def queue_length():
+    return get_redis_connection('default').llen(queue_key())
+
+
+def pop_batch(size, timeout=1):
+    """
+    Up to ``size`` queued requests, waiting up to ``timeout`` seconds for the
+    first one (0 doesn't wait). Empty list if none came.
+    """
+    redis = get_redis_connection('default')
+    if not timeout:
+        return [json.loads(payload) for payload in redis.lpop(queue_key(), size) or []]
+    first = redis.blpop([queue_key()], timeout=timeout)
+    if first is None:
+        return []
+    payloads = [first[1]]
+    if size > 1:
+        payloads += redis.lpop(queue_key(), size - 1) or []
+    return [json.loads(payload) for payload in payloads]
+
+
+def requeue(requests):
+    """Put popped requests back at the head of the queue, in their order"""
+    if requests:
+        get_redis_connection('default').lpush(
+            queue_key(), *[json.dumps(request) for request in reversed(requests)]
+        )
+
+
+def process_batch(requests):
+    """
+    Place the queued ``requests`` in one transaction. Returns
+    [(request, order or None, reason)] in queue order.
+    """
+    # Flash sale units sold for a batch that rolls back go back on sale,
+    # or they would be sold again when it is retried
+    with reservations.sales(), transaction.atomic():
+        results = _place_batch(requests)
+        placed = [(request, order) for request, order, _ in results if order is not None]
+
+        tags = {ALL_ORDERS}
+        for request, order in placed:
+            tags.update((order_tag(order.id), user_orders_tag(order.user_id)))
+        sold = {product_id for request, _ in placed for _, product_id, _ in request['lines']}
+        if sold:
+            # Stock shows on the product pages, listings and facets
+            tags.update(product_write_tags(
+                Product.objects.filter(pk__in=sold).values_list('id', 'category_id')
+            ))
+        tags.update(cart_tag(request['user']) for request in requests)
+        transaction.on_commit(lambda: invalidate_tags(list(tags)))
+        transaction.on_commit(lambda: _notify(results))
+
+    metrics.incr_many('checkout_queue', {
+        'batches': 1, 'placed': len(placed), 'rejected': len(results) - len(placed),
+    })
+    return results
+
+
+def process_one_by_one(requests):
+    """
+    Place ``requests`` in a transaction each, for a batch that keeps failing.
+    The ones that still fail are rejected and their users told, unless the
+    database is at fault: those go back on the queue. Returns the results
+    like process_batch, without the requeued requests.
+    """
+    results, retry = [], []
+    for request in requests:
+        try:
+            results += process_batch([request])
+        except (InterfaceError, OperationalError):
+            logger.exception('Requeueing queued checkout %s', request['handle'])
+            retry.append(request)
+        except Exception as exc:
+            logger.exception('Rejecting queued checkout %s', request['handle'])
+            if isinstance(exc, OutOfStock) and exc.products:
+                reason = f'{exc.products[0].name} is out of stock'
+            else:
+                reason = 'Your order could not be placed, please check out again'
+            result = (request, None, reason)
+            _notify([result])
+            metrics.incr('checkout_queue', 'failed')
+            results.append(result)
+    requeue(retry)
+    return results
+
+
+def _place_batch(requests):
+    cart_line_ids = [line_id for request in requests for line_id, _, _ in request['lines']]
+    available = set(CartItem.objects.filter(pk__in=cart_line_ids).values_list('pk', flat=True))
+
+    # Each cart line is ordered once, later requests for it lost the race
+    candidates, rejected = [], {}
+    for request in requests:
+        ids = {line_id for line_id, _, _ in request['lines']}
+        if ids <= available:
+            available -= ids
+            candidates.append(request)
+        else:
+            rejected[request['handle']] = 'Your cart changed, please check out again'
+
+    product_ids = {product_id for request in candidates for _, product_id, _ in request['lines']}
+    flagged = dict(Product.objects.filter(pk__in=product_ids, flash_sale=True).values_list('id', 'name'))
+    candidates, sold = _sell_flash(candidates, flagged, rejected)
+    for attempt in range(MAX_ALLOCATION_ATTEMPTS):
+        products = Product.objects.only('id', 'name', 'price', 'stock').in_bulk(product_ids)
+        accepted, short = _allocate(candidates, products, skip=flagged)
+        taken = Counter()
+        for request in accepted:
+            for _, product_id, quantity in request['lines']:
+                if product_id not in flagged:
+                    taken[product_id] += quantity
+        try:
+            if taken:
+                take_stock(dict(taken))
+            break
+        except OutOfStock:
+            if attempt == MAX_ALLOCATION_ATTEMPTS - 1:
+                raise
+    rejected.update(short)
+    for handle in short:
+        reservations.unsell(sold.pop(handle, {}))
+    return _write_orders(requests, accepted, products, taken, rejected)
+
+
+def _sell_flash(requests, flagged, rejected):
+    """
+    Sell the flash sale lines of ``requests`` out of Redis in queue order,
+    (requests left, {handle: quantities sold}). Short ones go to ``rejected``.
+    """
+    if not flagged:
+        return requests, {}
+    left, sold = [], {}
+    for request in requests:
+        flash = {
+            product_id: quantity for _, product_id, quantity in request['lines'] if product_id in flagged
+        }
+        short = reservations.sell(request['user'], flash) if flash else []
+        if short:
+            rejected[request['handle']] = f'{flagged[short[0]]} is out of stock'
+            continue
+        if flash:
+            sold[request['handle']] = flash
+        left.append(request)
+    return left, sold
+
+
+def _write_orders(requests, accepted, products, taken, rejected):
+    orders = Order.objects.bulk_create([
+        Order(
+            user_id=request['user'],
+            total_price=sum(
+                quantity * products[product_id].price for _, product_id, quantity in request['lines']
+            ),
+            **request['order'],
+        )
+        for request in accepted
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product_id=product_id, quantity=quantity, price=products[product_id].price,
+        )
+        for request, order in zip(accepted, orders)
+        for _, product_id, quantity in request['lines']
+    ])
+    CartItem.objects.filter(
+        pk__in=[line_id for request in accepted for line_id, _, _ in request['lines']]
+    ).delete()
+    # update() skips the save signals that keep the low stock flags
+    notify_low_stock(Product.objects.filter(pk__in=list(taken)).sync_low_stock())
+
+    order_by_handle = {request['handle']: order for request, order in zip(accepted, orders)}
+    return [
+        (request, order_by_handle.get(request['handle']), rejected.get(request['handle']))
+        for request in requests
+    ]
+
+
+def _allocate(requests, products, skip=()):
+    """
+    First come first served split of the stock, (accepted, {handle: reason}).
+    Lines of products in ``skip`` aren't checked.
+    """
+    stock = {product_id: product.stock for product_id, product in products.items()}
+    accepted, rejected = [], {}
+    for request in requests:
+        lines = [
+            (product_id, quantity) for _, product_id, quantity in request['lines'] if product_id not in skip
+        ]
+        missing = [
+            product_id for product_id, quantity in lines
+            if product_id not in stock or stock[product_id] < quantity
+        ]
+        if missing:
+            product = products.get(missing[0])
+            name = product.name if product is not None else 'An item'
+            rejected[request['handle']] = f'{name} is out of stock'
+            continue
+        for product_id, quantity in lines:
+            stock[product_id] -= quantity
+        accepted.append(request)
+    return accepted, rejected
+
+
+def _notify(results):
+    for request, order, reason in results:
+        if order is not None:
+            send_order_notification(request['user'], order.id, 'pending', handle=request['handle'])
+        else:
+            send_order_notification(
+                request['user'], None, 'rejected', message=reason, handle=request['handle'],
+            )
@@ -1,10 +1,11 @@
 from rest_framework import serializers
+from ecommerce_backend.compiled_serializers import CompiledSerializerMixin
 from .models import Order, OrderItem, Cart, CartItem
 from products.models import Product
 from products.serializers import ProductSerializer
 
 # Serializer for cart items
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -44,15 +45,20 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'cart_items', 'total', 'item_count', 'created_at', 'updated_at']
     
+    def to_representation(self, instance):
+        # Both totals come from one aggregate
+        self._totals = instance.totals()
+        return super().to_representation(instance)
+    
     def get_total(self, obj):
-        return obj.get_total()
+        return self._totals[0]
     
     def get_item_count(self, obj):
-        return obj.item_count()
+        return self._totals[1]
 
 
 # Serializer for order items
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     
@@ -74,7 +80,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
 
 # Serializer for displaying orders
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
     
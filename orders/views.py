@@ -2,31 +2,77 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from ecommerce_backend.cache_tags import (
+    ALL_ORDERS, cart_tag, category_tag, invalidate_tags, order_tag, product_tag, product_write_tags,
+    user_orders_tag,
+)
+from ecommerce_backend.caching import CachedResponseMixin, ResponseCacheMixin
+from ecommerce_backend.db_router import ReplicaReadMixin
+from ecommerce_backend.export import (
+    CHUNK_SIZE, export_response, filter_ranges, get_output, stream_csv, stream_ndjson,
+)
+from ecommerce_backend.idempotency import IdempotencyMixin, idempotent
+from ecommerce_backend.pagination import KeysetPagination
+from ecommerce_backend.sparse_fields import SparseFieldsMixin
+from .checkout import OutOfStock, place_order
 from .models import Order, OrderItem, Cart, CartItem
+from .notifications import send_order_notification
+from .queued_checkout import enqueue_checkout
 from .serializers import (
     CartSerializer, CartItemSerializer, 
-    OrderSerializer, OrderListSerializer, OrderCreateSerializer
+    OrderSerializer, OrderListSerializer, OrderCreateSerializer, OrderItemSerializer
 )
+from products import reservations
 from products.models import Product
 
-class CartViewSet(viewsets.ViewSet):
+# Columns of /api/orders/export/, CSV repeats them on each item line
+EXPORT_ORDER_FIELDS = [
+    'id', 'user_id', 'user_name', 'status', 'total_price', 'shipping_address',
+    'phone_number', 'created_at', 'updated_at',
+]
+EXPORT_ITEM_FIELDS = ['product', 'product_name', 'quantity', 'price']
+
+
+class CartViewSet(IdempotencyMixin, ResponseCacheMixin, viewsets.ViewSet):
     """
     ViewSet for shopping cart operations
     Users can view their cart, add/remove items
     """
     permission_classes = [IsAuthenticated]
+    cache_per_user = True
+    # A user must see their own cart changes right away
+    cache_serve_stale = False
     
     def list(self, request):
         """Get user's cart with all items"""
+        return self.cached_response(self._cart_detail, request)
+    
+    def _cart_detail(self, request):
         cart, created = Cart.objects.get_or_create(user=request.user)
         serializer = CartSerializer(cart)
         return Response(serializer.data)
     
+    def get_cache_tags(self, data):
+        # Cart lines embed product price and stock, and the category name.
+        # Deleting the category deletes the lines.
+        tags = {cart_tag(self.request.user.id)}
+        for item in data['cart_items']:
+            tags.add(product_tag(item['product']['id']))
+            tags.add(category_tag(item['product']['category']))
+        return tags
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Any successful mutation changes the cached cart
+        if self.action != 'list' and 200 <= response.status_code < 300:
+            invalidate_tags([cart_tag(request.user.id)])
+        return super().finalize_response(request, response, *args, **kwargs)
+    
     @action(detail=False, methods=['post'])
+    @idempotent
     def add_item(self, request):
         """Add a product to cart or update quantity if already exists"""
         cart, created = Cart.objects.get_or_create(user=request.user)
@@ -38,6 +84,22 @@ class CartViewSet(viewsets.ViewSet):
             
             product = get_object_or_404(Product, id=product_id)
             
+            if product.flash_sale:
+                # The whole cart line is held in Redis, the product row isn't touched
+                in_cart = CartItem.objects.filter(cart=cart, product=product).values_list(
+                    'quantity', flat=True
+                ).first() or 0
+                # Before the hold is raised, a refused add mustn't keep it
+                if in_cart + quantity > product.stock:
+                    return Response({
+                        'error': f'Cannot add more. Only {product.stock} items available'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                reserved, available = reservations.reserve(product.id, request.user.id, in_cart + quantity)
+                if not reserved:
+                    return Response({
+                        'error': f'Cannot add more. Only {available} items available'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            
             # Check if item already in cart
             cart_item, created = CartItem.objects.get_or_create(
                 cart=cart,
@@ -51,6 +113,9 @@ class CartViewSet(viewsets.ViewSet):
                 
                 # Make sure we don't exceed stock
                 if cart_item.quantity > product.stock:
+                    if product.flash_sale:
+                        # The line grew meanwhile, back to what the cart holds
+                        reservations.reserve(product.id, request.user.id, cart_item.quantity - quantity)
                     return Response({
                         'error': f'Cannot add more. Only {product.stock} items available'
                     }, status=status.HTTP_400_BAD_REQUEST)
@@ -65,6 +130,7 @@ class CartViewSet(viewsets.ViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['put'])
+    @idempotent
     def update_item(self, request):
         """Update quantity of a cart item"""
         cart = get_object_or_404(Cart, user=request.user)
@@ -86,8 +152,17 @@ class CartViewSet(viewsets.ViewSet):
         
         if quantity <= 0:
             cart_item.delete()
+            if cart_item.product.flash_sale:
+                reservations.release([cart_item.product_id], request.user.id)
             return Response({'message': 'Item removed from cart'})
         
+        if cart_item.product.flash_sale:
+            reserved, available = reservations.reserve(cart_item.product_id, request.user.id, quantity)
+            if not reserved:
+                return Response({
+                    'error': f'Only {available} items available'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
         cart_item.quantity = quantity
         cart_item.save()
         
@@ -97,6 +172,7 @@ class CartViewSet(viewsets.ViewSet):
         })
     
     @action(detail=False, methods=['delete'])
+    @idempotent
     def remove_item(self, request):
         """Remove an item from cart"""
         cart = get_object_or_404(Cart, user=request.user)
@@ -107,8 +183,10 @@ class CartViewSet(viewsets.ViewSet):
                 'error': 'item_id is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = get_object_or_404(CartItem.objects.select_related('product'), id=item_id, cart=cart)
         cart_item.delete()
+        if cart_item.product.flash_sale:
+            reservations.release([cart_item.product_id], request.user.id)
         
         return Response({
             'message': 'Item removed from cart',
@@ -116,15 +194,20 @@ class CartViewSet(viewsets.ViewSet):
         })
     
     @action(detail=False, methods=['delete'])
+    @idempotent
     def clear(self, request):
         """Clear all items from cart"""
         cart = get_object_or_404(Cart, user=request.user)
+        held = list(cart.cart_items.filter(product__flash_sale=True).values_list('product_id', flat=True))
         cart.cart_items.all().delete()
+        reservations.release(held, request.user.id)
         
         return Response({'message': 'Cart cleared'})
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(
+    IdempotencyMixin, ReplicaReadMixin, SparseFieldsMixin, CachedResponseMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for order management
     Users can create orders from cart and view their order history
@@ -132,6 +215,12 @@ class OrderViewSet(viewsets.ModelViewSet):
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cache_per_user = True
+    cache_serve_stale = False
+    # ?fields= / ?expand=
+    expandable_fields = {'items': (OrderItemSerializer, 'items__product')}
+    field_columns = {'items_count': []}
     
     def get_queryset(self):
         # Users see only their orders, admins see all
@@ -146,47 +235,50 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderCreateSerializer
         return OrderSerializer
     
-    @transaction.atomic  # Ensure all DB operations succeed or rollback
+    @idempotent  # Retried checkouts get the first response
     def create(self, request, *args, **kwargs):
         """Create order from cart items"""
+        if settings.CHECKOUT['QUEUED']:
+            # Only reads, the worker does the writing
+            return self._checkout(request)
+        # Ensure all DB operations succeed or rollback, flash sale units
+        # sold in Redis go back if they don't
+        with reservations.sales(), transaction.atomic():
+            return self._checkout(request)
+    
+    def _checkout(self, request):
         cart = get_object_or_404(Cart, user=request.user)
+        lines = list(cart.cart_items.select_related('product'))
         
-        if not cart.cart_items.exists():
+        if not lines:
             return Response({
                 'error': 'Cart is empty. Add items before placing order'
             }, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            # Create the order
-            order = serializer.save(user=request.user)
+            if settings.CHECKOUT['QUEUED']:
+                return self._queue_order(request, serializer, lines)
             
-            # Create order items from cart items
-            for cart_item in cart.cart_items.all():
-                # Check stock availability again (might have changed)
-                if cart_item.product.stock < cart_item.quantity:
-                    transaction.set_rollback(True)
-                    return Response({
-                        'error': f'{cart_item.product.name} is out of stock'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Create order item
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
-                
-                # Reduce product stock
-                cart_item.product.stock -= cart_item.quantity
-                cart_item.product.save()
+            # Same number of statements whatever the size of the cart
+            try:
+                order = place_order(serializer, request.user, cart, lines)
+            except OutOfStock as exc:
+                # Stock already taken for the other lines goes back
+                transaction.set_rollback(True)
+                name = exc.products[0].name if exc.products else 'An item'
+                return Response({
+                    'error': f'{name} is out of stock'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Calculate total
-            order.calculate_total()
-            
-            # Clear the cart
-            cart.cart_items.all().delete()
+            # Only drop cached pages once the new order is visible, stock
+            # shows on the product pages, listings and facets
+            tags = {
+                order_tag(order.id), user_orders_tag(order.user_id), ALL_ORDERS,
+                cart_tag(order.user_id),
+            }
+            tags.update(product_write_tags((line.product_id, line.product.category_id) for line in lines))
+            transaction.on_commit(lambda: invalidate_tags(tags))
             
             # Send notification (WebSocket)
             self._send_order_notification(request.user.id, order.id, 'pending')
@@ -198,6 +290,21 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    def _queue_order(self, request, serializer, lines):
+        # Early answer for what is already short, the worker has the last word
+        for line in lines:
+            if line.product.stock < line.quantity:
+                return Response({
+                    'error': f'{line.product.name} is out of stock'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        handle = enqueue_checkout(request.user, serializer.validated_data, lines)
+        return Response({
+            'message': 'Order queued, you will be notified when it is placed',
+            'handle': handle,
+            'status': 'queued',
+        }, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=True, methods=['patch'], permission_classes=[IsAdminUser])
     def update_status(self, request, pk=None):
         """Update order status (admin only)"""
@@ -212,6 +319,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         old_status = order.status
         order.status = new_status
         order.save()
+        self._invalidate_order_cache(order)
         
         # Send real-time notification to user
         self._send_order_notification(order.user.id, order.id, new_status)
@@ -221,15 +329,124 @@ class OrderViewSet(viewsets.ModelViewSet):
             'order': OrderSerializer(order).data
         })
     
-    def _send_order_notification(self, user_id, order_id, status):
-        """Send WebSocket notification about order status"""
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f'user_{user_id}',
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Admin export of all orders with their items as NDJSON or CSV"""
+        output = get_output(request)
+        items = OrderItem.objects.select_related('product').only(
+            'order_id', 'product_id', 'product__name', 'quantity', 'price'
+        ).order_by('id')
+        # iterator() prefetches the items of each chunk of orders
+        orders = (
+            filter_ranges(Order.objects.all(), request)
+            .select_related('user').prefetch_related(Prefetch('items', queryset=items))
+            .order_by('id').iterator(chunk_size=CHUNK_SIZE)
+        )
+        
+        if output == 'csv':
+            columns = EXPORT_ORDER_FIELDS + [f'item_{field}' for field in EXPORT_ITEM_FIELDS]
+            content = stream_csv(columns, self._export_lines(orders))
+        else:
+            content = stream_ndjson(self._export_record(order) for order in orders)
+        return export_response(content, output, 'orders')
+    
+    def _export_record(self, order):
+        record = {
+            'id': order.id,
+            'user_id': order.user_id,
+            'user_name': order.user.username,
+            'status': order.status,
+            'total_price': order.total_price,
+            'shipping_address': order.shipping_address,
+            'phone_number': order.phone_number,
+            'created_at': order.created_at,
+            'updated_at': order.updated_at,
+        }
+        record['items'] = [
             {
-                'type': 'order_update',
-                'order_id': order_id,
-                'status': status,
-                'message': f'Your order #{order_id} is now {status}'
+                'product': item.product_id,
+                'product_name': item.product.name,
+                'quantity': item.quantity,
+                'price': str(item.price),
             }
-        )
\ No newline at end of file
+            for item in order.items.all()
+        ]
+        return record
+    
+    def _export_lines(self, orders):
+        """One CSV line per order item, orders without items get one empty line"""
+        for order in orders:
+            record = self._export_record(order)
+            head = [record[field] for field in EXPORT_ORDER_FIELDS]
+            if not record['items']:
+                yield head + [''] * len(EXPORT_ITEM_FIELDS)
+            for item in record['items']:
+                yield head + [item[field] for field in EXPORT_ITEM_FIELDS]
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._invalidate_order_cache(serializer.instance)
+    
+    def perform_destroy(self, instance):
+        order_id = instance.id
+        super().perform_destroy(instance)
+        instance.id = order_id  # delete() resets the pk
+        self._invalidate_order_cache(instance)
+    
+    def get_cache_tags(self, data):
+        if self.action == 'retrieve':
+            # Order lines show the product name (unless left out by ?fields=)
+            tags = {order_tag(data['id'])}
+            tags.update(self._product_tags(item['product'] for item in data.get('items', ())))
+            return tags
+        
+        user = self.request.user
+        tags = {ALL_ORDERS if user.is_staff else user_orders_tag(user.id)}
+        results = data['results'] if isinstance(data, dict) else data
+        for order in results:
+            tags.add(order_tag(order['id']))
+        # ?expand=items
+        tags.update(self._product_tags(
+            item['product'] for order in results for item in order.get('items', ())
+        ))
+        return tags
+    
+    def _product_tags(self, product_ids):
+        """Product and category tags of the products on order lines"""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return set()
+        return {
+            tag for product_id, category_id in Product.objects.filter(pk__in=product_ids).values_list(
+                'id', 'category_id'
+            )
+            for tag in (product_tag(product_id), category_tag(category_id))
+        }
+    
+    def get_validators(self, url_kwargs):
+        if self.action != 'retrieve':
+            return None
+        
+        # Scoped to the orders the user may see, the cache key adds the user id
+        try:
+            rows = list(
+                self.get_queryset().filter(pk=url_kwargs['pk'])
+                .values_list('updated_at', 'items__product_id', 'items__product__category_id')
+            )
+        except (TypeError, ValueError):
+            rows = []
+        if not rows:
+            return None
+        
+        tags = {order_tag(url_kwargs['pk'])}
+        for _, product_id, category_id in rows:
+            if product_id:
+                tags.update((product_tag(product_id), category_tag(category_id)))
+        return tags, rows[0][0]
+    
+    def _invalidate_order_cache(self, order):
+        return invalidate_tags([order_tag(order.id), user_orders_tag(order.user_id), ALL_ORDERS])
+    
+    def _send_order_notification(self, user_id, order_id, status):
+        """Send WebSocket notification about order status"""
+        send_order_notification(user_id, order_id, status)
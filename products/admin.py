@@ -1,16 +1,25 @@
 from django.contrib import admin
-from .models import Category, Product
+from .models import Category, LowStockEvent, Product
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_at']
+    list_display = ['name', 'products_count', 'low_stock_threshold', 'created_at']
     search_fields = ['name']
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'stock', 'in_stock', 'created_at']
-    list_filter = ['category', 'created_at']
+    list_display = [
+        'name', 'category', 'price', 'stock', 'in_stock', 'is_low_stock', 'flash_sale', 'created_at',
+    ]
+    list_filter = ['category', 'is_low_stock', 'flash_sale', 'created_at']
     search_fields = ['name', 'description']
     list_editable = ['price', 'stock']  # Quick edit from list view
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+
+@admin.register(LowStockEvent)
+class LowStockEventAdmin(admin.ModelAdmin):
+    list_display = ['product', 'is_low_stock', 'stock', 'threshold', 'created_at']
+    list_filter = ['is_low_stock']
+    raw_id_fields = ['product']
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """SQLite loses the FTS triggers when a migration rebuilds the product table"""
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .search import install_search_index
+    
+    connection = connections[using]
+    recorder = MigrationRecorder(connection)
+    if recorder.has_table() and recorder.migration_qs.filter(
+        app='products', name='0003_product_search_index'
+    ).exists():
+        install_search_index(connection)
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+    
+    def ready(self):
+        # Register signal handlers for the category product counters
+        from . import signals  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self)
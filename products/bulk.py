@@ -0,0 +1,73 @@
+"""
+Bulk price and stock changes.
+
+A batch of ``{id, price?, stock?}`` changes is applied in one transaction.
+The products are not loaded: the changes are grouped by the columns they
+set (price, stock or both) and each group is written with one bulk_update
+(one CASE statement per BATCH_SIZE rows). bulk_update skips the save
+signals, so the low stock flags are synced here and the response cache is
+invalidated once for the whole batch.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from ecommerce_backend.cache_tags import ALL_PRODUCTS, category_tag, invalidate_tags, product_tag
+from . import reservations
+from .low_stock import notify_low_stock
+from .models import Product
+
+BATCH_SIZE = 1000
+MAX_CHANGES = 10000
+
+CHANGE_FIELDS = ('price', 'stock')
+
+
+def apply_changes(changes):
+    """Apply validated ``changes`` (ProductChangeSerializer), returns how many products changed"""
+    ids = [change['id'] for change in changes]
+    duplicates = sorted(product_id for product_id, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        raise ValidationError({'id': f'Duplicate products: {duplicates[:100]}'})
+
+    now = timezone.now()
+    groups = defaultdict(list)
+    for change in changes:
+        fields = tuple(field for field in CHANGE_FIELDS if field in change)
+        # updated_at by hand, bulk_update doesn't apply auto_now and fragment keys depend on it
+        groups[fields].append(
+            Product(pk=change['id'], updated_at=now, **{field: change[field] for field in fields})
+        )
+
+    with transaction.atomic():
+        category_ids = {}
+        for start in range(0, len(ids), BATCH_SIZE):
+            category_ids.update(
+                Product.objects.filter(pk__in=ids[start:start + BATCH_SIZE])
+                .select_for_update().values_list('id', 'category_id')
+            )
+        missing = [product_id for product_id in ids if product_id not in category_ids]
+        if missing:
+            raise ValidationError({'id': f'Unknown products: {missing[:100]}'})
+
+        for fields, products in groups.items():
+            Product.objects.bulk_update(products, [*fields, 'updated_at'], batch_size=BATCH_SIZE)
+
+        restocked = [change['id'] for change in changes if 'stock' in change]
+        events = []
+        for start in range(0, len(restocked), BATCH_SIZE):
+            events += Product.objects.filter(pk__in=restocked[start:start + BATCH_SIZE]).sync_low_stock()
+        notify_low_stock(events)
+
+    # Prices and stock show up in listings and details, category counts don't change
+    tags = {ALL_PRODUCTS}
+    tags.update(product_tag(product_id) for product_id in ids)
+    tags.update(category_tag(category_id) for category_id in set(category_ids.values()))
+    invalidate_tags(tags)
+    if restocked:
+        # Flash sale counters start over from the new stock
+        reservations.reconcile(restocked)
+    return len(ids)
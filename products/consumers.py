@@ -0,0 +1,30 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .low_stock import LOW_STOCK_GROUP
+
+
+class LowStockConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket feed of products entering or leaving the low stock list
+    Only staff users can subscribe
+    """
+    
+    async def connect(self):
+        user = self.scope['user']
+        
+        if user.is_anonymous or not user.is_staff:
+            await self.close()
+            return
+        
+        await self.channel_layer.group_add(LOW_STOCK_GROUP, self.channel_name)
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(LOW_STOCK_GROUP, self.channel_name)
+    
+    async def low_stock_events(self, event):
+        """Forward a batch of LowStockEvents from the channel layer"""
+        await self.send(text_data=json.dumps({
+            'type': 'low_stock_events',
+            'events': event['events'],
+        }))
@@ -0,0 +1,79 @@
+"""
+Facet counts for the product catalog.
+
+One GROUP BY over (category, price bucket, in stock) of the filtered
+queryset gives every combination's count; the per facet totals are summed
+up from those rows in Python, so the whole facet panel costs one query no
+matter how many categories or buckets there are.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, IntegerField, Value, When
+from rest_framework.exceptions import ValidationError
+
+# Lower bounds of the default price buckets, the last one is open ended
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+MAX_PRICE_BUCKETS = 20
+
+
+def parse_buckets(raw):
+    """``?price_buckets=0,50,100`` -> sorted unique lower bounds"""
+    if not raw:
+        return [Decimal(bound) for bound in PRICE_BUCKETS]
+    try:
+        bounds = sorted({Decimal(part.strip()) for part in raw.split(',') if part.strip()})
+    except InvalidOperation:
+        raise ValidationError({'price_buckets': 'Expected comma separated numbers.'})
+    if not bounds or len(bounds) > MAX_PRICE_BUCKETS or not all(b.is_finite() for b in bounds):
+        raise ValidationError({'price_buckets': f'Expected 1 to {MAX_PRICE_BUCKETS} numbers.'})
+    return bounds
+
+
+def facet_counts(queryset, bounds):
+    """Counts per category, price bucket and stock state of ``queryset``"""
+    # Bucket i holds bounds[i] <= price < bounds[i + 1], -1 is below the first bound
+    bucket = Case(
+        *[When(price__gte=bound, then=Value(i)) for i, bound in reversed(list(enumerate(bounds)))],
+        default=Value(-1),
+        output_field=IntegerField(),
+    )
+    stocked = Case(When(stock__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField())
+
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=bucket, stocked=stocked)
+        .values('category_id', 'category__name', 'bucket', 'stocked')
+        .annotate(total=Count('id'))
+    )
+
+    categories = {}
+    buckets = [0] * len(bounds)
+    stock = {'in_stock': 0, 'out_of_stock': 0}
+    total = 0
+    for row in rows:
+        count = row['total']
+        total += count
+
+        category = categories.setdefault(
+            row['category_id'],
+            {'id': row['category_id'], 'name': row['category__name'], 'count': 0},
+        )
+        category['count'] += count
+        if row['bucket'] >= 0:
+            buckets[row['bucket']] += count
+        stock['in_stock' if row['stocked'] else 'out_of_stock'] += count
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'])),
+        'price_buckets': [
+            {
+                'min': str(bound),
+                'max': str(bounds[i + 1]) if i + 1 < len(bounds) else None,
+                'count': buckets[i],
+            }
+            for i, bound in enumerate(bounds)
+        ],
+        'stock': stock,
+    }
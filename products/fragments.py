@@ -0,0 +1,93 @@
+"""
+Per-product JSON fragments for list assembly.
+
+Each product's serialized JSON is cached on its own, keyed by id and
+``updated_at``. A list miss then only resolves the ordered ids of the page
+in SQL, fetches the fragments with one multi-get, serializes the missing
+products in one batched query and splices the bytes together. Since the key
+carries ``updated_at``, any write that bumps it (including a category
+rename, see signals.py) retires the old fragment without an explicit delete.
+"""
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from ecommerce_backend import metrics
+
+# Columns the id-only list query has to load
+KEY_FIELDS = ('id', 'category_id', 'updated_at')
+
+
+class PrerenderedResponse(Response):
+    """A Response whose body was assembled upfront, ``data`` stays empty"""
+
+    def __init__(self, content, cache_tags=None, **kwargs):
+        super().__init__(None, **kwargs)
+        self.prerendered_content = content
+        # Picked up by ResponseCacheMixin instead of get_cache_tags(data)
+        self.cache_tags = cache_tags
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = self.accepted_renderer.media_type
+        return self.prerendered_content
+
+
+class FragmentStore:
+    prefix = 'product_fragment'
+    timeout = 3600
+
+    def __init__(self, serializer_class, queryset):
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.renderer = JSONRenderer()
+
+    def key(self, product):
+        version = int(product.updated_at.timestamp() * 1_000_000)
+        return f'{self.prefix}:{product.id}:{version}'
+
+    def render_many(self, products):
+        """JSON array (bytes) of ``products`` in the given order"""
+        keys = [self.key(product) for product in products]
+        cached = cache.get_many(keys)
+        fragments = {
+            product.id: cached[key] for product, key in zip(products, keys) if key in cached
+        }
+
+        missing = [product.id for product in products if product.id not in fragments]
+        if missing:
+            fresh = self.queryset.in_bulk(missing)
+            to_store = {}
+            for item in self.serializer_class(list(fresh.values()), many=True).data:
+                fragment = self.renderer.render(item)
+                fragments[item['id']] = fragment
+                to_store[self.key(fresh[item['id']])] = fragment
+            cache.set_many(to_store, self.timeout)
+
+        metrics.incr_buffered(f'fragments:{self.prefix}', {
+            'hits': len(products) - len(missing), 'misses': len(missing),
+        })
+        # A product deleted meanwhile simply drops out of the page
+        return b'[' + b','.join(
+            fragments[product.id] for product in products if product.id in fragments
+        ) + b']'
+
+
+def can_splice(request):
+    """Fragments are compact JSON, other renderers and indented JSON are built normally"""
+    return (
+        type(request.accepted_renderer) is JSONRenderer
+        and 'indent' not in (request.accepted_media_type or '')
+    )
+
+
+def splice_results(response, results, cache_tags=None):
+    """Put the pre-rendered ``results`` array into a paginated ``response``"""
+    envelope = dict(response.data)
+    envelope['results'] = []
+    head = JSONRenderer().render(envelope)
+    # results is always the last key of the paginated envelope
+    assert head.endswith(b'"results":[]}')
+    content = head[:-len(b'[]}')] + results + b'}'
+    return PrerenderedResponse(content, cache_tags=cache_tags)
@@ -0,0 +1,316 @@
+"""
+Bulk catalog import from CSV or NDJSON.
+
+Rows are read lazily from the stream and handled in chunks: each chunk is
+validated, then written with one bulk_create and one bulk_update inside its
+own transaction. Only the current chunk, the category name -> id map and
+the ids of the written products are held in memory.
+
+Products rows:   id (optional, updates that product), name, description,
+                 price, stock, category (name, created when missing)
+Categories rows: name (upsert key), description
+
+bulk_create/bulk_update skip model signals, so the low stock flags are
+synced per chunk, the category counters are rebuilt for the touched
+categories and the response cache is invalidated once when the import is
+done. Flash sale products get their Redis stock counters reconciled then.
+"""
+
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from ecommerce_backend.cache_tags import ALL_CATEGORIES, category_tag, invalidate_tags, product_write_tags
+from . import reservations
+from .low_stock import notify_low_stock
+from .models import Category, Product
+
+FORMATS = ('csv', 'ndjson')
+KINDS = ('products', 'categories')
+CHUNK_SIZE = 1000
+# Per-row errors kept for the report, the rest is only counted
+MAX_REPORTED_ERRORS = 1000
+
+PRODUCT_UPDATE_FIELDS = ['name', 'description', 'price', 'stock', 'category', 'updated_at']
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def detect_format(filename):
+    """Guess the format from a file name, None when unknown"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict) from a binary ``stream``, None for malformed rows"""
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        # Row 1 is the header
+        for number, row in enumerate(reader, start=2):
+            # Extra cells end up under the None key
+            yield number, None if None in row else row
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(row, field, errors, required=True, max_length=None):
+    value = (row.get(field) or '')
+    value = value.strip() if isinstance(value, str) else str(value)
+    if required and not value:
+        errors[field] = 'This field is required.'
+    elif max_length and len(value) > max_length:
+        errors[field] = f'Ensure this field has no more than {max_length} characters.'
+    return value
+
+
+def _price(row, errors):
+    try:
+        value = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        errors['price'] = 'A valid number is required.'
+        return None
+    # Same rules as ProductSerializer
+    if not value.is_finite():
+        errors['price'] = 'A valid number is required.'
+    elif value <= 0:
+        errors['price'] = 'Price must be greater than zero!'
+    elif value.as_tuple().exponent < -2 or value >= 10 ** 8:
+        errors['price'] = 'Ensure there are no more than 10 digits and 2 decimal places.'
+    return value
+
+
+def _stock(row, errors):
+    raw = row.get('stock')
+    if raw in (None, ''):
+        return 0
+    try:
+        value = int(str(raw).strip())
+    except ValueError:
+        errors['stock'] = 'A valid integer is required.'
+        return None
+    if value < 0:
+        errors['stock'] = 'Stock cannot be negetive!'
+    return value
+
+
+class CatalogImporter:
+    """
+    Load products or categories from ``stream``.
+
+    Rows that fail validation are reported and skipped, the rest of the
+    chunk is still written.
+    """
+
+    def __init__(self, kind='products', chunk_size=CHUNK_SIZE):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown import kind {kind!r}')
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.result = ImportResult()
+        self.category_ids = {}
+        self.touched_categories = set()
+        # (id, category id) of the created and updated products
+        self.written = set()
+        # Their Redis stock counters start over from the imported stock
+        self.flash_sale_ids = set()
+
+    def run(self, stream, fmt):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown import format {fmt!r}')
+
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        handle_chunk = self._import_products if self.kind == 'products' else self._import_categories
+
+        try:
+            for chunk in chunked(read_rows(stream, fmt), self.chunk_size):
+                with transaction.atomic():
+                    handle_chunk(chunk)
+        finally:
+            # Also after a failure, committed chunks have to show up
+            self._finish()
+        return self.result
+
+    def _import_products(self, chunk):
+        valid = []
+        for number, row in chunk:
+            if row is None:
+                self.result.add_error(number, {'row': 'Malformed row.'})
+                continue
+
+            errors = {}
+            product_id = row.get('id')
+            if product_id not in (None, ''):
+                try:
+                    product_id = int(product_id)
+                except (TypeError, ValueError):
+                    errors['id'] = 'A valid integer is required.'
+            else:
+                product_id = None
+
+            fields = {
+                'name': _text(row, 'name', errors, max_length=200),
+                'description': _text(row, 'description', errors),
+                'price': _price(row, errors),
+                'stock': _stock(row, errors),
+            }
+            category_name = _text(row, 'category', errors, max_length=100)
+
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                valid.append((number, product_id, category_name, fields))
+
+        self._ensure_categories({category_name for _, _, category_name, _ in valid})
+
+        existing = Product.objects.in_bulk(
+            [product_id for _, product_id, _, _ in valid if product_id is not None]
+        )
+        now = timezone.now()
+        to_create, to_update = [], []
+        for number, product_id, category_name, fields in valid:
+            category_id = self.category_ids[category_name]
+            self.touched_categories.add(category_id)
+
+            if product_id is None:
+                to_create.append(Product(category_id=category_id, **fields))
+                continue
+
+            product = existing.get(product_id)
+            if product is None:
+                self.result.add_error(number, {'id': f'Product {product_id} does not exist.'})
+                continue
+
+            # Moving products change two counters
+            self.touched_categories.add(product.category_id)
+            if product.flash_sale:
+                self.flash_sale_ids.add(product.pk)
+            for name, value in fields.items():
+                setattr(product, name, value)
+            product.category_id = category_id
+            # bulk_update doesn't apply auto_now, fragment keys depend on it
+            product.updated_at = now
+            to_update.append(product)
+
+        Product.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        Product.objects.bulk_update(to_update, PRODUCT_UPDATE_FIELDS, batch_size=self.chunk_size)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+
+        self.written.update((product.pk, product.category_id) for product in to_create + to_update)
+        written = [product.pk for product in to_create + to_update]
+        if written:
+            notify_low_stock(Product.objects.filter(pk__in=written).sync_low_stock())
+
+    def _import_categories(self, chunk):
+        rows = {}
+        for number, row in chunk:
+            if row is None:
+                self.result.add_error(number, {'row': 'Malformed row.'})
+                continue
+
+            errors = {}
+            name = _text(row, 'name', errors, max_length=100)
+            description = _text(row, 'description', errors, required=False)
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                # The last row wins when a name repeats inside the chunk
+                rows[name] = description
+
+        existing = Category.objects.in_bulk(list(rows), field_name='name')
+        to_create, to_update = [], []
+        for name, description in rows.items():
+            category = existing.get(name)
+            if category is None:
+                to_create.append(Category(name=name, description=description))
+            elif category.description != description:
+                category.description = description
+                to_update.append(category)
+
+        Category.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        Category.objects.bulk_update(to_update, ['description'], batch_size=self.chunk_size)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+        self.touched_categories.update(category.id for category in to_update)
+
+    def _ensure_categories(self, names):
+        """Create the categories products refer to by name"""
+        missing = [name for name in names if name not in self.category_ids]
+        if not missing:
+            return
+
+        Category.objects.bulk_create(
+            [Category(name=name) for name in missing], ignore_conflicts=True
+        )
+        self.category_ids.update(
+            Category.objects.filter(name__in=missing).values_list('name', 'id')
+        )
+
+    def _finish(self):
+        if self.kind == 'products' and self.touched_categories:
+            Category.objects.filter(pk__in=self.touched_categories).rebuild_products_count()
+
+        # One targeted invalidation for the whole import
+        if self.result.created or self.result.updated:
+            tags = product_write_tags(self.written) if self.kind == 'products' else set()
+            tags.add(ALL_CATEGORIES)
+            # Moved products also leave their old category
+            tags.update(category_tag(category_id) for category_id in self.touched_categories)
+            invalidate_tags(tags)
+        if self.flash_sale_ids:
+            reservations.reconcile(list(self.flash_sale_ids))
+
+
+def import_catalog(stream, fmt, kind='products', chunk_size=CHUNK_SIZE):
+    """Import ``stream`` and return the ImportResult"""
+    return CatalogImporter(kind, chunk_size).run(stream, fmt)
@@ -0,0 +1,50 @@
+"""
+Low stock change feed.
+
+Products carry a maintained ``is_low_stock`` flag (ProductQuerySet.
+sync_low_stock) and every flip is stored as a LowStockEvent. Dashboards
+either read the feed with ``GET /api/products/low_stock/events/?after=<id>``
+or subscribe to ``ws/products/low_stock/`` and get the events pushed.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_GROUP = 'low_stock'
+
+
+def event_payload(event):
+    return {
+        'id': event.id,
+        'product': event.product_id,
+        'is_low_stock': event.is_low_stock,
+        'stock': event.stock,
+        'threshold': event.threshold,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def notify_low_stock(events):
+    """Push ``events`` to the dashboards once the transaction commits"""
+    if not events:
+        return
+    payload = [event_payload(event) for event in events]
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                LOW_STOCK_GROUP, {'type': 'low_stock_events', 'events': payload}
+            )
+        except Exception:
+            # The stored feed stays the source of truth
+            logger.warning('Could not push %d low stock events', len(payload), exc_info=True)
+
+    transaction.on_commit(send)
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import CHUNK_SIZE, FORMATS, KINDS, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products or categories from a CSV or NDJSON file ("-" reads stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=KINDS, default='products')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name, pass --format')
+
+        if path == '-':
+            result = import_catalog(sys.stdin.buffer, file_format, options['kind'], options['chunk_size'])
+        else:
+            with open(path, 'rb') as stream:
+                result = import_catalog(stream, file_format, options['kind'], options['chunk_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... {result.failed - len(result.errors)} more failed rows')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created}, updated {result.updated}, failed {result.failed}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from ecommerce_backend.cache_tags import ALL_CATEGORIES, invalidate_tags
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recount Category.products_count from the product table'
+    
+    def handle(self, *args, **options):
+        updated = Category.objects.all().rebuild_products_count()
+        invalidate_tags([ALL_CATEGORIES])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product counts for {updated} categories'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from products.search import install_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create (if needed) and rebuild the product full-text search index'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+    
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        install_search_index(connection)
+        rebuild_search_index(connection)
+        self.stdout.write(self.style.SUCCESS('Product search index rebuilt'))
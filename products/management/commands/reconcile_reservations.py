@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from products.reservations import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Write flash sale units sold through Redis back to Product.stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Seconds between runs, runs once when 0',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sold = reconcile()
+            self.stdout.write(
+                f'Reconciled {len(sold)} products, {sum(sold.values())} units sold'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
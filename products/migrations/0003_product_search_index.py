@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from products.search import FTS_TABLE, install_search_index
+
+
+def create_index(apps, schema_editor):
+    install_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS products_product_search_idx')
+            cursor.execute('ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_category_products_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_low_stock(apps, schema_editor):
+    # Every category starts at the default threshold of 10, no events for
+    # products that were already low
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(stock__gt=0, stock__lt=10).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_low_stock', models.BooleanField()),
+                ('stock', models.IntegerField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['stock', 'id'], name='product_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='lowstockevent',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_events', to='products.product'),
+        ),
+        migrations.RunPython(populate_low_stock, migrations.RunPython.noop),
+    ]
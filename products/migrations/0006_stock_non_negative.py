@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:42
+
+from django.db import migrations, models
+
+
+def clamp_negative_stock(apps, schema_editor):
+    # Oversold rows from the old checkout would fail the constraint
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(stock__lt=0).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_low_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_negative_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='product_stock_non_negative'),
+        ),
+    ]
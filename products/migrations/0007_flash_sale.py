@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_stock_non_negative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='flash_sale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
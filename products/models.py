@@ -1,13 +1,87 @@
 from django.db import models 
+from django.db.models import BooleanField, Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+# Category default, the cut-off the low stock list always had
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+
+
+class CategoryQuerySet(models.QuerySet):
+    
+    def adjust_products_count(self, delta):
+        """Shift the cached product counter without reading it"""
+        return self.update(products_count=F('products_count') + delta)
+    
+    def rebuild_products_count(self):
+        """Recount products for every category in the queryset (single UPDATE)"""
+        counts = (
+            Product.objects.filter(category=OuterRef('pk'))
+            .order_by()
+            .values('category')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(products_count=Coalesce(Subquery(counts), 0))
+
+
+class ProductQuerySet(models.QuerySet):
+    
+    def sync_low_stock(self):
+        """
+        Recompute is_low_stock for the products in the queryset and record a
+        LowStockEvent for each product that crossed its threshold. Returns the
+        events, products that didn't cross cost no write at all.
+        """
+        threshold = Coalesce('low_stock_threshold', 'category__low_stock_threshold')
+        changed = list(
+            self.order_by()
+            .annotate(
+                threshold=threshold,
+                should_be_low=Case(
+                    When(stock__gt=0, stock__lt=threshold, then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField(),
+                ),
+            )
+            .exclude(is_low_stock=F('should_be_low'))
+            .values_list('id', 'should_be_low', 'stock', 'threshold')
+        )
+        if not changed:
+            return []
+        
+        for flag in (True, False):
+            ids = [product_id for product_id, low, _, _ in changed if low == flag]
+            if ids:
+                Product.objects.filter(pk__in=ids).update(is_low_stock=flag)
+        
+        return LowStockEvent.objects.bulk_create([
+            LowStockEvent(product_id=product_id, is_low_stock=low, stock=stock, threshold=threshold)
+            for product_id, low, stock, threshold in changed
+        ])
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100 , unique=True)
     description = models.TextField(blank=True)
+    # Denormalized counter kept up to date by products/signals.py
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+    # Products below this stock show up in the low stock list
+    low_stock_threshold = models.PositiveIntegerField(default=DEFAULT_LOW_STOCK_THRESHOLD)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Renames have to refresh the product fragments, threshold changes
+        # the low stock flags (see signals.py)
+        instance._loaded_name = instance.__dict__.get('name')
+        instance._loaded_threshold = instance.__dict__.get('low_stock_threshold')
+        return instance
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -21,14 +95,70 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Overrides the category threshold when set
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)
+    # Maintained by ProductQuerySet.sync_low_stock
+    is_low_stock = models.BooleanField(default=False, editable=False)
+    # Carts and checkouts take its stock through Redis counters (reservations.py)
+    flash_sale = models.BooleanField(default=False)
+    
+    objects = ProductQuerySet.as_manager()
     
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signals.py can tell what a save changed
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_stock = instance.__dict__.get('stock')
+        instance._loaded_threshold = instance.__dict__.get('low_stock_threshold')
+        instance._loaded_flash_sale = instance.__dict__.get('flash_sale')
+        return instance
+    
     @property
     def in_stock(self):
         
         return self.stock > 0
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Default listing order (plus the id tiebreaker used by cursors)
+            models.Index(fields=['-created_at', '-id'], name='product_recent_idx'),
+            models.Index(fields=['category', '-created_at'], name='product_category_recent_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['stock'], name='product_stock_idx'),
+            # ?in_stock=true listings only
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(stock__gt=0),
+                name='product_in_stock_idx',
+            ),
+            # The low stock list, most urgent first
+            models.Index(
+                fields=['stock', 'id'], condition=Q(is_low_stock=True),
+                name='product_low_stock_idx',
+            ),
+        ]
+        constraints = [
+            # Last line of defence against overselling, checkout never gets here
+            models.CheckConstraint(condition=Q(stock__gte=0), name='product_stock_non_negative'),
+        ]
+
+
+class LowStockEvent(models.Model):
+    """A product entering (is_low_stock) or leaving the low stock list"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_events')
+    is_low_stock = models.BooleanField()
+    stock = models.IntegerField()
+    threshold = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        state = 'low' if self.is_low_stock else 'ok'
+        return f"{self.product_id} {state} at {self.stock}"
+    
+    class Meta:
+        ordering = ['id']
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+Redis stock reservations for flash sale products (``Product.flash_sale``).
+
+The stock of a flagged product is split into three Redis counters, so
+buyers never queue on its database row:
+
+- ``avail``: units nobody holds;
+- ``resv``: units held by carts, a hash of holder (user id) -> quantity,
+  next to a sorted set of when each hold expires;
+- ``sold``: units checked out since the last reconciliation.
+
+avail + resv + sold is the database stock. Adding to a cart reserves units
+(the cart line quantity becomes the holder's reservation), removing them
+releases them, and checkout turns the reservation into sold units. Each
+step is one Lua script that only hands out what ``avail`` holds, so
+holds and sales never add up to more than the stock whatever the
+concurrency. Holds expire RESERVATIONS['TTL'] seconds after the cart last
+changed and are handed back by the next script touching the product.
+
+Checkouts sell inside ``sales()``, which puts the units back when the
+order's transaction rolls back.
+
+reconcile (the reconcile_reservations command) moves the
+sold units to Product.stock with one UPDATE and rebuilds ``avail`` from the
+new stock, which also picks up restocks made in the database. Counters are
+loaded from the database the first time a product is used.
+"""
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from ecommerce_backend import metrics
+from ecommerce_backend.cache_tags import invalidate_tags, product_write_tags
+from .low_stock import notify_low_stock
+from .models import Product
+
+# Hands expired holds back to avail, shared by the scripts below
+_RECLAIM = """
+local function reclaim(avail, resv, expires, now)
+    local expired = redis.call('ZRANGEBYSCORE', expires, '-inf', now)
+    for _, holder in ipairs(expired) do
+        redis.call('INCRBY', avail, tonumber(redis.call('HGET', resv, holder) or '0'))
+        redis.call('HDEL', resv, holder)
+    end
+    if #expired > 0 then
+        redis.call('ZREMRANGEBYSCORE', expires, '-inf', now)
+    end
+end
+"""
+
+# KEYS avail, resv, expires - ARGV holder, quantity, expires at, now
+# {1, available} when reserved, {0, available} when short, {-1, 0} if not loaded
+_RESERVE = _RECLAIM + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-1, 0}
+end
+reclaim(KEYS[1], KEYS[2], KEYS[3], ARGV[4])
+local quantity = tonumber(ARGV[2])
+local held = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local avail = tonumber(redis.call('GET', KEYS[1]))
+if quantity > held and quantity - held > avail then
+    return {0, math.max(avail + held, 0)}
+end
+redis.call('DECRBY', KEYS[1], quantity - held)
+if quantity > 0 then
+    redis.call('HSET', KEYS[2], ARGV[1], quantity)
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+else
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+end
+return {1, avail - quantity + held}
+"""
+
+# KEYS avail, resv, expires per product - ARGV holder
+_RELEASE = """
+for i = 1, #KEYS, 3 do
+    local held = tonumber(redis.call('HGET', KEYS[i + 1], ARGV[1]) or '0')
+    if held > 0 and redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('INCRBY', KEYS[i], held)
+    end
+    redis.call('HDEL', KEYS[i + 1], ARGV[1])
+    redis.call('ZREM', KEYS[i + 2], ARGV[1])
+end
+return 0
+"""
+
+# KEYS avail, resv, expires, sold per product - ARGV holder, now, quantity per product
+# All or nothing: {} when sold, else the positions of the short products
+# (negative when not loaded)
+_SELL = _RECLAIM + """
+local short = {}
+local n = 0
+for i = 1, #KEYS, 4 do
+    n = n + 1
+    if redis.call('EXISTS', KEYS[i]) == 0 then
+        table.insert(short, -n)
+    else
+        reclaim(KEYS[i], KEYS[i + 1], KEYS[i + 2], ARGV[2])
+        local held = tonumber(redis.call('HGET', KEYS[i + 1], ARGV[1]) or '0')
+        local avail = tonumber(redis.call('GET', KEYS[i]))
+        local quantity = tonumber(ARGV[n + 2])
+        if quantity > held and quantity - held > avail then
+            table.insert(short, n)
+        end
+    end
+end
+if #short > 0 then
+    return short
+end
+n = 0
+for i = 1, #KEYS, 4 do
+    n = n + 1
+    local quantity = tonumber(ARGV[n + 2])
+    local held = tonumber(redis.call('HGET', KEYS[i + 1], ARGV[1]) or '0')
+    redis.call('DECRBY', KEYS[i], quantity - held)
+    redis.call('HDEL', KEYS[i + 1], ARGV[1])
+    redis.call('ZREM', KEYS[i + 2], ARGV[1])
+    redis.call('INCRBY', KEYS[i + 3], quantity)
+end
+return short
+"""
+
+# KEYS avail, sold per product - ARGV quantity per product
+_UNSELL = """
+local n = 0
+for i = 1, #KEYS, 2 do
+    n = n + 1
+    local quantity = tonumber(ARGV[n])
+    redis.call('INCRBY', KEYS[i], quantity)
+    redis.call('DECRBY', KEYS[i + 1], quantity)
+end
+return 0
+"""
+
+# KEYS avail, resv, expires, sold - ARGV stock, now, only if not loaded
+_REBASE = """
+if ARGV[3] == '1' and redis.call('EXISTS', KEYS[1]) == 1 then
+    return tonumber(redis.call('GET', KEYS[1]))
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[2])
+local reserved = 0
+for _, holder in ipairs(redis.call('HKEYS', KEYS[2])) do
+    if not redis.call('ZSCORE', KEYS[3], holder) then
+        redis.call('HDEL', KEYS[2], holder)
+    else
+        reserved = reserved + tonumber(redis.call('HGET', KEYS[2], holder))
+    end
+end
+local avail = tonumber(ARGV[1]) - reserved - tonumber(redis.call('GET', KEYS[4]) or '0')
+redis.call('SET', KEYS[1], avail)
+return avail
+"""
+
+# KEYS sold - ARGV nothing, the units to write to the database
+_DRAIN = """
+local sold = tonumber(redis.call('GET', KEYS[1]) or '0')
+if sold ~= 0 then
+    redis.call('DECRBY', KEYS[1], sold)
+end
+return sold
+"""
+
+_scripts = {}
+_local = threading.local()
+
+
+def _script(source):
+    if source not in _scripts:
+        _scripts[source] = get_redis_connection('default').register_script(source)
+    return _scripts[source]
+
+
+def _keys(product_id):
+    """(avail, resv, expires, sold) Redis keys of a product"""
+    return tuple(
+        cache.make_key(f'stock:{product_id}:{name}') for name in ('avail', 'resv', 'expires', 'sold')
+    )
+
+
+def load(product_ids):
+    """Load the counters of products not in Redis yet from their database stock"""
+    rebase = _script(_REBASE)
+    now = time.time()
+    for product_id, stock in Product.objects.filter(pk__in=product_ids).values_list('id', 'stock'):
+        rebase(keys=_keys(product_id), args=[stock, now, '1'])
+
+
+def reserve(product_id, holder, quantity):
+    """
+    Make ``holder``'s reservation of a product ``quantity`` units (0 releases
+    it). Returns (reserved, units the holder could have).
+    """
+    avail, resv, expires, _ = _keys(product_id)
+    now = time.time()
+    args = [holder, quantity, now + settings.RESERVATIONS['TTL'], now]
+    reserved, available = _script(_RESERVE)(keys=[avail, resv, expires], args=args)
+    if reserved == -1:
+        load([product_id])
+        reserved, available = _script(_RESERVE)(keys=[avail, resv, expires], args=args)
+    metrics.incr('reservations', 'reserved' if reserved == 1 else 'refused')
+    return reserved == 1, available
+
+
+def release(product_ids, holder):
+    """Hand ``holder``'s reservations of the products back"""
+    keys = [key for product_id in product_ids for key in _keys(product_id)[:3]]
+    if keys:
+        _script(_RELEASE)(keys=keys, args=[holder])
+
+
+def sell(holder, quantities):
+    """
+    Sell {product id: quantity} to ``holder``, out of their reservations
+    first, all or nothing. Returns the ids of the products that are short.
+    """
+    product_ids = list(quantities)
+    keys = [key for product_id in product_ids for key in _keys(product_id)]
+    args = [holder, time.time()] + [quantities[product_id] for product_id in product_ids]
+    short = _script(_SELL)(keys=keys, args=args)
+    if any(position < 0 for position in short):
+        load([product_ids[-position - 1] for position in short if position < 0])
+        args[1] = time.time()
+        short = _script(_SELL)(keys=keys, args=args)
+    metrics.incr('reservations', 'sold' if not short else 'sold_out')
+    if not short:
+        _track(quantities, 1)
+    return [product_ids[position - 1] for position in short]
+
+
+def unsell(quantities):
+    """Put units sold by ``sell`` back on sale, for orders that didn't go through"""
+    keys, args = [], []
+    for product_id, quantity in quantities.items():
+        avail, _, _, sold = _keys(product_id)
+        keys += [avail, sold]
+        args.append(quantity)
+    if keys:
+        _script(_UNSELL)(keys=keys, args=args)
+        _track(quantities, -1)
+
+
+@contextmanager
+def sales():
+    """
+    Units sold inside the block go back on sale if it raises. Wrap the
+    transaction the orders are written in, so a failed commit is covered.
+    """
+    sold = Counter()
+    stack = _local.__dict__.setdefault('sales', [])
+    stack.append(sold)
+    try:
+        yield
+    except BaseException:
+        unsell({product_id: units for product_id, units in sold.items() if units})
+        raise
+    finally:
+        stack.remove(sold)
+
+
+def _track(quantities, sign):
+    # Keeps what the innermost sales() block has to put back
+    stack = getattr(_local, 'sales', None)
+    if stack:
+        for product_id, quantity in quantities.items():
+            stack[-1][product_id] += sign * quantity
+
+
+def split(lines):
+    """({product id: quantity} of flash sale products, of the others) for cart lines"""
+    flash, regular = {}, {}
+    for line in lines:
+        (flash if line.product.flash_sale else regular)[line.product_id] = line.quantity
+    return flash, regular
+
+
+def reconcile(product_ids=None):
+    """
+    Write the units sold through Redis to Product.stock (one UPDATE) and
+    rebuild the counters from the result. All flash sale products unless
+    ``product_ids`` is given. Returns {product id: units written}.
+    """
+    products = Product.objects.filter(flash_sale=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    product_ids = list(products.values_list('pk', flat=True))
+    if not product_ids:
+        return {}
+
+    sold, stocks = _write_sold(product_ids)
+    rebase = _script(_REBASE)
+    now = time.time()
+    for product_id, stock in stocks.items():
+        rebase(keys=_keys(product_id), args=[stock, now, '0'])
+    metrics.incr_many('reservations', {'reconciled': 1, 'reconciled_units': sum(sold.values())})
+    return sold
+
+
+def forget(product_id):
+    """Write back and drop the counters of a product taken off flash sale"""
+    _write_sold([product_id])
+    get_redis_connection('default').delete(*_keys(product_id))
+
+
+def _write_sold(product_ids):
+    """Move the sold counters to Product.stock, ({product id: units}, {product id: new stock})"""
+    drain = _script(_DRAIN)
+    sold = {product_id: drain(keys=[_keys(product_id)[3]]) for product_id in product_ids}
+    sold = {product_id: units for product_id, units in sold.items() if units}
+    try:
+        with transaction.atomic():
+            if sold:
+                units = Case(
+                    *[When(pk=product_id, then=Value(n)) for product_id, n in sold.items()],
+                    output_field=IntegerField(),
+                )
+                # A restock in the database may have set a lower figure meanwhile
+                Product.objects.filter(pk__in=sold).update(
+                    stock=Greatest(F('stock') - units, Value(0)), updated_at=timezone.now(),
+                )
+                notify_low_stock(Product.objects.filter(pk__in=sold).sync_low_stock())
+            rows = Product.objects.filter(pk__in=product_ids).values_list('id', 'stock', 'category_id')
+            stocks = {product_id: stock for product_id, stock, _ in rows}
+            categories = {product_id: category_id for product_id, _, category_id in rows}
+    except Exception:
+        # Nothing was written, they go with the next run
+        redis = get_redis_connection('default')
+        for product_id, units in sold.items():
+            redis.incrby(_keys(product_id)[3], units)
+        raise
+
+    if sold:
+        invalidate_tags(product_write_tags((product_id, categories[product_id]) for product_id in sold))
+    return sold, stocks
@@ -0,0 +1,7 @@
+from django.urls import re_path
+from . import consumers
+
+# WebSocket URL patterns
+websocket_urlpatterns = [
+    re_path(r'ws/products/low_stock/$', consumers.LowStockConsumer.as_asgi()),
+]
@@ -0,0 +1,158 @@
+"""
+Full-text search for products.
+
+SQLite:     an external-content FTS5 table (products_product_fts) kept in sync
+            with products_product by triggers, ranked with bm25().
+PostgreSQL: a stored, weighted tsvector column with a GIN index, ranked with
+            ts_rank().
+Other databases fall back to the old icontains scan.
+
+Every word of the search term is prefix matched and all words must match.
+The backend only narrows and ranks the queryset, so the category, price and
+in_stock filters from ProductViewSet.get_queryset still apply.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+FTS_TABLE = 'products_product_fts'
+
+# Name matches count ten times as much as description matches
+SQLITE_RANK = f'-bm25({FTS_TABLE}, 10.0, 1.0)'
+POSTGRES_RANK = "ts_rank(products_product.search_vector, to_tsquery('english', %s))"
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    # Stock and price updates don't touch the index
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description
+    ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+POSTGRES_SETUP = [
+    """
+    ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS products_product_search_idx '
+    'ON products_product USING GIN (search_vector)',
+]
+
+
+def install_search_index(connection):
+    """
+    Create the search index for ``connection`` if it is missing.
+
+    SQLite drops triggers whenever Django rebuilds products_product during a
+    migration, so this also runs after every migrate (see apps.py) and
+    rebuilds the index when the triggers had to be recreated.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_%'],
+            )
+            had_triggers = cursor.fetchone()[0] == len(SQLITE_TRIGGERS)
+
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                "name, description, content='products_product', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            for statement in SQLITE_TRIGGERS:
+                cursor.execute(statement)
+
+            if not had_triggers:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for statement in POSTGRES_SETUP:
+                cursor.execute(statement)
+
+
+def rebuild_search_index(connection):
+    """Re-index every product from scratch"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    # The PostgreSQL column is generated, it can't drift
+
+
+def search_words(term):
+    """Split a search term into plain words (drops FTS/tsquery syntax)"""
+    return re.findall(r'\w+', term.lower())
+
+
+def search_products(queryset, term):
+    """Narrow ``queryset`` to products matching ``term`` and annotate ``search_rank``"""
+    words = search_words(term)
+    if not words:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = products_product.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(SQLITE_RANK, (), output_field=FloatField()))
+
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        return queryset.extra(
+            where=["products_product.search_vector @@ to_tsquery('english', %s)"],
+            params=[tsquery],
+        ).annotate(
+            search_rank=RawSQL(POSTGRES_RANK, (tsquery,), output_field=FloatField())
+        )
+
+    # No index available, same behaviour as DRF's SearchFilter
+    for word in words:
+        queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+    return queryset
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    ``?search=`` backed by the full-text index. Results come back best match
+    first unless the client picked an explicit ``?ordering=``.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        if not search_words(term):
+            return queryset
+
+        queryset = search_products(queryset, term)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
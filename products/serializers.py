@@ -1,27 +1,25 @@
 from rest_framework import serializers
-from .models import Category, Product
+from ecommerce_backend.compiled_serializers import CompiledSerializerMixin
+from .models import Category, LowStockEvent, Product
 
 class CategorySerializer(serializers.ModelSerializer):
-    products_count = serializers.SerializerMethodField()
+    # Maintained counter column, no per-row COUNT query
+    products_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'products_count', 'created_at']
-    
-    def get_products_count(self, obj):
-        
-        return obj.products.count()
+        fields = ['id', 'name', 'description', 'products_count', 'low_stock_threshold', 'created_at']
 
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     in_stock = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'stock', 
-                 'category', 'category_name', 'in_stock', 
+                 'category', 'category_name', 'in_stock', 'low_stock_threshold',
                  'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
     
@@ -39,6 +37,23 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 
+class ProductChangeSerializer(serializers.Serializer):
+    """One ``{id, price?, stock?}`` entry of a bulk price/stock update"""
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    stock = serializers.IntegerField(required=False)
+    
+    # Same rules as single product updates
+    validate_price = ProductSerializer.validate_price
+    validate_stock = ProductSerializer.validate_stock
+    
+    def validate(self, attrs):
+        if 'price' not in attrs and 'stock' not in attrs:
+            raise serializers.ValidationError("Provide a price, a stock or both.")
+        return attrs
+
+
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     in_stock = serializers.BooleanField(read_only=True)
@@ -46,4 +61,13 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'stock', 
-                 'category', 'in_stock', 'created_at', 'updated_at']
\ No newline at end of file
+                 'category', 'in_stock', 'low_stock_threshold', 'created_at', 'updated_at']
+
+
+
+class LowStockEventSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    
+    class Meta:
+        model = LowStockEvent
+        fields = ['id', 'product', 'product_name', 'is_low_stock', 'stock', 'threshold', 'created_at']
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import reservations
+from .low_stock import notify_low_stock
+from .models import Category, Product
+
+
+@receiver(post_save, sender=Product)
+def sync_reservations_on_save(sender, instance, created, **kwargs):
+    """Flash sale counters start over from stock set in the database"""
+    # Registered first, sync_low_stock_on_save resets _loaded_stock
+    was_flash_sale = getattr(instance, '_loaded_flash_sale', None)
+    product_id = instance.pk
+    if instance.flash_sale and (
+        not was_flash_sale or getattr(instance, '_loaded_stock', None) != instance.stock
+    ):
+        transaction.on_commit(lambda: reservations.reconcile([product_id]))
+    elif was_flash_sale and not instance.flash_sale:
+        transaction.on_commit(lambda: reservations.forget(product_id))
+    
+    instance._loaded_flash_sale = instance.flash_sale
+
+
+@receiver(post_save, sender=Product)
+def sync_low_stock_on_save(sender, instance, created, **kwargs):
+    """Stock, threshold or category changes can move the product in or out of the low stock list"""
+    changed = created or any(
+        getattr(instance, f'_loaded_{field}', None) != value
+        for field, value in (
+            ('stock', instance.stock),
+            ('threshold', instance.low_stock_threshold),
+            ('category_id', instance.category_id),
+        )
+    )
+    if changed:
+        notify_low_stock(Product.objects.filter(pk=instance.pk).sync_low_stock())
+    
+    instance._loaded_stock = instance.stock
+    instance._loaded_threshold = instance.low_stock_threshold
+
+
+@receiver(post_save, sender=Product)
+def update_count_on_save(sender, instance, created, **kwargs):
+    """Keep Category.products_count in step with product creates and moves"""
+    old_category_id = getattr(instance, '_loaded_category_id', None)
+    
+    if created:
+        Category.objects.filter(pk=instance.category_id).adjust_products_count(1)
+    elif old_category_id is not None and old_category_id != instance.category_id:
+        Category.objects.filter(pk=old_category_id).adjust_products_count(-1)
+        Category.objects.filter(pk=instance.category_id).adjust_products_count(1)
+    
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Product)
+def update_count_on_delete(sender, instance, **kwargs):
+    Category.objects.filter(pk=instance.category_id).adjust_products_count(-1)
+
+
+@receiver(post_save, sender=Category)
+def touch_products_on_rename(sender, instance, created, **kwargs):
+    """Product JSON embeds category_name, bumping updated_at retires cached fragments"""
+    old_name = getattr(instance, '_loaded_name', None)
+    
+    if not created and old_name is not None and old_name != instance.name:
+        Product.objects.filter(category=instance).update(updated_at=timezone.now())
+    
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=Category)
+def sync_low_stock_on_threshold(sender, instance, created, **kwargs):
+    old_threshold = getattr(instance, '_loaded_threshold', None)
+    
+    if not created and old_threshold is not None and old_threshold != instance.low_stock_threshold:
+        notify_low_stock(Product.objects.filter(category=instance).sync_low_stock())
+    
+    instance._loaded_threshold = instance.low_stock_threshold
@@ -1,21 +1,58 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, mixins, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.cache import cache
 from django.db.models import Q
-from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductDetailSerializer
+from ecommerce_backend.cache_tags import (
+    ALL_CATEGORIES, ALL_PRODUCTS, category_tag, invalidate_tags, product_tag, product_write_tags,
+)
+from ecommerce_backend.caching import CachedResponseMixin
+from ecommerce_backend.db_router import ReplicaReadMixin
+from ecommerce_backend.local_cache import responses as local_responses
+from ecommerce_backend.sparse_fields import SparseFieldsMixin
+from ecommerce_backend.export import (
+    CHUNK_SIZE, export_response, filter_ranges, get_output, stream_csv, stream_ndjson,
+)
+from ecommerce_backend.pagination import KeysetPagination
+from .models import Category, LowStockEvent, Product
+from .bulk import MAX_CHANGES, apply_changes
+from .fragments import KEY_FIELDS, FragmentStore, can_splice, splice_results
+from .facets import facet_counts, parse_buckets
+from .importer import FORMATS, KINDS, detect_format, import_catalog
+from .search import ProductSearchFilter
+from .serializers import (
+    CategorySerializer, LowStockEventSerializer, ProductChangeSerializer, ProductSerializer,
+    ProductDetailSerializer,
+)
 
 # Cache timeout - 1 hour (3600 seconds)
 CACHE_TTL = 3600
 
+# Columns of /api/products/export/, named like the ProductSerializer fields
+EXPORT_FIELDS = {
+    'id': 'id', 'name': 'name', 'description': 'description', 'price': 'price',
+    'stock': 'stock', 'category': 'category_id', 'category_name': 'category__name',
+    'created_at': 'created_at', 'updated_at': 'updated_at',
+}
 
-class CategoryViewSet(viewsets.ModelViewSet):
+# Largest batch of the low stock change feed
+LOW_STOCK_EVENTS_LIMIT = 500
+
+# Pre-rendered JSON of every product, shared by all list pages
+product_fragments = FragmentStore(
+    ProductSerializer, Product.objects.select_related('category')
+)
+
+
+class CategoryViewSet(ReplicaReadMixin, SparseFieldsMixin, CachedResponseMixin, viewsets.ModelViewSet):
    
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = None  # category list has always been a plain list
+    cache_timeout = CACHE_TTL
+    local_cache = local_responses
     
     def get_permissions(self):
         # everone can see , Admin can modify
@@ -25,53 +62,57 @@ class CategoryViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
     
-    def list(self, request, *args, **kwargs):
-        # Try to get categories from cache first
-        cache_key = 'categories_list'
-        categories = cache.get(cache_key)
-        
-        if categories is None:
-            # Cache miss - fetch from database
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
-            categories = serializer.data
-            
-            # Store in cache for 1 hour
-            cache.set(cache_key, categories, CACHE_TTL)
-        
-        return Response(categories)
+    def get_cache_tags(self, data):
+        if self.action == 'retrieve':
+            return [ALL_CATEGORIES, category_tag(data['id'])]
+        return [ALL_CATEGORIES]
     
-    def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        
-        # Invalidate cache when new category is created
-        cache.delete('categories_list')
-        
-        return response
+    def get_validators(self, url_kwargs):
+        # Same dependencies as the cache entries
+        if self.action == 'retrieve':
+            return [ALL_CATEGORIES, category_tag(url_kwargs['pk'])], None
+        if self.action == 'list':
+            return [ALL_CATEGORIES], None
+        return None
     
-    def update(self, request, *args, **kwargs):
-        response = super().update(request, *args, **kwargs)
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
         
-        # Invalidate cache when category is updated
-        cache.delete('categories_list')
-        
-        return response
+        # A new category only shows up in the category list
+        invalidate_tags([ALL_CATEGORIES])
     
-    def destroy(self, request, *args, **kwargs):
-        response = super().destroy(request, *args, **kwargs)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
         
-        # Invalidate cache when category is deleted
-        cache.delete('categories_list')
+        # Product listings embed the category name
+        invalidate_tags([ALL_CATEGORIES, category_tag(serializer.instance.id)])
+    
+    def perform_destroy(self, instance):
+        category_id = instance.id
+        product_ids = list(instance.products.values_list('id', flat=True))
+        super().perform_destroy(instance)
         
-        return response
+        # Deleting a category cascades to its products and the cart and
+        # order lines holding them, which are only tagged with the product
+        tags = product_write_tags((product_id, category_id) for product_id in product_ids)
+        tags.add(ALL_CATEGORIES)
+        invalidate_tags(tags)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, SparseFieldsMixin, CachedResponseMixin, viewsets.ModelViewSet):
     
     queryset = Product.objects.select_related('category').all()  
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'description']
+    cache_timeout = CACHE_TTL
+    local_cache = local_responses
+    # Full-text index instead of SearchFilter's LIKE '%term%' scan
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     ordering_fields = ['price', 'created_at', 'stock']
+    pagination_class = KeysetPagination
+    replica_actions = ('list', 'retrieve', 'facets', 'low_stock', 'low_stock_events')
+    # ?fields= / ?expand=
+    expandable_fields = {'category': (CategorySerializer, 'category')}
+    field_columns = {'in_stock': ['stock']}
+    cache_tag_fields = ('id', 'category')
     
     def get_serializer_class(self):
         # Use detailed serializer for single product view
@@ -81,7 +122,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         # Everyone can view products, only admins can modify
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -115,58 +156,189 @@ class ProductViewSet(viewsets.ModelViewSet):
         return queryset
     
     def list(self, request, *args, **kwargs):
-        # Create cache key based on query params
-        query_params = request.query_params.dict()
-        cache_key = f"products_list_{hash(frozenset(query_params.items()))}"
-        
-        # Try to get from cache
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            return Response(cached_data)
+        return self.cached_response(self._list_from_fragments, request, *args, **kwargs)
+    
+    def _list_from_fragments(self, request, *args, **kwargs):
+        """Resolve the page's ids in SQL and splice the cached product fragments"""
+        # Fragments hold the full representation
+        if self.sparse is not None or not can_splice(request):
+            return mixins.ListModelMixin.list(self, request, *args, **kwargs)
         
-        # Cache miss - get from database
-        response = super().list(request, *args, **kwargs)
+        # Only the columns needed for ordering, cursors and fragment keys
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.select_related(None).only(*KEY_FIELDS, 'created_at', 'price', 'stock')
         
-        # Store in cache for 1 hour
-        cache.set(cache_key, response.data, CACHE_TTL)
+        page = self.paginate_queryset(queryset)
+        results = product_fragments.render_many(page)
         
-        return response
+        tags = self._list_cache_tags((product.id, product.category_id) for product in page)
+        return splice_results(self.get_paginated_response([]), results, cache_tags=tags)
     
-    def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        
-        # Invalidate all product list caches
-        self._invalidate_product_cache()
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self._invalidate_product_cache(serializer.instance)
+    
+    def perform_update(self, serializer):
+        # Remember the old category, the product may be moving out of it
+        old_category_id = serializer.instance.category_id
+        super().perform_update(serializer)
+        self._invalidate_product_cache(serializer.instance, old_category_id)
+    
+    def perform_destroy(self, instance):
+        product_id = instance.id
+        super().perform_destroy(instance)
+        instance.id = product_id  # delete() resets the pk
+        self._invalidate_product_cache(instance)
+    
+    def get_cache_tags(self, data):
+        """Tags a cached product response depends on"""
+        if self.action == 'retrieve':
+            return [product_tag(data['id']), category_tag(data['category']['id'])]
+        if self.action == 'facets':
+            # Counts change with any product write in scope, names with the categories
+            tags = {self._list_scope_tag()}
+            tags.update(category_tag(category['id']) for category in data['categories'])
+            return tags
         
-        return response
+        results = data['results'] if isinstance(data, dict) else data
+        return self._list_cache_tags(
+            (product['id'], _category_id(product['category'])) for product in results
+        )
     
-    def update(self, request, *args, **kwargs):
-        response = super().update(request, *args, **kwargs)
+    def get_validators(self, url_kwargs):
+        if self.action == 'retrieve':
+            # One indexed lookup instead of loading and serializing the product
+            try:
+                row = Product.objects.filter(pk=url_kwargs['pk']).values_list(
+                    'category_id', 'updated_at'
+                ).first()
+            except (TypeError, ValueError):
+                row = None
+            if row is None:
+                return None  # let retrieve() answer the 404
+            category_id, updated_at = row
+            return [product_tag(url_kwargs['pk']), category_tag(category_id)], updated_at
         
-        # Invalidate caches when product is updated
-        self._invalidate_product_cache()
+        if self.action in ('list', 'facets'):
+            # Every product write bumps the scope tag (product_write_tags),
+            # renames bump ALL_CATEGORIES
+            return [self._list_scope_tag(), ALL_CATEGORIES], None
+        return None
+    
+    def _list_scope_tag(self):
+        # Listings scoped to one category only change with that category,
+        # everything else changes with any product write
+        category_id = self.request.query_params.get('category')
+        return category_tag(category_id) if category_id else ALL_PRODUCTS
+    
+    def _list_cache_tags(self, products):
+        """Tags of a product listing, ``products`` yields (id, category id) pairs"""
+        tags = {self._list_scope_tag()}
+        for product_id, product_category_id in products:
+            tags.add(product_tag(product_id))
+            tags.add(category_tag(product_category_id))
+        return tags
+    
+    def _invalidate_product_cache(self, product, old_category_id=None):
+        """Drop cached pages that depend on ``product``, returns number of entries dropped"""
+        tags = {
+            ALL_PRODUCTS,
+            ALL_CATEGORIES,  # products_count changes
+            product_tag(product.id),
+            category_tag(product.category_id),
+        }
+        if old_category_id is not None:
+            tags.add(category_tag(old_category_id))
+        return invalidate_tags(tags)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Category, price bucket and stock counts for the current filters"""
+        return self.cached_response(self._facets, request)
+    
+    def _facets(self, request):
+        bounds = parse_buckets(request.query_params.get('price_buckets'))
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(facet_counts(queryset, bounds))
+    
+    @action(detail=False, methods=['get'])
+    def low_stock(self, request):
+        """Products below their low stock threshold (maintained flag), lowest stock first"""
+        products = self.get_queryset().filter(is_low_stock=True).order_by('stock', 'id')
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'], url_path='low_stock/events')
+    def low_stock_events(self, request):
+        """Products that entered or left the low stock list after event ``?after=<id>``"""
+        try:
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response({'error': 'after must be an event id'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return response
+        events = list(
+            LowStockEvent.objects.filter(id__gt=after).select_related('product')
+            .order_by('id')[:LOW_STOCK_EVENTS_LIMIT]
+        )
+        return Response({
+            'events': LowStockEventSerializer(events, many=True).data,
+            # Pass back as ?after= on the next call
+            'last_id': events[-1].id if events else after,
+        })
     
-    def destroy(self, request, *args, **kwargs):
-        response = super().destroy(request, *args, **kwargs)
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """Admin bulk import of a CSV/NDJSON ``file`` of products or categories"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Invalidate caches when product is deleted
-        self._invalidate_product_cache()
+        kind = request.data.get('kind', 'products')
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if kind not in KINDS:
+            return Response(
+                {'error': f'kind must be one of: {", ".join(KINDS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if file_format not in FORMATS:
+            return Response(
+                {'error': f'file_format must be one of: {", ".join(FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return response
+        result = import_catalog(upload, file_format, kind=kind)
+        return Response(result.as_dict())
+
     
-    def _invalidate_product_cache(self):
-        """Helper method to clear product caches"""
-        # Delete all keys that start with 'products_list'
-        #keys_pattern = 'ecommerce:products_list*' [note to self ]
-        # Note: Again I am keeping it simple . definitely not apt for production 
-        cache.delete_pattern('products_list*')
+    @action(detail=False, methods=['patch'], url_path='bulk')
+    def bulk_update(self, request):
+        """Admin price/stock changes for many products: a list of {id, price?, stock?}"""
+        serializer = ProductChangeSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=MAX_CHANGES
+        )
+        serializer.is_valid(raise_exception=True)
+        return Response({'updated': apply_changes(serializer.validated_data)})
     
     @action(detail=False, methods=['get'])
-    def low_stock(self, request):
-        """Custom endpoint to get products with low stock (less than 10)"""
-        products = self.get_queryset().filter(stock__lt=10, stock__gt=0)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+    def export(self, request):
+        """Admin export of the whole (filtered) catalog as NDJSON or CSV"""
+        output = get_output(request)
+        queryset = filter_ranges(self.filter_queryset(self.get_queryset()), request)
+        rows = (
+            queryset.select_related(None).order_by('id')
+            .values_list(*EXPORT_FIELDS.values())
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        
+        columns = list(EXPORT_FIELDS)
+        if output == 'csv':
+            content = stream_csv(columns, rows)
+        else:
+            content = stream_ndjson(dict(zip(columns, row)) for row in rows)
+        return export_response(content, output, 'products')
+
+
+def _category_id(category):
+    # ?expand=category nests the category
+    return category['id'] if isinstance(category, dict) else category
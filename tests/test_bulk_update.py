@@ -0,0 +1,100 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from products.models import Category, LowStockEvent, Product
+
+URL = '/api/products/bulk/'
+
+
+class BulkUpdateTests(TestCase):
+    """Test cases for bulk price and stock changes"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}', description='Test', price=10, stock=50, category=self.category
+            )
+            for i in range(6)
+        ]
+
+    def _patch(self, changes):
+        return self.client.patch(URL, changes, format='json')
+
+    def test_applies_changes(self):
+        """Test price, stock or both are written and the low stock flag follows"""
+        a, b, c = self.products[:3]
+        before = a.updated_at
+        response = self._patch([
+            {'id': a.id, 'price': '12.50'},
+            {'id': b.id, 'stock': 3},
+            {'id': c.id, 'price': '8.00', 'stock': 0},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 3})
+
+        a, b, c = Product.objects.filter(pk__in=[a.id, b.id, c.id]).order_by('id')
+        self.assertEqual((a.price, a.stock), (Decimal('12.50'), 50))
+        self.assertEqual((b.price, b.stock), (Decimal('10.00'), 3))
+        self.assertEqual((c.price, c.stock), (Decimal('8.00'), 0))
+        self.assertGreater(a.updated_at, before)
+        self.assertTrue(b.is_low_stock)
+        self.assertEqual(LowStockEvent.objects.get().product_id, b.id)
+
+    def test_query_count_does_not_grow(self):
+        """Test the number of statements doesn't depend on the number of changes"""
+        counts = []
+        for products in (self.products[:2], self.products):
+            with CaptureQueriesContext(connection) as ctx:
+                self._patch([{'id': p.id, 'price': '11.00', 'stock': 40} for p in products])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batch_changes_nothing(self):
+        """Test any invalid entry rejects the whole batch"""
+        a, b = self.products[:2]
+        for changes in (
+            [{'id': a.id, 'price': '12.00'}, {'id': b.id, 'stock': -1}],
+            [{'id': a.id, 'price': '0'}],
+            [{'id': a.id}],
+            [{'id': a.id, 'price': '12.00'}, {'id': a.id, 'stock': 1}],
+            [{'id': a.id, 'price': '12.00'}, {'id': 999999, 'stock': 1}],
+            [],
+        ):
+            self.assertEqual(self._patch(changes).status_code, 400, changes)
+        self.assertEqual(Product.objects.filter(price=12).count(), 0)
+
+        response = self._patch([{'id': a.id, 'price': '1'}, {'id': b.id, 'stock': -1}])
+        self.assertEqual(response.json()[1], {'stock': ['Stock cannot be negetive!']})
+
+    def test_cache_invalidated_once(self):
+        """Test the whole batch costs one invalidation and readers see the new prices"""
+        url = f'/api/products/{self.products[0].id}/'
+        self.client.get(url)
+        self.client.get('/api/products/')
+
+        self._patch([{'id': p.id, 'price': '15.00'} for p in self.products])
+        self.assertEqual(metrics.snapshot()['cache_invalidation']['invalidations'], 1)
+
+        self.assertEqual(self.client.get(url).json()['price'], '15.00')
+        listing = self.client.get('/api/products/').json()['results']
+        self.assertEqual({product['price'] for product in listing}, {'15.00'})
+
+    def test_admin_only(self):
+        """Test regular users cannot reprice"""
+        user = User.objects.create_user(username='buyer', password='pass123')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self._patch([{'id': self.products[0].id, 'price': '1'}]).status_code, 403)
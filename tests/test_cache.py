@@ -0,0 +1,212 @@
+import time
+from unittest import mock
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from orders.models import Cart, CartItem, Order, OrderItem
+from products.models import Category, Product
+from ecommerce_backend import local_cache, metrics
+from ecommerce_backend.caching import build_cache_key
+from ecommerce_backend.cache_tags import (
+    ALL_PRODUCTS, category_tag, invalidate_tags, product_tag, set_tagged,
+)
+
+
+class TagInvalidationTests(TestCase):
+    """Test cases for tag based cache invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='admin123'
+        )
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+        self.book = Product.objects.create(
+            name='Novel', description='A novel', price=10, stock=5, category=self.books
+        )
+        self.game = Product.objects.create(
+            name='Chess', description='Board game', price=30, stock=5, category=self.games
+        )
+
+    def test_invalidate_reports_dropped_entries(self):
+        """Test invalidation only drops entries registered with the tags"""
+        set_tagged('entry_a', 'a', [product_tag(1), ALL_PRODUCTS], 60)
+        set_tagged('entry_b', 'b', [product_tag(2)], 60)
+
+        self.assertEqual(invalidate_tags([product_tag(1), ALL_PRODUCTS]), 1)
+        self.assertIsNone(cache.get('entry_a'))
+        self.assertEqual(cache.get('entry_b'), 'b')
+
+        # Nothing left under those tags
+        self.assertEqual(invalidate_tags([product_tag(1)]), 0)
+
+    def test_value_computed_before_invalidation_not_stored(self):
+        """Test a body built before a write isn't cached after its invalidation"""
+        started = time.time()
+        invalidate_tags([product_tag(1)])
+        self.assertFalse(set_tagged('entry_a', 'a', [product_tag(1)], 60, since=started))
+        self.assertIsNone(cache.get('entry_a'))
+
+        self.assertTrue(set_tagged('entry_a', 'a', [product_tag(1)], 60, since=time.time()))
+        self.assertEqual(cache.get('entry_a'), 'a')
+
+    def test_invalidation_between_register_and_set(self):
+        """Test an entry whose tag sets were dropped under it isn't kept unregistered"""
+        real_set = cache.set
+
+        def racing_set(*args, **kwargs):
+            # What invalidate_tags does to the tag sets
+            get_redis_connection('default').delete(cache.make_key(f'tag:{product_tag(1)}'))
+            return real_set(*args, **kwargs)
+
+        with mock.patch.object(cache, 'set', side_effect=racing_set):
+            self.assertFalse(set_tagged('entry_a', 'a', [product_tag(1)], 60))
+        self.assertIsNone(cache.get('entry_a'))
+
+    def test_product_update_keeps_unrelated_category_pages(self):
+        """Test editing a book does not wipe the cached games listing"""
+        self.client.get(f'/api/products/?category={self.books.id}')
+        self.client.get(f'/api/products/?category={self.games.id}')
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(
+            f'/api/products/{self.book.id}/', {'price': 12}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Books page was dropped with the edit, games page is still cached
+        self.assertEqual(invalidate_tags([category_tag(self.books.id)]), 0)
+        self.assertEqual(invalidate_tags([category_tag(self.games.id)]), 1)
+
+    def test_moving_product_invalidates_old_category(self):
+        """Test changing a product's category drops both category listings"""
+        self.client.get(f'/api/products/?category={self.books.id}')
+        self.client.get(f'/api/products/?category={self.games.id}')
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(
+            f'/api/products/{self.book.id}/', {'category': self.games.id}, format='json'
+        )
+
+        self.assertEqual(invalidate_tags([
+            category_tag(self.books.id), category_tag(self.games.id)
+        ]), 0)
+
+        response = self.client.get(f'/api/products/?category={self.games.id}')
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_category_delete_drops_carts(self):
+        """Test deleting a category drops cached carts holding its products"""
+        buyer = User.objects.create_user(username='buyer', password='pass123')
+        cart = Cart.objects.create(user=buyer)
+        CartItem.objects.create(cart=cart, product=self.book, quantity=2)
+        self.client.force_authenticate(user=buyer)
+        self.assertEqual(self.client.get('/api/orders/cart/').data['item_count'], 2)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.delete(f'/api/products/categories/{self.books.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.force_authenticate(user=buyer)
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['item_count'], 0)
+
+    def test_category_rename_drops_carts_and_orders(self):
+        """Test renaming a category drops cached carts and orders holding its products"""
+        buyer = User.objects.create_user(username='buyer', password='pass123')
+        cart = Cart.objects.create(user=buyer)
+        CartItem.objects.create(cart=cart, product=self.book, quantity=1)
+        order = Order.objects.create(user=buyer, shipping_address='Street 1', phone_number='123')
+        OrderItem.objects.create(order=order, product=self.book, quantity=1, price=10)
+        self.client.force_authenticate(user=buyer)
+        self.client.get('/api/orders/cart/')
+        self.client.get(f'/api/orders/{order.id}/')
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(
+            f'/api/products/categories/{self.books.id}/', {'name': 'Novels'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=buyer)
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['cart_items'][0]['product']['category_name'], 'Novels')
+        self.assertEqual(self.client.get(f'/api/orders/{order.id}/')['X-Cache'], 'MISS')
+
+
+class ResponseCacheTests(TestCase):
+    """Test cases for the rendered response cache"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Books')
+        Product.objects.create(
+            name='Novel', description='A novel', price=10, stock=5, category=self.category
+        )
+
+    def test_key_ignores_query_param_order(self):
+        """Test the same query in a different order maps to the same key"""
+        factory = APIRequestFactory()
+        keys = set()
+        for query in ('?min_price=1&category=2', '?category=2&min_price=1'):
+            request = Request(factory.get('/api/products/' + query))
+            request.accepted_media_type = 'application/json'
+            keys.add(build_cache_key('product:list', request))
+        self.assertEqual(len(keys), 1)
+
+    def test_hit_replays_rendered_bytes(self):
+        """Test a cache hit returns the same bytes without re-rendering"""
+        first = self.client.get('/api/products/?category=%d' % self.category.id)
+        second = self.client.get('/api/products/?category=%d' % self.category.id)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['Content-Type'], 'application/json')
+
+        counters = metrics.snapshot()['cache:product']
+        self.assertEqual(counters['hits'], 1)
+        self.assertEqual(counters['misses'], 1)
+        self.assertEqual(counters['hit_bytes'], len(second.content))
+
+    def test_counters_buffered(self):
+        """Test hit and miss counters aren't written to Redis on every request"""
+        with mock.patch.object(metrics, 'incr_many') as incr_many, \
+                mock.patch.object(metrics, 'FLUSH_INTERVAL', 60):
+            self.client.get('/api/products/')
+            self.client.get('/api/products/')
+        incr_many.assert_not_called()
+
+        counters = metrics.snapshot()['cache:product']
+        self.assertEqual((counters['hits'], counters['misses'], counters['recomputes']), (1, 1, 1))
+        self.assertGreater(counters['stored_bytes'], 0)
+
+    def test_cart_cached_per_user(self):
+        """Test cart responses are cached per user and dropped on changes"""
+        user = User.objects.create_user(username='buyer', password='pass123')
+        self.client.force_authenticate(user=user)
+
+        self.client.get('/api/orders/cart/')
+        self.assertEqual(self.client.get('/api/orders/cart/')['X-Cache'], 'HIT')
+
+        product = Product.objects.get()
+        self.client.post(
+            '/api/orders/cart/add_item/', {'product_id': product.id, 'quantity': 1}, format='json'
+        )
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['item_count'], 1)
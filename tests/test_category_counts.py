@@ -0,0 +1,70 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+
+
+class CategoryCountTests(TestCase):
+    """Test cases for the maintained Category.products_count column"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+    
+    def _make_product(self, category, name='Item'):
+        return Product.objects.create(
+            name=name, description='Test', price=10, stock=1, category=category
+        )
+    
+    def test_counter_follows_create_move_and_delete(self):
+        """Test product writes keep the counters up to date"""
+        product = self._make_product(self.books)
+        self._make_product(self.books)
+        self.books.refresh_from_db()
+        self.assertEqual(self.books.products_count, 2)
+        
+        product.category = self.games
+        product.save()
+        self.books.refresh_from_db()
+        self.games.refresh_from_db()
+        self.assertEqual((self.books.products_count, self.games.products_count), (1, 1))
+        
+        Product.objects.filter(category=self.books).delete()
+        self.books.refresh_from_db()
+        self.assertEqual(self.books.products_count, 0)
+    
+    def test_category_list_query_count_is_constant(self):
+        """Test listing categories does not issue one query per category"""
+        def count_queries():
+            cache.clear()
+            local_cache.clear_all()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/api/products/categories/')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+        
+        baseline = count_queries()
+        for i in range(20):
+            category = Category.objects.create(name=f'Extra {i}')
+            self._make_product(category)
+        self.assertEqual(count_queries(), baseline)
+        self.assertEqual(baseline, 1)
+    
+    def test_rebuild_command(self):
+        """Test the management command fixes drifted counters"""
+        self._make_product(self.books)
+        Category.objects.update(products_count=42)
+        
+        call_command('rebuild_category_counts', stdout=StringIO())
+        
+        self.books.refresh_from_db()
+        self.games.refresh_from_db()
+        self.assertEqual((self.books.products_count, self.games.products_count), (1, 0))
@@ -0,0 +1,161 @@
+import threading
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from orders.checkout import OutOfStock, take_stock
+from orders.models import Cart, CartItem, Order
+from products.models import Category, LowStockEvent, Product
+
+ORDER = {'shipping_address': '123 Test Street, Test City, 12345', 'phone_number': '+1234567890'}
+
+
+class CheckoutTests(TestCase):
+    """Test cases for the conditional stock update checkout"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}', description='Test', price=Decimal('10.50') + i, stock=20,
+                category=self.category
+            )
+            for i in range(6)
+        ]
+
+    def _user_with_cart(self, name, products, quantity=2):
+        user = User.objects.create_user(username=name, password='pass123')
+        cart = Cart.objects.create(user=user)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return user
+
+    def _checkout(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/orders/', ORDER, format='json')
+
+    def test_places_order(self):
+        """Test stock, items, total and the emptied cart"""
+        user = self._user_with_cart('buyer', self.products[:2], quantity=3)
+        response = self._checkout(user)
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(user=user)
+        self.assertEqual(order.total_price, Decimal('3') * (Decimal('10.50') + Decimal('11.50')))
+        self.assertEqual(response.json()['order']['total_price'], str(order.total_price))
+        self.assertEqual(
+            sorted((item['product_name'], item['quantity']) for item in response.json()['order']['items']),
+            [('Book 0', 3), ('Book 1', 3)],
+        )
+        self.assertEqual(list(Product.objects.filter(pk__in=[p.id for p in self.products[:2]])
+                              .values_list('stock', flat=True)), [17, 17])
+        self.assertFalse(CartItem.objects.filter(cart__user=user).exists())
+
+    def test_query_count_does_not_grow(self):
+        """Test a six line cart costs the same statements as a one line cart"""
+        counts = []
+        for name, products in (('small', self.products[:1]), ('large', self.products)):
+            user = self._user_with_cart(name, products)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._checkout(user).status_code, 201)
+            counts.append(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_short_line_rolls_back(self):
+        """Test one short product rejects the order without touching any stock"""
+        user = self._user_with_cart('buyer', self.products[:2], quantity=5)
+        Product.objects.filter(pk=self.products[1].id).update(stock=4)
+
+        response = self._checkout(user)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Book 1 is out of stock')
+        self.assertEqual(Product.objects.get(pk=self.products[0].id).stock, 20)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart__user=user).count(), 2)
+
+    def test_low_stock_and_cached_pages(self):
+        """Test the low stock flag follows and cached product pages show the new stock"""
+        product = self.products[0]
+        self.assertEqual(self.client.get(f'/api/products/{product.id}/').json()['stock'], 20)
+
+        user = self._user_with_cart('buyer', [product], quantity=15)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._checkout(user)
+
+        product.refresh_from_db()
+        self.assertTrue(product.is_low_stock)
+        self.assertEqual(LowStockEvent.objects.get().stock, 5)
+        self.assertEqual(self.client.get(f'/api/products/{product.id}/').json()['stock'], 5)
+
+    def test_sold_out_refreshes_listings(self):
+        """Test cached listings and facets drop a product sold out at checkout"""
+        product = self.products[0]
+        self.client.get('/api/products/?in_stock=false')
+        self.client.get('/api/products/facets/')
+        etag = self.client.get('/api/products/')['ETag']
+
+        user = self._user_with_cart('buyer', [product], quantity=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._checkout(user).status_code, 201)
+
+        response = self.client.get('/api/products/?in_stock=false')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([p['id'] for p in response.json()['results']], [product.id])
+        response = self.client.get('/api/products/facets/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['stock']['out_of_stock'], 1)
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_negative_stock_rejected(self):
+        """Test the database refuses negative stock"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.products[0].id).update(stock=-1)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Test cases for checkouts racing for the same stock"""
+
+    def test_no_oversell(self):
+        """Test concurrent stock takes never go past the stock"""
+        category = Category.objects.create(name='Books')
+        product = Product.objects.create(name='Hot', description='x', price=5, stock=10, category=category)
+        other = Product.objects.create(name='Other', description='x', price=5, stock=100, category=category)
+
+        results = []
+        start = threading.Barrier(25)
+
+        def checkout():
+            start.wait()
+            try:
+                while True:
+                    try:
+                        with transaction.atomic():
+                            take_stock({product.id: 1, other.id: 2})
+                        results.append('taken')
+                        return
+                    except OutOfStock:
+                        results.append('short')
+                        return
+                    except OperationalError:
+                        pass  # SQLite lets one writer in at a time and the transaction rolled back
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=checkout) for _ in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ['short'] * 15 + ['taken'] * 10)
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(other.stock, 100 - 2 * 10)
@@ -0,0 +1,73 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from ecommerce_backend.compiled_serializers import CompiledSerializerMixin
+from products.models import Category, Product
+from products.serializers import ProductSerializer
+from orders.models import Cart, CartItem, Order, OrderItem
+from orders.serializers import CartItemSerializer, OrderItemSerializer, OrderSerializer
+
+
+class CompiledSerializerTests(TestCase):
+    """Test cases for the compiled serializer plans"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='buyer', password='pass123')
+        category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=name, description='Line one\nline "two"', price=price, stock=stock,
+                category=category, low_stock_threshold=threshold
+            )
+            for name, price, stock, threshold in (
+                ('Novel', Decimal('10'), 5, None),
+                ('Atlas', Decimal('1234.5'), 0, 3),
+                ('Ünïcode ✓', Decimal('0.01'), 100, None),
+            )
+        ]
+        order = Order.objects.create(
+            user=user, shipping_address='Somewhere 12345', phone_number='1', total_price=Decimal('21.5')
+        )
+        for product in self.products:
+            OrderItem.objects.create(order=order, product=product, quantity=3, price=product.price)
+        Order.objects.create(user=user, shipping_address='Elsewhere 12345', phone_number='2')
+        cart = Cart.objects.create(user=user)
+        for product in self.products[:2]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def _assert_identical(self, serializer_class, instances):
+        instances = list(instances)
+        compiled = JSONRenderer().render(serializer_class(instances, many=True).data)
+        with mock.patch.object(CompiledSerializerMixin, 'compiled', False):
+            plain = JSONRenderer().render(serializer_class(instances, many=True).data)
+        self.assertEqual(compiled, plain)
+        return compiled
+
+    def test_byte_identical_output(self):
+        """Test every opted in serializer renders exactly what DRF renders"""
+        self._assert_identical(ProductSerializer, Product.objects.select_related('category'))
+        self._assert_identical(OrderItemSerializer, OrderItem.objects.select_related('product'))
+        self._assert_identical(CartItemSerializer, CartItem.objects.select_related('product__category'))
+        body = self._assert_identical(
+            OrderSerializer, Order.objects.select_related('user').prefetch_related('items__product')
+        )
+        self.assertIn(b'"total_price":"21.50"', body)
+
+    def test_values_rows(self):
+        """Test a plan gives the same output for values() rows as for instances"""
+        plan = ProductSerializer().plan
+        self.assertIn('category__name', plan.values_fields)
+
+        rows = (
+            Product.objects.order_by('id')
+            .annotate(in_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()))
+            .values(*plan.values_fields)
+        )
+        instances = Product.objects.select_related('category').order_by('id')
+        self.assertEqual(
+            JSONRenderer().render([plan(row) for row in rows]),
+            JSONRenderer().render(ProductSerializer(instances, many=True).data),
+        )
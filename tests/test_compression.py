@@ -0,0 +1,94 @@
+import gzip
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from products.models import Category, Product
+
+GZIP = {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+
+
+class CompressionTests(TestCase):
+    """Test cases for negotiated response compression"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.category = Category.objects.create(name='Books')
+        for i in range(10):
+            Product.objects.create(
+                name=f'Book {i}', description='Same old description ' * 10, price=10,
+                stock=i, category=self.category
+            )
+
+    def test_cached_entry_sent_compressed(self):
+        """Test the miss and later hits send the stored gzip body without recompressing"""
+        plain = self.client.get('/api/products/?ordering=price')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        for state in ('HIT', 'HIT'):
+            response = self.client.get('/api/products/?ordering=price', **GZIP)
+            self.assertEqual(response['X-Cache'], state)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(int(response['Content-Length']), len(response.content))
+            self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        counters = metrics.snapshot()['compression:product-list']
+        self.assertEqual(counters['compressed'], 1)
+        self.assertEqual(counters['served'], 2)
+
+        response = self.client.get('/api/products/', **GZIP)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_negotiation(self):
+        """Test gzip is only sent to clients that accept it"""
+        for header in ('identity', 'gzip;q=0', 'br'):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+        for header in ('*', 'br;q=1.0, gzip;q=0.5'):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response['Content-Encoding'], 'gzip', header)
+
+    def test_small_responses_plain(self):
+        """Test bodies below the threshold are never compressed"""
+        url = f'/api/products/{Product.objects.first().id}/'
+        response = self.client.get(url, **GZIP)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        with override_settings(COMPRESSION={'MIN_SIZE': 10, 'LEVEL': 6}):
+            cache.clear()
+            local_cache.clear_all()
+            response = self.client.get(url, **GZIP)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_weak_etag_revalidates(self):
+        """Test gzipped responses carry a weak ETag that still gives a 304"""
+        product = Product.objects.first()
+        with override_settings(COMPRESSION={'MIN_SIZE': 10, 'LEVEL': 6}):
+            response = self.client.get(f'/api/products/{product.id}/', **GZIP)
+            etag = response['ETag']
+            self.assertTrue(etag.startswith('W/"'))
+
+            response = self.client.get(f'/api/products/{product.id}/', HTTP_IF_NONE_MATCH=etag, **GZIP)
+        self.assertEqual(response.status_code, 304)
+
+    def test_uncached_responses_compressed(self):
+        """Test the middleware compresses responses outside the cache and reports them"""
+        self.client.force_authenticate(user=self.admin)
+        with override_settings(COMPRESSION={'MIN_SIZE': 10, 'LEVEL': 6}):
+            response = self.client.get('/api/products/low_stock/', **GZIP)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('results', gzip.decompress(response.content).decode())
+
+        counters = self.client.get('/api/metrics/').json()['compression:product-low-stock']
+        self.assertEqual(counters['served'], 1)
+        self.assertLess(counters['ratio'], 1)
+        self.assertIsNotNone(counters['avg_compress_ms'])
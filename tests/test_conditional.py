@@ -0,0 +1,116 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products import reservations
+from products.models import Category, Product
+from orders.models import Order, OrderItem
+
+
+class ConditionalGetTests(TestCase):
+    """Test cases for ETag / Last-Modified support"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='Test', price=10, stock=5, category=self.category
+        )
+    
+    def test_product_list_not_modified(self):
+        """Test a matching If-None-Match gets a bodyless 304 until a write"""
+        first = self.client.get('/api/products/')
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        
+        # Another query string is another representation
+        other = self.client.get('/api/products/?ordering=price', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(other.status_code, 200)
+        
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(f'/api/products/{self.product.id}/', {'price': 12}, format='json')
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+    
+    def test_product_detail_watermark(self):
+        """Test detail ETags follow updated_at, also for writes outside the API"""
+        url = f'/api/products/{self.product.id}/'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304
+        )
+        
+        self.product.stock = 4
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+    
+    def test_list_etag_follows_stock_writers(self):
+        """Test stock written outside the product API changes the list ETags too"""
+        Product.objects.filter(pk=self.product.pk).update(flash_sale=True)
+        reservations.load([self.product.id])
+        self.assertEqual(reservations.sell(1, {self.product.id: 2}), [])
+        urls = ['/api/products/', f'/api/products/?category={self.category.id}', '/api/products/facets/']
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        
+        reservations.reconcile()
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+    
+    def test_category_list(self):
+        """Test category renames change the category list ETag"""
+        first = self.client.get('/api/products/categories/')
+        self.assertEqual(
+            self.client.get('/api/products/categories/', HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+            304
+        )
+        
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(f'/api/products/categories/{self.category.id}/', {'name': 'Novels'}, format='json')
+        response = self.client.get('/api/products/categories/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+    
+    def test_order_etag_scoped_per_user(self):
+        """Test order ETags differ per user and status updates change them"""
+        buyer = User.objects.create_user(username='buyer', password='pass123')
+        order = Order.objects.create(user=buyer, shipping_address='Somewhere 12345', phone_number='1')
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=10)
+        url = f'/api/orders/{order.id}/'
+        
+        self.client.force_authenticate(user=buyer)
+        mine = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag']).status_code, 304)
+        
+        self.client.force_authenticate(user=self.admin)
+        staff = self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag'])
+        self.assertEqual(staff.status_code, 200)
+        self.assertNotEqual(staff['ETag'], mine['ETag'])
+        
+        self.client.patch(f'{url}update_status/', {'status': 'shipped'}, format='json')
+        self.client.force_authenticate(user=buyer)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag']).status_code, 200)
+        
+        # Other users' orders stay a 404 without validators
+        other = User.objects.create_user(username='other', password='pass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag'])
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+from orders.models import Order, OrderItem
+
+
+class ExportTests(TestCase):
+    """Test cases for the streaming catalog and order exports"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.user = User.objects.create_user(username='buyer', password='pass123')
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}', description='Line one, "quoted"\nline two',
+                price=10 + i, stock=i, category=self.category
+            )
+            for i in range(3)
+        ]
+        self.order = Order.objects.create(
+            user=self.user, shipping_address='Somewhere 12345', phone_number='1',
+            total_price=21
+        )
+        for product in self.products[:2]:
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, price=product.price)
+        Order.objects.create(user=self.user, shipping_address='Somewhere 12345', phone_number='1')
+
+    def _get(self, url):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_export_admin_only(self):
+        """Test regular users cannot export"""
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 403)
+
+    def test_product_ndjson(self):
+        """Test each product is one JSON line with the serializer's values"""
+        response, body = self._get('/api/products/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['name'] for record in records], ['Book 0', 'Book 1', 'Book 2'])
+        self.assertEqual(records[1]['price'], '11.00')
+        self.assertEqual(records[1]['category_name'], 'Books')
+
+    def test_product_csv_with_date_range(self):
+        """Test CSV output and the updated_at range filter"""
+        Product.objects.filter(pk=self.products[0].pk).update(
+            updated_at=timezone.now() - timedelta(days=10)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response, body = self._get(f'/api/products/export/?output=csv&updated_after={since}')
+
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['name'] for row in rows], ['Book 1', 'Book 2'])
+        self.assertEqual(rows[0]['description'], 'Line one, "quoted"\nline two')
+
+    def test_invalid_params(self):
+        """Test bad output and date values are rejected"""
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/api/products/export/?output=xml').status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/orders/export/?created_after=yesterday').status_code, 400
+        )
+
+    def test_order_export(self):
+        """Test orders carry their items (NDJSON) or one line per item (CSV)"""
+        _, body = self._get('/api/orders/export/')
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([len(record['items']) for record in records], [2, 0])
+        self.assertEqual(records[0]['items'][1]['product_name'], 'Book 1')
+        self.assertEqual(records[0]['user_name'], 'buyer')
+
+        _, body = self._get('/api/orders/export/?output=csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['id'] for row in rows], [str(self.order.id)] * 2 + [str(self.order.id + 1)])
+        self.assertEqual(rows[2]['item_product'], '')
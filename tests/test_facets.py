@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+
+
+class FacetTests(TestCase):
+    """Test cases for the product facet counts endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+        for price, stock, category in [
+            (10, 1, self.books), (30, 0, self.books), (30, 2, self.books),
+            (60, 5, self.games), (2000, 0, self.games),
+        ]:
+            Product.objects.create(
+                name=f'Item {price}', description='Test', price=price, stock=stock, category=category
+            )
+    
+    def test_counts_in_one_query(self):
+        """Test every facet is computed by a single aggregate query"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        
+        data = response.json()
+        self.assertEqual(data['total'], 5)
+        self.assertEqual(
+            [(c['name'], c['count']) for c in data['categories']], [('Books', 3), ('Games', 2)]
+        )
+        self.assertEqual([b['count'] for b in data['price_buckets']], [1, 2, 1, 0, 0, 0, 1])
+        self.assertIsNone(data['price_buckets'][-1]['max'])
+        self.assertEqual(data['stock'], {'in_stock': 3, 'out_of_stock': 2})
+    
+    def test_counts_follow_filters(self):
+        """Test the list filters narrow the facets, custom buckets apply"""
+        response = self.client.get(
+            f'/api/products/facets/?category={self.books.id}&in_stock=true&price_buckets=0,20'
+        )
+        data = response.json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([b['count'] for b in data['price_buckets']], [1, 1])
+        
+        response = self.client.get('/api/products/facets/?search=item&max_price=50')
+        self.assertEqual(response.json()['total'], 3)
+        
+        self.assertEqual(self.client.get('/api/products/facets/?price_buckets=a,b').status_code, 400)
+    
+    def test_cached_until_product_write(self):
+        """Test facets are cached and dropped like the list"""
+        self.client.get('/api/products/facets/')
+        self.assertEqual(self.client.get('/api/products/facets/')['X-Cache'], 'HIT')
+        
+        admin = User.objects.create_superuser(username='admin', email='a@test.com', password='x')
+        self.client.force_authenticate(user=admin)
+        self.client.post('/api/products/', {
+            'name': 'New', 'description': 'Test', 'price': 5, 'stock': 1, 'category': self.games.id
+        }, format='json')
+        
+        response = self.client.get('/api/products/facets/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['total'], 6)
+        
+        # Category names come along
+        self.client.patch(f'/api/products/categories/{self.games.id}/', {'name': 'Toys'}, format='json')
+        names = {c['name'] for c in self.client.get('/api/products/facets/').json()['categories']}
+        self.assertEqual(names, {'Books', 'Toys'})
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from ecommerce_backend.cache_tags import ALL_PRODUCTS, invalidate_tags
+from products.models import Category, Product
+from products.serializers import ProductSerializer
+
+
+class ProductFragmentTests(TestCase):
+    """Test cases for list assembly from per-product fragments"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Books')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Book {i}', description='Ünïcode   text', price=9.99 + i,
+                stock=i, category=self.category
+            )
+    
+    def test_output_matches_serializer(self):
+        """Test spliced bytes equal a plain ProductSerializer render"""
+        response = self.client.get('/api/products/')
+        
+        products = Product.objects.select_related('category').order_by('-created_at', '-id')
+        expected = JSONRenderer().render({
+            'next': None,
+            'previous': None,
+            'results': ProductSerializer(products, many=True).data,
+        })
+        self.assertEqual(response.content, expected)
+    
+    def test_cached_fragments_skip_serialization(self):
+        """Test a new filter combination reuses fragments with a single id query"""
+        self.client.get('/api/products/')
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/?ordering=price')
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+        self.assertEqual(metrics.snapshot()['fragments:product_fragment']['hits'], 5)
+    
+    def test_category_rename_refreshes_fragments(self):
+        """Test renaming a category shows up in listed products"""
+        self.client.get('/api/products/')
+        
+        self.category.name = 'Novels'
+        self.category.save()
+        invalidate_tags([ALL_PRODUCTS])
+        
+        response = self.client.get('/api/products/')
+        names = {product['category_name'] for product in response.json()['results']}
+        self.assertEqual(names, {'Novels'})
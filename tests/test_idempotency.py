@@ -0,0 +1,126 @@
+import threading
+import time
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from ecommerce_backend.idempotency import storage_key
+from orders.models import Cart, CartItem, Order
+from products.models import Category, Product
+
+ORDER = {'shipping_address': '123 Test Street, Test City, 12345', 'phone_number': '+1234567890'}
+
+
+class IdempotencyTests(TestCase):
+    """Test cases for Idempotency-Key replays"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.user = User.objects.create_user(username='buyer', password='pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Book', description='Test', price='12.00', stock=10, category=category
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+
+    def _checkout(self, key, data=ORDER):
+        return self.client.post('/api/orders/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_checkout_is_replayed(self):
+        """Test a retry gets the first response without touching the order tables"""
+        first = self._checkout('checkout-1')
+        self.assertEqual(first.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self._checkout('checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'orders_' in q['sql']])
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+        self.assertEqual(metrics.snapshot()['idempotency:order']['replays'], 1)
+
+    def test_without_key(self):
+        """Test requests without a key run every time"""
+        self.assertEqual(self.client.post('/api/orders/', ORDER, format='json').status_code, 201)
+        response = self.client.post('/api/orders/', ORDER, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_key_reused_for_other_request(self):
+        """Test a key sent with a different body is refused"""
+        self._checkout('checkout-1')
+        response = self._checkout('checkout-1', dict(ORDER, phone_number='+1999999999'))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        """Test another user's key doesn't replay someone else's order"""
+        self._checkout('checkout-1')
+        other = User.objects.create_user(username='other', password='pass123')
+        Cart.objects.create(user=other)
+        self.client.force_authenticate(user=other)
+        response = self._checkout('checkout-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_cart_mutation(self):
+        """Test a retried add_item only adds once"""
+        for _ in range(2):
+            response = self.client.post(
+                '/api/orders/cart/add_item/', {'product_id': self.product.id, 'quantity': 3},
+                format='json', HTTP_IDEMPOTENCY_KEY='add-1',
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_duplicate_waits_for_first(self):
+        """Test a duplicate arriving mid request gets the first response"""
+        first = self._checkout('first')
+        storage = storage_key('order:create', self.user.id, 'checkout-1')
+        lock = get_redis_connection('default').lock(
+            cache.make_key(f'lock:{storage}'), timeout=10, thread_local=False
+        )
+        lock.acquire()
+
+        def finish_first():
+            # What the request holding the key does when it's done
+            time.sleep(0.2)
+            cache.set(storage, cache.get(storage_key('order:create', self.user.id, 'first')))
+            lock.release()
+
+        thread = threading.Thread(target=finish_first)
+        thread.start()
+        retry = self._checkout('checkout-1')
+        thread.join()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(metrics.snapshot()['idempotency:order']['waits'], 1)
+
+    @override_settings(IDEMPOTENCY={'TTL': 60, 'LOCK_TIMEOUT': 10, 'WAIT': 0.2})
+    def test_duplicate_in_progress(self):
+        """Test a duplicate gives up with a 409 while the first request still runs"""
+        storage = storage_key('order:create', self.user.id, 'checkout-1')
+        lock = get_redis_connection('default').lock(cache.make_key(f'lock:{storage}'), timeout=10)
+        lock.acquire()
+        try:
+            response = self._checkout('checkout-1')
+        finally:
+            lock.release()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(metrics.snapshot()['idempotency:order']['waits'], 1)
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from orders.models import Cart, CartItem
+from products import reservations
+from products.importer import import_catalog
+from products.models import Category, Product
+
+
+class CatalogImportTests(TestCase):
+    """Test cases for the bulk catalog import"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.books = Category.objects.create(name='Books')
+
+    def test_csv_upsert_with_row_errors(self):
+        """Test rows are created/updated in chunks and bad rows are reported"""
+        existing = Product.objects.create(
+            name='Old', description='Old', price=5, stock=1, category=self.books
+        )
+        old_updated_at = existing.updated_at
+        data = (
+            'id,name,description,price,stock,category\n'
+            f'{existing.id},Novel,Updated,12.50,3,Fiction\n'
+            ',Atlas,Maps,30,2,Books\n'
+            ',Broken,Bad price,-1,2,Books\n'
+            ',Poster,Art,9.99,,Decor\n'
+            '999999,Ghost,Missing,1,1,Books\n'
+        )
+        result = import_catalog(BytesIO(data.encode()), 'csv', chunk_size=2)
+
+        self.assertEqual((result.created, result.updated, result.failed), (2, 1, 2))
+        self.assertEqual([error['row'] for error in result.errors], [4, 6])
+        self.assertIn('price', result.errors[0]['errors'])
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, 'Novel')
+        self.assertEqual(existing.category.name, 'Fiction')
+        self.assertGreater(existing.updated_at, old_updated_at)
+
+        # Counters follow the bulk writes
+        counts = dict(Category.objects.values_list('name', 'products_count'))
+        self.assertEqual(counts, {'Books': 1, 'Fiction': 1, 'Decor': 1})
+
+    def test_import_invalidates_cached_listings(self):
+        """Test a single import drops the cached product list"""
+        self.assertEqual(len(self.client.get('/api/products/').json()['results']), 0)
+
+        data = '\n'.join(json.dumps({
+            'name': f'Book {i}', 'description': 'Test', 'price': 10, 'stock': 1,
+            'category': 'Books',
+        }) for i in range(3))
+        import_catalog(BytesIO(data.encode()), 'ndjson')
+
+        self.assertEqual(len(self.client.get('/api/products/').json()['results']), 3)
+
+    def test_import_reprice_drops_cached_carts(self):
+        """Test repriced products don't leave carts holding them cached"""
+        product = Product.objects.create(
+            name='Novel', description='x', price=10, stock=5, category=self.books
+        )
+        buyer = User.objects.create_user(username='buyer', password='pass123')
+        CartItem.objects.create(cart=Cart.objects.create(user=buyer), product=product, quantity=1)
+        self.client.force_authenticate(user=buyer)
+        self.client.get('/api/orders/cart/')
+
+        data = json.dumps({
+            'id': product.id, 'name': 'Novel', 'description': 'x', 'price': 12, 'stock': 5,
+            'category': 'Books',
+        })
+        import_catalog(BytesIO(data.encode()), 'ndjson')
+
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['cart_items'][0]['product']['price'], '12.00')
+
+    def test_import_rebases_flash_sale_counters(self):
+        """Test imported stock resets the Redis counters of flash sale products"""
+        product = Product.objects.create(
+            name='Hot', description='x', price=5, stock=5, category=self.books, flash_sale=True
+        )
+        reservations.load([product.id])
+        self.assertEqual(reservations.reserve(product.id, 1, 2), (True, 3))
+
+        data = json.dumps({
+            'id': product.id, 'name': 'Hot', 'description': 'x', 'price': 5, 'stock': 20,
+            'category': 'Books',
+        })
+        import_catalog(BytesIO(data.encode()), 'ndjson')
+
+        # The hold is kept
+        self.assertEqual(reservations.reserve(product.id, 2, 18), (True, 0))
+
+    def test_import_endpoint_admin_only(self):
+        """Test the upload endpoint imports categories for admins only"""
+        upload = SimpleUploadedFile('categories.csv', b'name,description\nToys,Fun\nBooks,Reading\n')
+        response = self.client.post('/api/products/import/', {'file': upload, 'kind': 'categories'})
+        self.assertEqual(response.status_code, 401)
+
+        self.client.force_authenticate(user=self.admin)
+        upload.seek(0)
+        response = self.client.post('/api/products/import/', {'file': upload, 'kind': 'categories'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(Category.objects.get(name='Books').description, 'Reading')
+
+    def test_command(self):
+        """Test the management command reads a file"""
+        path = self._write_file(
+            'catalog.ndjson',
+            '{"name": "Atlas", "description": "Maps", "price": "30", "category": "Books"}\n'
+            'not json\n'
+        )
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=err)
+        self.assertIn('Created 1, updated 0, failed 1', out.getvalue())
+        self.assertIn('Row 2', err.getvalue())
+
+    def _write_file(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
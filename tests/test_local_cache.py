@@ -0,0 +1,132 @@
+import json
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from ecommerce_backend.cache_tags import product_tag
+from ecommerce_backend.local_cache import LocalCache, get_broadcast
+from products.models import Category, Product
+
+IN_PROCESS = {
+    'MAX_ENTRIES': 100, 'TTL': 60, 'BROADCAST': 'ecommerce_backend.local_cache.InProcessBroadcast',
+}
+
+
+@override_settings(LOCAL_CACHE=dict(IN_PROCESS, MAX_ENTRIES=2))
+class LocalCacheTests(TestCase):
+    """Test cases for the per process LRU"""
+
+    def setUp(self):
+        self.local = LocalCache('test')
+        self.addCleanup(local_cache._caches.remove, self.local)
+
+    def test_lru_eviction_and_ttl(self):
+        """Test the least recently used entry is evicted and expired ones are gone"""
+        self.local.set('a', 1, ['t:a'], self.local.generation)
+        self.local.set('b', 2, ['t:b'], self.local.generation)
+        self.assertEqual(self.local.get('a'), 1)
+        self.local.set('c', 3, ['t:c'], self.local.generation)
+        self.assertIsNone(self.local.get('b'))
+        self.assertEqual(len(self.local), 2)
+
+        self.local.set('d', 4, [], self.local.generation, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.local.get('d'))
+
+    def test_invalidation_drops_tags_and_racing_writes(self):
+        """Test invalidating a tag drops its entries and values read before it"""
+        self.local.set('a', 1, ['t:a', 't:shared'], self.local.generation)
+        generation = self.local.generation
+        local_cache.invalidate(['t:shared'])
+        self.assertIsNone(self.local.get('a'))
+
+        # Read from Redis before the invalidation, must not be stored after it
+        self.assertFalse(self.local.set('a', 1, ['t:a'], generation))
+        self.assertIsNone(self.local.get('a'))
+
+
+@override_settings(LOCAL_CACHE=IN_PROCESS)
+class LocalTierApiTests(TestCase):
+    """Test cases for product and category responses served from process memory"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='Test', price=10, stock=5, category=self.category
+        )
+        self.url = f'/api/products/{self.product.id}/'
+
+    def test_hot_entry_skips_redis(self):
+        """Test a local hit needs neither the entry nor the tag versions from Redis"""
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with mock.patch('ecommerce_backend.caching.tag_versions', side_effect=AssertionError), \
+                mock.patch.object(cache, 'get', side_effect=AssertionError):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, first.content)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_write_drops_local_entry(self):
+        """Test an API write is visible right away"""
+        self.client.get(self.url)
+        admin = User.objects.create_superuser(username='admin', email='a@test.com', password='x')
+        self.client.force_authenticate(user=admin)
+        self.client.patch(self.url, {'name': 'Renamed'}, format='json')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'Renamed')
+
+    def test_broadcast_from_other_worker(self):
+        """Test an invalidation published by another worker drops the local entry"""
+        self.client.get(self.url)
+        self.assertEqual(len(local_cache.responses), 2)  # the response and its tag versions
+
+        get_broadcast().publish([product_tag(self.product.id)])
+        self.assertEqual(len(local_cache.responses), 0)
+
+    def test_hit_ratio_per_tier(self):
+        """Test the metrics endpoint reports hit ratios of both tiers"""
+        self.client.get(self.url)  # miss in both tiers
+        self.client.get(self.url)  # local hit
+        local_cache.clear_all()
+        self.client.get(self.url)  # Redis hit
+
+        admin = User.objects.create_superuser(username='admin', email='a@test.com', password='x')
+        self.client.force_authenticate(user=admin)
+        ratios = self.client.get('/api/metrics/').json()['cache:product']['hit_ratio']
+        self.assertEqual(ratios, {'local': 0.3333, 'redis': 0.5, 'overall': 0.6667})
+
+
+@override_settings(LOCAL_CACHE=dict(IN_PROCESS, BROADCAST='ecommerce_backend.local_cache.RedisBroadcast'))
+class RedisBroadcastTests(TestCase):
+    """Test cases for invalidations delivered over Redis pub/sub"""
+
+    def test_listener_drops_published_tags(self):
+        """Test the listener thread applies what other workers publish"""
+        local = LocalCache('pubsub')
+        self.addCleanup(local_cache._caches.remove, local)
+        broadcast = get_broadcast()
+
+        # The listener clears everything once it is subscribed
+        deadline = time.monotonic() + 5
+        while get_redis_connection('default').pubsub_numsub(broadcast.channel)[0][1] == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+        local.set('a', 1, ['t:a'], local.generation)
+        get_redis_connection('default').publish(broadcast.channel, json.dumps(['t:a']))
+        while local.get('a') is not None:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
@@ -0,0 +1,97 @@
+from io import BytesIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.importer import import_catalog
+from products.models import Category, LowStockEvent, Product
+from orders.models import Cart, CartItem
+
+
+class LowStockTests(TestCase):
+    """Test cases for the maintained low stock list and its change feed"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='Tools')
+        self.hammer = Product.objects.create(
+            name='Hammer', description='Test', price=10, stock=50, category=self.category
+        )
+        self.saw = Product.objects.create(
+            name='Saw', description='Test', price=20, stock=5, category=self.category
+        )
+    
+    def _low_names(self):
+        response = self.client.get('/api/products/low_stock/')
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+    
+    def test_flag_follows_stock_and_thresholds(self):
+        """Test stock updates, product and category thresholds move products in and out"""
+        self.assertEqual(self._low_names(), ['Saw'])
+        
+        self.hammer.stock = 3
+        self.hammer.save()
+        self.assertEqual(self._low_names(), ['Hammer', 'Saw'])
+        
+        # Per product override
+        self.saw.low_stock_threshold = 2
+        self.saw.save()
+        self.assertEqual(self._low_names(), ['Hammer'])
+        
+        # Category threshold applies to products without an override
+        self.category.low_stock_threshold = 2
+        self.category.save()
+        self.assertEqual(self._low_names(), [])
+        
+        # Out of stock is not "low" (same as before)
+        self.hammer.stock = 0
+        self.hammer.save()
+        self.assertEqual(self._low_names(), [])
+    
+    def test_unrelated_save_costs_no_sync(self):
+        """Test saving a product without stock changes skips the low stock queries"""
+        product = Product.objects.get(pk=self.hammer.pk)
+        product.name = 'Claw hammer'
+        with CaptureQueriesContext(connection) as ctx:
+            product.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+    
+    def test_checkout_records_events(self):
+        """Test an order pushing stock below the threshold shows up in the feed"""
+        last_id = self.client.get('/api/products/low_stock/events/').data['last_id']
+        
+        user = User.objects.create_user(username='buyer', password='pass123')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.hammer, quantity=45)
+        CartItem.objects.create(cart=cart, product=self.saw, quantity=5)
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/api/orders/', {
+            'shipping_address': '123 Test Street, Test City', 'phone_number': '1234567890'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(f'/api/products/low_stock/events/?after={last_id}')
+        events = [(e['product_name'], e['is_low_stock'], e['stock']) for e in response.data['events']]
+        self.assertEqual(events, [('Hammer', True, 5), ('Saw', False, 0)])
+        
+        # Nothing new after the last id
+        response = self.client.get(f"/api/products/low_stock/events/?after={response.data['last_id']}")
+        self.assertEqual(response.data['events'], [])
+    
+    def test_import_syncs_flags(self):
+        """Test bulk imports keep the low stock list up to date"""
+        data = f'id,name,description,price,stock,category\n{self.hammer.id},Hammer,Test,10,1,Tools\n'
+        import_catalog(BytesIO(data.encode()), 'csv')
+        self.assertEqual(self._low_names(), ['Hammer', 'Saw'])
+        self.assertTrue(LowStockEvent.objects.filter(product=self.hammer, is_low_stock=True).exists())
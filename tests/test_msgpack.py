@@ -0,0 +1,77 @@
+import datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from ecommerce_backend.messagepack import MEDIA_TYPE, MessagePackRenderer, packb, unpackb
+from products.models import Category, Product
+
+
+class MessagePackTests(TestCase):
+    """Test cases for the MessagePack wire format"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='Ünïcode', price=Decimal('12.50'), stock=3, category=self.category
+        )
+
+    def test_negotiated_response(self):
+        """Test Accept: application/msgpack gets the same data as JSON"""
+        for url in ('/api/products/', f'/api/products/{self.product.id}/', '/api/products/categories/'):
+            expected = self.client.get(url).json()
+            response = self.client.get(url, HTTP_ACCEPT=MEDIA_TYPE)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], MEDIA_TYPE)
+            self.assertEqual(unpackb(response.content), expected)
+
+        response = self.client.get('/api/products/?format=msgpack')
+        self.assertEqual(response['Content-Type'], MEDIA_TYPE)
+
+    def test_cached_per_media_type(self):
+        """Test JSON and MessagePack responses are cached separately"""
+        self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT=MEDIA_TYPE)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        response = self.client.get('/api/products/', HTTP_ACCEPT=MEDIA_TYPE)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['Content-Type'], MEDIA_TYPE)
+        self.assertEqual(unpackb(response.content)['results'][0]['price'], '12.50')
+
+    def test_request_body(self):
+        """Test MessagePack bodies are parsed, malformed ones are a 400"""
+        self.client.force_authenticate(user=self.admin)
+        body = packb({
+            'name': 'Atlas', 'description': 'Maps', 'price': Decimal('30.00'),
+            'stock': 4, 'category': self.category.id,
+        })
+        response = self.client.post('/api/products/', body, content_type=MEDIA_TYPE, HTTP_ACCEPT=MEDIA_TYPE)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(unpackb(response.content)['price'], '30.00')
+
+        response = self.client.post('/api/products/', b'\x92\x01', content_type=MEDIA_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+    def test_lossless_values(self):
+        """Test decimals and datetimes survive a round trip exactly"""
+        moment = timezone.now().astimezone(datetime.timezone(datetime.timedelta(hours=5, minutes=30)))
+        data = {
+            'price': Decimal('1234567890.123456789'),
+            'at': moment,
+            'naive': datetime.datetime(2024, 2, 29, 23, 59, 59, 999999),
+            'day': datetime.date(2024, 2, 29),
+        }
+        decoded = unpackb(MessagePackRenderer().render(data))
+        self.assertEqual(decoded, data)
+        self.assertEqual(decoded['at'].utcoffset(), moment.utcoffset())
+        self.assertEqual(str(decoded['price']), '1234567890.123456789')
@@ -0,0 +1,108 @@
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from orders.models import Cart, CartItem, Order, OrderItem
+from products.models import Category, Product
+
+
+class OrderTotalTests(TestCase):
+    """Test cases for the database side order and cart totals"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.user = User.objects.create_user(username='buyer', password='pass123')
+        category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}', description='Test', price=Decimal('2.25') * (i + 1), stock=50,
+                category=category
+            )
+            for i in range(3)
+        ]
+
+    def _order(self, quantities):
+        order = Order.objects.create(user=self.user, shipping_address='Street 1', phone_number='123')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for product, quantity in zip(self.products, quantities)
+        ])
+        return order
+
+    def test_calculate_total(self):
+        """Test the total is one aggregate and the save only writes the total"""
+        order = self._order([1, 2, 3])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(order.calculate_total(), Decimal('31.50'))
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('shipping_address', ctx.captured_queries[1]['sql'])
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal('31.50'))
+
+    def test_recalculate_totals(self):
+        """Test drifted totals are fixed with a fixed number of statements"""
+        good = self._order([1])
+        good.calculate_total()
+        drifted = [self._order([2, 1]), self._order([1, 1, 1])]
+        empty = Order.objects.create(
+            user=self.user, shipping_address='Street 1', phone_number='123', total_price=5,
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            changed = Order.objects.all().recalculate_totals()
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(sorted(changed), sorted([drifted[0].id, drifted[1].id, empty.id]))
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'total_price')),
+            {good.id: Decimal('2.25'), drifted[0].id: Decimal('9.00'),
+             drifted[1].id: Decimal('13.50'), empty.id: Decimal('0')},
+        )
+        self.assertEqual(Order.objects.all().recalculate_totals(), [])
+
+    def test_correct_totals_left_alone(self):
+        """Test totals whose float sum isn't exact aren't reported as fixed"""
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('0.10'))
+        self.products[0].refresh_from_db()
+        orders = [self._order([7]), self._order([3])]
+        Order.objects.filter(pk=orders[0].pk).update(total_price=Decimal('0.70'))
+        Order.objects.filter(pk=orders[1].pk).update(total_price=Decimal('0.30'))
+
+        self.assertEqual(Order.objects.all().recalculate_totals(), [])
+
+        Order.objects.filter(pk=orders[0].pk).update(total_price=Decimal('0.71'))
+        self.assertEqual(Order.objects.all().recalculate_totals(), [orders[0].id])
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).total_price, Decimal('0.70'))
+
+    def test_rebuild_command(self):
+        """Test the management command fixes the totals and the cached order"""
+        order = self._order([2])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.get(f'/api/orders/{order.id}/').json()['total_price'], '0.00')
+
+        call_command('rebuild_order_totals', stdout=StringIO())
+
+        self.assertEqual(client.get(f'/api/orders/{order.id}/').json()['total_price'], '4.50')
+
+    def test_cart_totals(self):
+        """Test the cart total and item count come from one aggregate"""
+        cart = Cart.objects.create(user=self.user)
+        self.assertEqual(cart.totals(), (Decimal('0'), 0))
+        for product, quantity in zip(self.products, [3, 1, 2]):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(cart.totals(), (Decimal('24.75'), 6))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        data = client.get('/api/orders/cart/').json()
+        self.assertEqual((Decimal(str(data['total'])), data['item_count']), (Decimal('24.75'), 6))
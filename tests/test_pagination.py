@@ -0,0 +1,102 @@
+import base64
+import json
+from urllib.parse import parse_qs, urlparse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+from orders.models import Order
+
+
+class KeysetPaginationTests(TestCase):
+    """Test cases for cursor pagination of products and orders"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Test')
+        # Duplicate prices so the id tiebreaker matters
+        for i in range(25):
+            Product.objects.create(
+                name=f'Product {i}', description='Test', price=10 + i % 5,
+                stock=i, category=self.category
+            )
+    
+    def _walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(product['id'] for product in response.json()['results'])
+            url = response.json()['next']
+        return ids, response
+    
+    def test_walks_every_row_once_in_order(self):
+        """Test following next links returns every product once, ordered"""
+        ids, _ = self._walk('/api/products/?ordering=price&page_size=4')
+        expected = list(
+            Product.objects.order_by('price', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+    
+    def test_previous_link_returns_same_page(self):
+        """Test going forward then back yields the original page"""
+        first = self.client.get('/api/products/?page_size=5')
+        second = self.client.get(first.json()['next'])
+        back = self.client.get(second.json()['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.json()['results']],
+            [p['id'] for p in first.json()['results']],
+        )
+        self.assertIsNone(first.json()['previous'])
+    
+    def test_inserts_do_not_shift_pages(self):
+        """Test rows added in front of the cursor don't duplicate results"""
+        first = self.client.get('/api/products/?page_size=10')
+        Product.objects.create(
+            name='Newest', description='Test', price=5, stock=1, category=self.category
+        )
+        cache.clear()
+        local_cache.clear_all()
+        second = self.client.get(first.json()['next'])
+        
+        seen = {p['id'] for p in first.json()['results']}
+        self.assertFalse(seen & {p['id'] for p in second.json()['results']})
+    
+    def test_counts_are_opt_in(self):
+        """Test no count by default, count with ?count=true or ?page="""
+        self.assertNotIn('count', self.client.get('/api/products/').json())
+        self.assertEqual(self.client.get('/api/products/?count=true').json()['count'], 25)
+        self.assertEqual(self.client.get('/api/products/?page=2').json()['count'], 25)
+    
+    def test_invalid_cursor(self):
+        """Test garbage or mismatched cursors are rejected"""
+        self.assertEqual(self.client.get('/api/products/?cursor=nope').status_code, 404)
+        
+        next_url = self.client.get('/api/products/?page_size=5').json()['next']
+        self.assertEqual(self.client.get(next_url + '&ordering=stock').status_code, 404)
+    
+    def test_malformed_cursor_values(self):
+        """Test a cursor with values its ordering fields can't parse is rejected"""
+        for ordering, bad in (('', 'not a date'), ('&ordering=price', 'cheap'), ('&ordering=price', [1])):
+            next_url = self.client.get(f'/api/products/?page_size=5{ordering}').json()['next']
+            encoded = parse_qs(urlparse(next_url).query)['cursor'][0]
+            cursor = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            cursor['v'][0] = bad
+            encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            response = self.client.get(f'/api/products/?page_size=5{ordering}&cursor={encoded}')
+            self.assertEqual(response.status_code, 404)
+    
+    def test_orders_are_paginated(self):
+        """Test order history uses cursor pagination too"""
+        user = User.objects.create_user(username='buyer', password='pass123')
+        for _ in range(12):
+            Order.objects.create(user=user, shipping_address='Somewhere 12345', phone_number='1')
+        self.client.force_authenticate(user=user)
+        
+        ids, last = self._walk('/api/orders/')
+        self.assertEqual(len(ids), 12)
+        self.assertEqual(ids, sorted(ids, reverse=True))
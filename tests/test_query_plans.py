@@ -0,0 +1,115 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+from orders.models import Order
+
+# Tables whose hot queries must always be served by an index
+WATCHED_TABLES = ('products_product', 'orders_order', 'orders_cartitem')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run EXPLAIN on the queries behind the hot endpoints and fail if any of
+    them falls back to a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        cls.user = User.objects.create_user(username='buyer', password='pass123')
+        cls.category = Category.objects.create(name='Test')
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='Test', price=i + 1,
+                    stock=i % 15, category=cls.category)
+            for i in range(50)
+        ])
+        Order.objects.bulk_create([
+            Order(user=cls.user, shipping_address='Somewhere 12345', phone_number='1')
+            for _ in range(20)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+
+    def _plans(self, url):
+        """EXPLAIN every query an API call runs against the watched tables"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(t in sql for t in WATCHED_TABLES):
+                    continue
+                cursor.execute(self._explain_prefix() + sql)
+                plans.append((sql, [str(row) for row in cursor.fetchall()]))
+        self.assertTrue(plans, f'{url} ran no query on a watched table')
+        return plans
+
+    def _explain_prefix(self):
+        if connection.vendor == 'sqlite':
+            return 'EXPLAIN QUERY PLAN '
+        return 'EXPLAIN '
+
+    def assertNoFullScan(self, url):
+        for sql, plan in self._plans(url):
+            # An index walk is fine as long as it yields rows in the requested
+            # order (so LIMIT stops it early); scanning and then sorting is not
+            sorts = any('USE TEMP B-TREE FOR ORDER BY' in line for line in plan)
+            for line in plan:
+                for table in WATCHED_TABLES:
+                    sqlite_scan = f'SCAN {table}' in line and ('USING' not in line or sorts)
+                    postgres_scan = f'Seq Scan on {table}' in line
+                    self.assertFalse(
+                        sqlite_scan or postgres_scan,
+                        f'Full scan of {table} for {url}:\n{sql}\n{plan}'
+                    )
+
+    def test_product_list(self):
+        self.assertNoFullScan('/api/products/')
+
+    def test_product_list_next_page(self):
+        next_url = self.client.get('/api/products/?page_size=5').json()['next']
+        self.assertNoFullScan(next_url)
+
+    def test_product_category_price_filter(self):
+        self.assertNoFullScan(f'/api/products/?category={self.category.id}&min_price=5&max_price=20')
+
+    def test_product_price_range(self):
+        self.assertNoFullScan('/api/products/?min_price=5&max_price=20&ordering=price')
+
+    def test_product_in_stock(self):
+        self.assertNoFullScan('/api/products/?in_stock=true')
+
+    def test_product_ordering_by_stock(self):
+        self.assertNoFullScan('/api/products/?ordering=-stock')
+
+    def test_low_stock(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertNoFullScan('/api/products/low_stock/')
+
+    def test_user_orders(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertNoFullScan('/api/orders/')
+
+    def test_staff_orders(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertNoFullScan('/api/orders/')
+
+    def test_cart(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/orders/cart/add_item/', {
+            'product_id': Product.objects.filter(stock__gt=0).first().id, 'quantity': 1
+        }, format='json')
+        self.assertNoFullScan('/api/orders/cart/')
@@ -0,0 +1,188 @@
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from orders import queued_checkout
+from orders.models import Cart, CartItem, Order, OrderItem
+from products.models import Category, Product
+
+ORDER = {'shipping_address': '123 Test Street, Test City, 12345', 'phone_number': '+1234567890'}
+
+
+@override_settings(CHECKOUT={'QUEUED': True, 'BATCH_SIZE': 50})
+class QueuedCheckoutTests(TestCase):
+    """Test cases for the queued checkout and its batch worker"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        category = Category.objects.create(name='Books')
+        self.hot = Product.objects.create(name='Hot', description='x', price='5.00', stock=3, category=category)
+        self.other = Product.objects.create(name='Other', description='x', price='2.50', stock=100, category=category)
+        notify = mock.patch('orders.queued_checkout.send_order_notification')
+        self.notify = notify.start()
+        self.addCleanup(notify.stop)
+
+    def _buyer(self, name, quantity=1):
+        user = User.objects.create_user(username=name, password='pass123')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.hot, quantity=quantity)
+        CartItem.objects.create(cart=cart, product=self.other, quantity=2)
+        return user
+
+    def _queue(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/orders/', ORDER, format='json')
+
+    def _work(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_checkout_worker', once=True, timeout=1, stdout=StringIO())
+
+    def test_queued(self):
+        """Test the API answers 202 with a handle and writes nothing"""
+        response = self._queue(self._buyer('buyer'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual(len(response.json()['handle']), 32)
+        self.assertEqual(queued_checkout.queue_length(), 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 3)
+
+    def test_batch_is_group_committed(self):
+        """Test a batch of orders takes the stock with one UPDATE"""
+        users = [self._buyer(f'buyer{i}') for i in range(3)]
+        handles = [self._queue(user).json()['handle'] for user in users]
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._work()
+        stock_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products_product" SET "stock"')]
+        self.assertEqual(len(stock_updates), 1)
+
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 6)
+        self.assertEqual(
+            sorted(Order.objects.values_list('total_price', flat=True)), [10, 10, 10]
+        )
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 0)
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 94)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(queued_checkout.queue_length(), 0)
+
+        calls = [call.kwargs['handle'] for call in self.notify.call_args_list]
+        self.assertEqual(calls, handles)
+        self.assertEqual({call.args[2] for call in self.notify.call_args_list}, {'pending'})
+
+    def test_first_come_first_served(self):
+        """Test stock goes to the earliest requests and the rest are told why"""
+        users = [self._buyer(f'buyer{i}') for i in range(5)]
+        for user in users:
+            self._queue(user)
+
+        self._work()
+
+        self.assertEqual(
+            sorted(Order.objects.values_list('user__username', flat=True)), ['buyer0', 'buyer1', 'buyer2']
+        )
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 0)
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 94)
+        rejected = [call for call in self.notify.call_args_list if call.args[2] == 'rejected']
+        self.assertEqual([call.args[0] for call in rejected], [users[3].id, users[4].id])
+        self.assertEqual(rejected[0].kwargs['message'], 'Hot is out of stock')
+        # Their carts are kept
+        self.assertEqual(CartItem.objects.filter(cart__user=users[3]).count(), 2)
+        self.assertEqual(metrics.snapshot()['checkout_queue']['rejected'], 2)
+
+    def test_sold_out_refreshes_listings(self):
+        """Test the worker drops cached listings and facets of the products sold"""
+        self.client.get('/api/products/?in_stock=false')
+        self.client.get('/api/products/facets/')
+        self._queue(self._buyer('buyer', quantity=3))
+
+        self._work()
+
+        response = self.client.get('/api/products/?in_stock=false')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.hot.id])
+        self.assertEqual(self.client.get('/api/products/facets/').json()['stock']['out_of_stock'], 1)
+
+    def test_duplicate_request_rejected(self):
+        """Test a cart queued twice is only ordered once"""
+        user = self._buyer('buyer')
+        self._queue(user)
+        self._queue(user)
+
+        self._work()
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 2)
+        statuses = [call.args[2] for call in self.notify.call_args_list]
+        self.assertEqual(statuses, ['pending', 'rejected'])
+
+    def test_short_cart_refused_up_front(self):
+        """Test a cart already short of stock isn't queued"""
+        response = self._queue(self._buyer('buyer', quantity=4))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(queued_checkout.queue_length(), 0)
+
+    def test_failed_batch_retried(self):
+        """Test a batch that fails once is placed on the next attempt"""
+        users = [self._buyer(f'buyer{i}') for i in range(2)]
+        for user in users:
+            self._queue(user)
+
+        take_stock = queued_checkout.take_stock
+        with mock.patch('orders.queued_checkout.take_stock', side_effect=[RuntimeError, take_stock]):
+            with mock.patch('orders.management.commands.run_checkout_worker.time.sleep') as sleep:
+                with self.assertLogs('orders', 'ERROR'):
+                    self._work()
+
+        sleep.assert_called_once_with(1)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(queued_checkout.queue_length(), 0)
+
+    def test_bad_request_rejected_alone(self):
+        """Test a request that keeps failing is rejected and the rest placed"""
+        users = [self._buyer(f'buyer{i}') for i in range(3)]
+        self._queue(users[0])
+        bad = queued_checkout.enqueue_checkout(
+            users[1], {'shipping_address': None, 'phone_number': '1'},
+            list(CartItem.objects.filter(cart__user=users[1])),
+        )
+        self._queue(users[2])
+
+        with mock.patch('orders.management.commands.run_checkout_worker.time.sleep') as sleep:
+            with self.captureOnCommitCallbacks(execute=True), self.assertLogs('orders', 'ERROR') as logs:
+                call_command('run_checkout_worker', once=True, timeout=1, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(sleep.call_count, 3)
+        self.assertIn(f'Rejecting queued checkout {bad}', logs.output[-1])
+        self.assertEqual(
+            sorted(Order.objects.values_list('user__username', flat=True)), ['buyer0', 'buyer2']
+        )
+        rejected = [call for call in self.notify.call_args_list if call.args[2] == 'rejected']
+        self.assertEqual([call.kwargs['handle'] for call in rejected], [bad])
+        self.assertEqual(metrics.snapshot()['checkout_queue']['failed'], 1)
+        self.assertEqual(queued_checkout.queue_length(), 0)
+
+    def test_interrupted_batch_requeued(self):
+        """Test a worker stopped while retrying puts the batch back in order"""
+        users = [self._buyer(f'buyer{i}') for i in range(2)]
+        handles = [self._queue(user).json()['handle'] for user in users]
+
+        with mock.patch('orders.queued_checkout.take_stock', side_effect=RuntimeError):
+            with mock.patch(
+                'orders.management.commands.run_checkout_worker.time.sleep', side_effect=KeyboardInterrupt
+            ):
+                with self.assertRaises(KeyboardInterrupt), self.assertLogs('orders', 'ERROR'):
+                    self._work()
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual([request['handle'] for request in queued_checkout.pop_batch(10)], handles)
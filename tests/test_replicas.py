@@ -0,0 +1,124 @@
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from ecommerce_backend import db_router, local_cache
+from ecommerce_backend.cache_tags import ALL_ORDERS, invalidate_tags
+from ecommerce_backend.db_router import ReplicaRouter, is_healthy, is_pinned, replica_reads
+from products.models import Category, Product
+from products.views import ProductViewSet
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTests(TestCase):
+    """Test cases for choosing the database of a read"""
+
+    def setUp(self):
+        db_router._health.clear()
+        self.router = ReplicaRouter()
+
+    def test_reads_outside_replica_actions_use_primary(self):
+        """Test the router only routes reads that asked for a replica"""
+        self.assertIsNone(self.router.db_for_read(Product))
+        with replica_reads():
+            with replica_reads(False):
+                self.assertIsNone(self.router.db_for_read(Product))
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_unhealthy_replicas_are_skipped(self):
+        """Test reads go to a healthy replica, or the primary if there is none"""
+        with replica_reads():
+            with mock.patch.object(db_router, 'is_healthy', side_effect=lambda alias: alias == 'replica_2'):
+                self.assertEqual(self.router.db_for_read(Product), 'replica_2')
+            with mock.patch.object(db_router, 'is_healthy', return_value=False):
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    @override_settings(REPLICA_MAX_LAG=5, REPLICA_HEALTH_INTERVAL=60)
+    def test_health_check(self):
+        """Test lagging or failing replicas are unhealthy, and results are reused"""
+        with mock.patch.object(db_router, 'replication_lag', return_value=30) as lag, \
+                self.assertLogs('ecommerce_backend.db_router', 'WARNING'):
+            self.assertFalse(is_healthy('replica_1'))
+            self.assertFalse(is_healthy('replica_1'))
+            self.assertEqual(lag.call_count, 1)
+
+        with mock.patch.object(db_router, 'replication_lag', return_value=1):
+            self.assertTrue(is_healthy('replica_2'))
+
+        db_router._health.clear()
+        with mock.patch.object(db_router, 'replication_lag', side_effect=OperationalError):
+            with mock.patch.object(db_router, 'connections'), \
+                    self.assertLogs('ecommerce_backend.db_router', 'WARNING'):
+                self.assertFalse(is_healthy('replica_1'))
+
+    def test_sqlite_replica_lag(self):
+        """Test a migrated SQLite database counts as a replica without lag"""
+        self.assertEqual(db_router.replication_lag('default'), 0)
+
+
+# The primary doubles as the only replica so the reads have somewhere to go
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaRoutingApiTests(TestCase):
+    """Test cases for which requests read from replicas"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        db_router._health.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='Test', price=10, stock=2, category=self.category
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def _replica_used(self, method, url, data=None):
+        with mock.patch.object(db_router, 'is_healthy', return_value=True) as healthy:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return healthy.called
+
+    def test_read_only_actions_use_replica(self):
+        """Test reads go to the replicas while writes stay on the primary"""
+        self.assertTrue(self._replica_used('get', '/api/products/low_stock/'))
+        self.assertFalse(self._replica_used('get', '/api/products/export/'))
+
+    def test_write_pins_user_to_primary(self):
+        """Test a user reads from the primary right after writing"""
+        self.assertFalse(self._replica_used('patch', f'/api/products/{self.product.id}/', {'stock': 1}))
+        self.assertTrue(is_pinned(self.admin))
+        self.assertFalse(self._replica_used('get', '/api/products/low_stock/'))
+
+        cache.clear()
+        self.assertTrue(self._replica_used('get', '/api/products/low_stock/'))
+
+    def test_recent_writes_are_cached_from_primary(self):
+        """Test cache entries depending on a recent write are rebuilt from the primary"""
+        view = ProductViewSet()
+        with view.rebuild_context(('"etag"', int(time.time()))):
+            self.assertFalse(db_router._replica_reads.get())
+        with replica_reads():
+            with view.rebuild_context(('"etag"', int(time.time()) - 3600)):
+                self.assertTrue(db_router._replica_reads.get())
+            # Without validators the entry is kept only if its tags didn't change within the lag
+            view.request = mock.Mock(_response_cache_started=1000.0)
+            with override_settings(REPLICA_MAX_LAG=5, REPLICA_HEALTH_INTERVAL=5):
+                with view.rebuild_context(None):
+                    self.assertTrue(db_router._replica_reads.get())
+            self.assertEqual(view.request._response_cache_started, 989.0)
+
+    def test_cached_order_list_built_from_replica(self):
+        """Test the order list, which has no validators, is rebuilt from a replica"""
+        self.assertTrue(self._replica_used('get', '/api/orders/'))
+        self.assertEqual(self.client.get('/api/orders/')['X-Cache'], 'HIT')
+
+        # Built within the lag of the last write, the replica may not have it yet
+        invalidate_tags([ALL_ORDERS])
+        self.assertTrue(self._replica_used('get', '/api/orders/'))
+        self.assertEqual(self.client.get('/api/orders/')['X-Cache'], 'MISS')
@@ -0,0 +1,271 @@
+import threading
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from orders import queued_checkout
+from orders.models import Cart, CartItem, Order
+from products import reservations
+from products.models import Category, Product
+
+ORDER = {'shipping_address': '123 Test Street, Test City, 12345', 'phone_number': '+1234567890'}
+
+
+class ReservationTests(TestCase):
+    """Test cases for the Redis stock reservations of flash sale products"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        category = Category.objects.create(name='Books')
+        self.hot = Product.objects.create(
+            name='Hot', description='x', price='5.00', stock=5, category=category, flash_sale=True
+        )
+        self.other = Product.objects.create(name='Other', description='x', price='2.50', stock=100, category=category)
+        self.users = [User.objects.create_user(username=f'buyer{i}', password='pass123') for i in range(3)]
+
+    def _avail(self, product):
+        return int(get_redis_connection('default').get(reservations._keys(product.id)[0]))
+
+    def _add(self, user, product, quantity):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            '/api/orders/cart/add_item/', {'product_id': product.id, 'quantity': quantity}, format='json'
+        )
+
+    def _checkout(self, user):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', ORDER, format='json')
+
+    def test_add_item_reserves(self):
+        """Test cart lines hold units that other buyers can't add"""
+        self.assertEqual(self._add(self.users[0], self.hot, 2).status_code, 200)
+        self.assertEqual(self._add(self.users[0], self.hot, 1).status_code, 200)
+        self.assertEqual(self._avail(self.hot), 2)
+
+        response = self._add(self.users[1], self.hot, 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Cannot add more. Only 2 items available')
+        self.assertEqual(self._add(self.users[1], self.hot, 2).status_code, 200)
+        self.assertEqual(self._avail(self.hot), 0)
+        # The database row isn't touched until reconciliation
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 5)
+
+    def test_refused_add_keeps_hold(self):
+        """Test an add refused by the stock check doesn't raise the hold"""
+        self._add(self.users[0], self.hot, 3)
+        Product.objects.filter(pk=self.hot.pk).update(stock=4)
+
+        response = self._add(self.users[0], self.hot, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Cannot add more. Only 4 items available')
+        self.assertEqual(self._avail(self.hot), 2)
+
+    def test_lowering_always_allowed(self):
+        """Test a hold can shrink even when more is held than the counters allow"""
+        self._add(self.users[0], self.hot, 3)
+        item = CartItem.objects.get(cart__user=self.users[0])
+        # Stock lowered in the database after the hold was taken
+        get_redis_connection('default').set(reservations._keys(self.hot.id)[0], -3)
+
+        response = self.client.put('/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._avail(self.hot), -1)
+        self.assertEqual(reservations.sell(self.users[0].id, {self.hot.id: 1}), [])
+
+    def test_cart_changes_release(self):
+        """Test lowering, removing and clearing cart lines hands units back"""
+        self._add(self.users[0], self.hot, 4)
+        item = CartItem.objects.get(cart__user=self.users[0])
+
+        response = self.client.put('/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._avail(self.hot), 4)
+
+        response = self.client.delete(f'/api/orders/cart/remove_item/?item_id={item.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._avail(self.hot), 5)
+
+        self._add(self.users[0], self.hot, 3)
+        self.assertEqual(self.client.delete('/api/orders/cart/clear/').status_code, 200)
+        self.assertEqual(self._avail(self.hot), 5)
+
+    def test_update_item_beyond_available(self):
+        """Test raising a cart line past what's left is refused"""
+        self._add(self.users[0], self.hot, 2)
+        self._add(self.users[1], self.hot, 2)
+        item = CartItem.objects.get(cart__user=self.users[0])
+
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.put('/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Only 3 items available')
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 2)
+
+    def test_abandoned_reservations_expire(self):
+        """Test holds of carts left alone go back on sale"""
+        with override_settings(RESERVATIONS={'TTL': -1}):
+            self._add(self.users[0], self.hot, 5)
+        response = self._add(self.users[1], self.hot, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._avail(self.hot), 0)
+
+        # The expired cart can't check out any more
+        response = self._checkout(self.users[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Hot is out of stock')
+
+    def test_checkout_sells_from_redis(self):
+        """Test checkout doesn't write the flash sale row, reconcile does"""
+        self._add(self.users[0], self.hot, 2)
+        self._add(self.users[0], self.other, 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._checkout(self.users[0])
+        self.assertEqual(response.status_code, 201)
+        stock_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products_product" SET "stock"')]
+        self.assertEqual(len(stock_updates), 1)
+        self.assertNotIn(f'= {self.hot.id}', stock_updates[0])
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 5)
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 99)
+        self.assertEqual(self._avail(self.hot), 3)
+
+        out = StringIO()
+        call_command('reconcile_reservations', stdout=out)
+        self.assertIn('2 units sold', out.getvalue())
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 3)
+        self.assertEqual(self._avail(self.hot), 3)
+        self.assertEqual(reservations.reconcile(), {})
+        self.assertEqual(metrics.snapshot()['reservations']['reconciled_units'], 2)
+
+    def test_checkout_without_reservation(self):
+        """Test a line whose hold expired still sells while units are left"""
+        with override_settings(RESERVATIONS={'TTL': -1}):
+            self._add(self.users[0], self.hot, 2)
+        self.assertEqual(self._checkout(self.users[0]).status_code, 201)
+        self.assertEqual(self._avail(self.hot), 3)
+
+    def test_short_flash_line_rolls_back(self):
+        """Test the stock taken for the other lines goes back when a flash line is short"""
+        self._add(self.users[0], self.hot, 5)
+        cart = Cart.objects.create(user=self.users[1])
+        CartItem.objects.create(cart=cart, product=self.other, quantity=4)
+        CartItem.objects.create(cart=cart, product=self.hot, quantity=1)
+
+        response = self._checkout(self.users[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Hot is out of stock')
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 100)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+
+    def test_failed_order_unsells(self):
+        """Test units sold for an order that fails go back on sale"""
+        self._add(self.users[0], self.hot, 2)
+        self.client.force_authenticate(user=self.users[0])
+        with mock.patch('orders.models.OrderItem.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/orders/', ORDER, format='json')
+        self.assertEqual(self._avail(self.hot), 5)
+        self.assertEqual(reservations.reconcile(), {})
+
+    def test_rollback_after_order_unsells(self):
+        """Test units go back when the transaction fails after the order is written"""
+        self._add(self.users[0], self.hot, 2)
+        self.client.force_authenticate(user=self.users[0])
+        with mock.patch(
+            'orders.views.OrderViewSet._send_order_notification', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/orders/', ORDER, format='json')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self._avail(self.hot), 5)
+        self.assertEqual(reservations.reconcile(), {})
+
+    def test_failed_batch_sold_once(self):
+        """Test a worker batch that rolls back doesn't sell twice when retried"""
+        cart = Cart.objects.create(user=self.users[0])
+        CartItem.objects.create(cart=cart, product=self.hot, quantity=2)
+        queued_checkout.enqueue_checkout(self.users[0], ORDER, list(cart.cart_items.all()))
+        batch = queued_checkout.pop_batch(10)
+
+        with mock.patch('orders.queued_checkout.product_write_tags', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                queued_checkout.process_batch(batch)
+        self.assertEqual(self._avail(self.hot), 5)
+
+        with mock.patch('orders.queued_checkout.send_order_notification'):
+            with self.captureOnCommitCallbacks(execute=True):
+                queued_checkout.process_batch(batch)
+        self.assertEqual(reservations.reconcile(), {self.hot.id: 2})
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 3)
+
+    def test_restock_rebases(self):
+        """Test stock saved in the database resets the counters, keeping holds"""
+        self._add(self.users[0], self.hot, 2)
+        self.hot.refresh_from_db()
+        self.hot.stock = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hot.save()
+        self.assertEqual(self._avail(self.hot), 18)
+
+    def test_flag_off_writes_back(self):
+        """Test taking a product off flash sale writes its sales and drops the counters"""
+        self._add(self.users[0], self.hot, 2)
+        self._checkout(self.users[0])
+        self.hot.refresh_from_db()
+        self.hot.flash_sale = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hot.save()
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 3)
+        self.assertIsNone(get_redis_connection('default').get(reservations._keys(self.hot.id)[0]))
+
+    def test_concurrent_reserve_never_oversells(self):
+        """Test racing holders get no more than the stock between them"""
+        reservations.load([self.hot.id])
+        results = []
+
+        def hold(holder):
+            results.append(reservations.reserve(self.hot.id, holder, 1)[0])
+
+        threads = [threading.Thread(target=hold, args=(holder,)) for holder in range(1000, 1020)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(self._avail(self.hot), 0)
+
+    @override_settings(CHECKOUT={'QUEUED': True, 'BATCH_SIZE': 50})
+    def test_queued_checkout(self):
+        """Test the batch worker sells flash lines first come first served"""
+        for user in self.users:
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.hot, quantity=2)
+            CartItem.objects.create(cart=cart, product=self.other, quantity=1)
+            self.client.force_authenticate(user=user)
+            self.assertEqual(self.client.post('/api/orders/', ORDER, format='json').status_code, 202)
+
+        with mock.patch('orders.queued_checkout.send_order_notification') as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('run_checkout_worker', once=True, timeout=1, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Order.objects.values_list('user__username', flat=True)), ['buyer0', 'buyer1']
+        )
+        rejected = [call for call in notify.call_args_list if call.args[2] == 'rejected']
+        self.assertEqual(rejected[0].kwargs['message'], 'Hot is out of stock')
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 98)
+        self.assertEqual(self._avail(self.hot), 1)
+        reservations.reconcile()
+        self.assertEqual(Product.objects.get(pk=self.hot.pk).stock, 1)
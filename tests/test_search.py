@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache
+from products.models import Category, Product
+
+
+class ProductSearchTests(TestCase):
+    """Test cases for the full-text product search"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        self.client = APIClient()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.office = Category.objects.create(name='Office')
+        self.laptop = Product.objects.create(
+            name='Gaming Laptop', description='Fast machine for games',
+            price=1500, stock=3, category=self.electronics
+        )
+        self.bag = Product.objects.create(
+            name='Backpack', description='Fits a 15 inch laptop',
+            price=60, stock=0, category=self.office
+        )
+        Product.objects.create(
+            name='Desk', description='Solid oak', price=300, stock=2, category=self.office
+        )
+    
+    def _names(self, query):
+        response = self.client.get('/api/products/' + query)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()['results']]
+    
+    def test_prefix_match_ranks_name_hits_first(self):
+        """Test prefix search matches name and description, name hits first"""
+        self.assertEqual(self._names('?search=lapt'), ['Gaming Laptop', 'Backpack'])
+    
+    def test_search_combines_with_filters(self):
+        """Test search still honours category, price and stock filters"""
+        self.assertEqual(self._names(f'?search=laptop&category={self.office.id}'), ['Backpack'])
+        self.assertEqual(self._names('?search=laptop&in_stock=true'), ['Gaming Laptop'])
+        self.assertEqual(self._names('?search=laptop&max_price=100'), ['Backpack'])
+    
+    def test_index_follows_product_writes(self):
+        """Test renames and deletes are reflected in the index"""
+        self.desk = Product.objects.get(name='Desk')
+        self.desk.name = 'Standing desk'
+        self.desk.save()
+        self.assertEqual(self._names('?search=standing'), ['Standing desk'])
+        
+        self.laptop.delete()
+        cache.clear()
+        local_cache.clear_all()
+        self.assertEqual(self._names('?search=gaming'), [])
+    
+    def test_search_syntax_is_neutralised(self):
+        """Test FTS operators in user input are treated as plain words"""
+        self.assertEqual(self._names('?search=laptop" OR "desk'), [])
+        self.assertEqual(self._names('?search=*gaming*'), ['Gaming Laptop'])
+    
+    def test_ranked_results_paginate(self):
+        """Test cursor pagination follows the search rank"""
+        first = self.client.get('/api/products/?search=laptop&page_size=1')
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(first.json()['results'][0]['name'], 'Gaming Laptop')
+        self.assertEqual(second.json()['results'][0]['name'], 'Backpack')
+        self.assertIsNone(second.json()['next'])
@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+
+
+class SparseFieldsTests(TestCase):
+    """Test cases for ?fields= and ?expand="""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='admin123'
+        )
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}', description='A long text ' * 50, price=10 + i,
+                stock=i, category=self.category
+            )
+            for i in range(4)
+        ]
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_product_list_fields(self):
+        """Test only the asked fields are serialized and selected"""
+        response, queries = self._get('/api/products/?fields=id,name,price,in_stock')
+        results = response.json()['results']
+        self.assertEqual(len(results), 4)
+        self.assertEqual(set(results[0]), {'id', 'name', 'price', 'in_stock'})
+        self.assertEqual(results[0]['in_stock'], True)
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0])
+        self.assertNotIn('products_category', queries[0])
+
+        # Without the id the category tag field is still dropped from the output
+        response, _ = self._get('/api/products/?fields=name')
+        self.assertEqual(set(response.json()['results'][0]), {'name'})
+
+    def test_expand_category(self):
+        """Test ?expand= nests the category, alone or with ?fields="""
+        response, queries = self._get('/api/products/?fields=name&expand=category')
+        product = response.json()['results'][0]
+        self.assertEqual(set(product), {'name', 'category'})
+        self.assertEqual(product['category']['name'], 'Books')
+        self.assertEqual(len(queries), 1)
+
+        response, _ = self._get('/api/products/?expand=category')
+        self.assertEqual(response.json()['results'][0]['category']['id'], self.category.id)
+        self.assertIn('description', response.json()['results'][0])
+
+    def test_retrieve_and_category_fields(self):
+        """Test retrieve and the category list take ?fields= too"""
+        product = self.products[0]
+        response, queries = self._get(f'/api/products/{product.id}/?fields=name,stock')
+        self.assertEqual(response.json(), {'name': product.name, 'stock': product.stock})
+        self.assertNotIn('"products_product"."description"', queries[-1])
+
+        response, _ = self._get('/api/products/categories/?fields=name')
+        self.assertEqual(response.json(), [{'name': 'Books'}])
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown names are a 400"""
+        response = self.client.get('/api/products/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+        self.assertEqual(self.client.get('/api/products/?expand=stock').status_code, 400)
+
+    def test_cursor_with_fields(self):
+        """Test keyset pages stay a single query when the ordering isn't a requested field"""
+        response, queries = self._get('/api/products/?fields=name&ordering=price&page_size=2')
+        self.assertEqual([p['name'] for p in response.json()['results']], ['Book 0', 'Book 1'])
+        self.assertEqual(len(queries), 1)
+
+        response, _ = self._get(response.json()['next'])
+        self.assertEqual([p['name'] for p in response.json()['results']], ['Book 2', 'Book 3'])
+
+    def test_shapes_cached_separately(self):
+        """Test each shape has its own entry, shared by any order of the names"""
+        self.client.get('/api/products/')
+        response = self.client.get('/api/products/?fields=id,name')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+        response = self.client.get('/api/products/?fields=name,id')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+    def test_sparse_entries_invalidated(self):
+        """Test writes reach cached shapes that leave out the tag fields"""
+        url = '/api/products/?fields=name,category_name'
+        product = self.products[0]
+        self.client.get(url)
+        self.client.force_authenticate(user=self.admin)
+
+        self.client.patch(f'/api/products/categories/{self.category.id}/', {'name': 'Novels'})
+        results = self.client.get(url).json()['results']
+        self.assertEqual({p['category_name'] for p in results}, {'Novels'})
+
+        self.client.patch(f'/api/products/{product.id}/', {'name': 'Renamed'}, format='json')
+        results = self.client.get(url).json()['results']
+        self.assertIn({'name': 'Renamed', 'category_name': 'Novels'}, results)
+
+    def test_order_fields(self):
+        """Test orders leave out the items (and their query) unless asked for"""
+        order = Order.objects.create(
+            user=self.admin, shipping_address='Somewhere 12345', phone_number='1', total_price=10
+        )
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=1, price=10)
+        self.client.force_authenticate(user=self.admin)
+
+        response, queries = self._get(f'/api/orders/{order.id}/?fields=id,status')
+        self.assertEqual(response.json(), {'id': order.id, 'status': 'pending'})
+        self.assertFalse(any('FROM "orders_orderitem"' in sql for sql in queries))
+
+        response, _ = self._get('/api/orders/?expand=items&fields=status')
+        self.assertEqual(response.json()['results'], [{
+            'status': 'pending',
+            'items': [{
+                'id': order.items.get().id, 'product': self.products[0].id,
+                'product_name': 'Book 0', 'quantity': 1, 'price': '10.00', 'subtotal': '10.00',
+            }],
+        }])
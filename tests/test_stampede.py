@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+from ecommerce_backend import local_cache, metrics
+from ecommerce_backend.cache_tags import invalidate_tags, product_tag
+from products.models import Category, Product
+from products.views import ProductViewSet
+
+
+# The tests edit the Redis entries directly, keep the local tier out of the way
+@override_settings(LOCAL_CACHE={
+    'MAX_ENTRIES': 0, 'TTL': 0, 'BROADCAST': 'ecommerce_backend.local_cache.InProcessBroadcast',
+})
+class StampedeProtectionTests(TestCase):
+    """Test cases for single-flight rebuilds and stale-while-revalidate"""
+    
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_all()
+        metrics.reset()
+        self.client = APIClient()
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='Test', price=10, stock=5, category=category
+        )
+        self.url = f'/api/products/{self.product.id}/'
+    
+    def _hold_lock(self):
+        """Pretend another worker is rebuilding the product page"""
+        key, = cache.keys('resp:product:retrieve:*')
+        lock = get_redis_connection('default').lock(cache.make_key(f'lock:{key}'), timeout=5)
+        self.assertTrue(lock.acquire(blocking=False))
+        self.addCleanup(lambda: lock.locked() and lock.release())
+        return key, lock
+    
+    def _counters(self):
+        return metrics.snapshot().get('cache:product', {})
+    
+    def test_stale_served_while_rebuilding(self):
+        """Test readers get the previous version while one request rebuilds it"""
+        self.client.get(self.url)
+        _, lock = self._hold_lock()
+        
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        invalidate_tags([product_tag(self.product.id)])
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(response.json()['name'], 'Novel')
+        self.assertNotIn('ETag', response)
+        
+        lock.release()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'Renamed')
+        self.assertEqual(self._counters()['recomputes'], 2)
+        self.assertEqual(self._counters()['stale_hits'], 1)
+    
+    def test_expired_entry_is_stale_until_rebuilt(self):
+        """Test an entry past its TTL is served stale to everyone but the rebuilder"""
+        self.client.get(self.url)
+        key, lock = self._hold_lock()
+        entry = cache.get(key)
+        cache.set(key, entry._replace(fresh_until=time.time() - 1), 60)
+        
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'STALE')
+        lock.release()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+    
+    def test_waits_then_rebuilds_without_stale_copy(self):
+        """Test a request with nothing to serve waits for the lock, then rebuilds itself"""
+        self.client.get(self.url)
+        key, _ = self._hold_lock()
+        cache.delete(key)
+        
+        with mock.patch.object(ProductViewSet, 'cache_lock_wait', 0.1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._counters()['lock_waits'], 1)
+        self.assertEqual(self._counters()['recomputes'], 2)